@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+
+from vark_features import INPUT_INDEX, QUESTIONNAIRE_COLUMNS
+
+# ============================================
+# ADMISSION CONTROL
+# ============================================
+#
+# Under overload /api/predict turns requests that miss the prediction cache
+# away before they reach the model instead of letting them queue: an
+# InFlightLimit caps how many are processed at once, and the micro-batcher
+# withdraws requests still queued after their deadline (see batching.py).
+# Turned-away requests are answered by RuleBasedFallback, which needs no
+# model call.
+
+class InFlightFull(Exception):
+    """Every in-flight slot is taken"""
+
+class InFlightLimit:
+    """
+    Non-blocking cap on concurrently processed requests.
+
+    try_acquire() returns False instead of waiting once limit requests hold
+    a slot, and `with limit:` raises InFlightFull; without a limit every
+    request is admitted.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._in_flight = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.limit is not None and self._in_flight >= self.limit:
+                self._rejected += 1
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def __enter__(self):
+        if not self.try_acquire():
+            raise InFlightFull(f'{self.limit} requests already in flight')
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected
+            }
+
+# ============================================
+# RULE-BASED FALLBACK
+# ============================================
+
+# Questionnaire answer i and TIME_COLUMNS[i] both stand for STYLES[i], as in
+# vark_data and generate_insights
+STYLES = ('Visual', 'Auditory', 'Reading', 'Kinesthetic')
+TIME_COLUMNS = ('visual_time', 'auditory_time', 'reading_time', 'kinesthetic_time')
+QUESTIONNAIRE_WEIGHT = 0.5
+
+class RuleBasedFallback:
+    """
+    Instant degraded predictions from the signals generate_insights reports.
+
+    Each style scores a weighted mix of its share of the questionnaire
+    answers and its share of the time spent; the scores sum to 1 and are
+    returned as probabilities in the order of classes. A heuristic, not a
+    model prediction, so callers flag its answers as degraded.
+    """
+
+    def __init__(self, classes, questionnaire_weight=QUESTIONNAIRE_WEIGHT):
+        self.classes_ = np.asarray(classes)
+        class_index = {str(label): i for i, label in enumerate(self.classes_)}
+        self.questionnaire_weight = questionnaire_weight
+        self._style_columns = np.array([class_index[style] for style in STYLES])
+        self._time_index = np.array([INPUT_INDEX[column] for column in TIME_COLUMNS])
+        self._answer_index = np.array([INPUT_INDEX[column] for column in QUESTIONNAIRE_COLUMNS])
+
+    def predict_row(self, row):
+        """Label and class probabilities for one raw input row"""
+        answers = row[self._answer_index].astype(np.intp)
+        answer_share = np.bincount(answers, minlength=len(STYLES)) / len(answers)
+        times = row[self._time_index].astype(np.float64)
+        total_time = times.sum()
+        if total_time > 0:
+            time_share = times / total_time
+        else:
+            time_share = answer_share
+
+        scores = self.questionnaire_weight * answer_share + (1 - self.questionnaire_weight) * time_share
+        probabilities = np.zeros(len(self.classes_))
+        probabilities[self._style_columns] = scores
+        return self.classes_[np.argmax(probabilities)], probabilities
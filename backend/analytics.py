@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# ============================================
+# 1. ADDITIVE SUMMARIES
+# ============================================
+
+STYLES = ('Visual', 'Auditory', 'Reading', 'Kinesthetic')
+MODALITIES = ('visual', 'auditory', 'reading', 'kinesthetic')
+CONFIDENCE_BINS = 10
+
+def modality_metrics(engagement):
+    """(time, clicks) per modality from an engagement payload, or None if malformed"""
+    if not isinstance(engagement, dict):
+        return None
+    time_spent = {}
+    clicks = {}
+    try:
+        for modality in MODALITIES:
+            metrics = engagement.get(modality) or {}
+            time_spent[modality] = float(metrics.get('timeSpent', 0) or 0)
+            clicks[modality] = float(metrics.get('clicks', 0) or 0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return time_spent, clicks
+
+class Summary:
+    """
+    Counters for one time bucket or for all time.
+
+    Everything is a count or a sum, so summaries are updated in O(1) per event
+    and merged by addition; means are only computed when reporting.
+    """
+
+    def __init__(self):
+        self.predictions = 0
+        self.style_counts = dict.fromkeys(STYLES, 0)
+        self.confidence_hist = [0] * CONFIDENCE_BINS
+        self.confidence_sum = 0.0
+        self.engagements = 0
+        self.time_sum = dict.fromkeys(MODALITIES, 0.0)
+        self.click_sum = dict.fromkeys(MODALITIES, 0.0)
+
+    def add_prediction(self, style, confidence):
+        self.predictions += 1
+        style = str(style)
+        self.style_counts[style] = self.style_counts.get(style, 0) + 1
+        confidence = min(max(float(confidence), 0.0), 1.0)
+        self.confidence_hist[min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)] += 1
+        self.confidence_sum += confidence
+
+    def add_engagement(self, time_spent, clicks):
+        self.engagements += 1
+        for modality in MODALITIES:
+            self.time_sum[modality] += time_spent[modality]
+            self.click_sum[modality] += clicks[modality]
+
+    def merge(self, other):
+        self.predictions += other.predictions
+        for style, count in other.style_counts.items():
+            self.style_counts[style] = self.style_counts.get(style, 0) + count
+        for i, count in enumerate(other.confidence_hist):
+            self.confidence_hist[i] += count
+        self.confidence_sum += other.confidence_sum
+        self.engagements += other.engagements
+        for modality in MODALITIES:
+            self.time_sum[modality] += other.time_sum[modality]
+            self.click_sum[modality] += other.click_sum[modality]
+
+    def to_dict(self):
+        return {
+            'predictions': self.predictions,
+            'style_counts': dict(self.style_counts),
+            'confidence_hist': list(self.confidence_hist),
+            'confidence_sum': self.confidence_sum,
+            'engagements': self.engagements,
+            'time_sum': dict(self.time_sum),
+            'click_sum': dict(self.click_sum)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.predictions = data['predictions']
+        summary.style_counts.update(data['style_counts'])
+        summary.confidence_hist = list(data['confidence_hist'])
+        summary.confidence_sum = data['confidence_sum']
+        summary.engagements = data['engagements']
+        summary.time_sum.update(data['time_sum'])
+        summary.click_sum.update(data['click_sum'])
+        return summary
+
+    def report(self):
+        """Counts, shares, confidence histogram and per-modality means"""
+        predictions = self.predictions
+        engagements = self.engagements
+        return {
+            'predictions': predictions,
+            'style_counts': dict(self.style_counts),
+            'style_share': {
+                style: count / predictions if predictions else 0.0
+                for style, count in self.style_counts.items()
+            },
+            'confidence': {
+                'mean': self.confidence_sum / predictions if predictions else None,
+                'histogram': [
+                    {'range': [i / CONFIDENCE_BINS, (i + 1) / CONFIDENCE_BINS], 'count': count}
+                    for i, count in enumerate(self.confidence_hist)
+                ]
+            },
+            'engagements': engagements,
+            'modalities': {
+                modality: {
+                    'mean_time': self.time_sum[modality] / engagements if engagements else None,
+                    'mean_clicks': self.click_sum[modality] / engagements if engagements else None
+                }
+                for modality in MODALITIES
+            }
+        }
+
+# ============================================
+# 2. ROLLING AGGREGATOR
+# ============================================
+
+class AnalyticsAggregator:
+    """
+    All-time totals plus a rolling window of fixed-width time buckets.
+
+    Every prediction and saved engagement updates the totals and its bucket
+    in O(1); buckets older than retention_buckets are dropped. Queries merge
+    at most retention_buckets summaries, independent of how many sessions
+    have been seen. Engagement metrics come from every engagement payload,
+    whether it arrived with a prediction or was saved on its own.
+    """
+
+    def __init__(self, bucket_seconds=300, retention_buckets=288):
+        self.bucket_seconds = bucket_seconds
+        self.retention_buckets = retention_buckets
+        self.totals = Summary()
+        self._buckets = {}
+        self._newest = None
+        self._lock = threading.Lock()
+
+    def _bucket(self, timestamp):
+        """Summary for the bucket holding timestamp, or None if it is past retention"""
+        index = int(timestamp // self.bucket_seconds)
+        summary = self._buckets.get(index)
+        if summary is not None:
+            return summary
+        if self._newest is not None and index <= self._newest - self.retention_buckets:
+            return None
+        summary = self._buckets[index] = Summary()
+        if self._newest is None or index > self._newest:
+            self._newest = index
+            # Only a new bucket can push old ones out of the window
+            cutoff = index - self.retention_buckets
+            for old in [i for i in self._buckets if i <= cutoff]:
+                del self._buckets[old]
+        return summary
+
+    def record_prediction(self, style, confidence, engagement=None, timestamp=None):
+        metrics = modality_metrics(engagement) if engagement is not None else None
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            for summary in (self.totals, bucket):
+                if summary is None:
+                    continue
+                summary.add_prediction(style, confidence)
+                if metrics is not None:
+                    summary.add_engagement(*metrics)
+
+    def record_engagement(self, engagement, timestamp=None):
+        metrics = modality_metrics(engagement)
+        if metrics is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            bucket = self._bucket(timestamp)
+            self.totals.add_engagement(*metrics)
+            if bucket is not None:
+                bucket.add_engagement(*metrics)
+
+    def merge(self, other):
+        """Add another aggregator's counts, e.g. a peer worker's snapshot"""
+        if other.bucket_seconds != self.bucket_seconds:
+            raise ValueError(f"Cannot merge {other.bucket_seconds}s buckets into {self.bucket_seconds}s buckets")
+        data = other.to_dict()
+        with self._lock:
+            self.totals.merge(Summary.from_dict(data['totals']))
+            for index in sorted(data['buckets'], key=int):
+                bucket = self._bucket(int(index) * self.bucket_seconds)
+                if bucket is not None:
+                    bucket.merge(Summary.from_dict(data['buckets'][index]))
+
+    def query(self, window_seconds=None, series=False, now=None):
+        """Totals and a rolling summary over the last window_seconds"""
+        now = time.time() if now is None else now
+        max_window = self.bucket_seconds * self.retention_buckets
+        window_seconds = max_window if window_seconds is None else min(window_seconds, max_window)
+        first = int((now - window_seconds) // self.bucket_seconds) + 1
+        last = int(now // self.bucket_seconds)
+
+        window = Summary()
+        points = []
+        with self._lock:
+            totals = self.totals.report()
+            for index in sorted(self._buckets):
+                if not first <= index <= last:
+                    continue
+                summary = self._buckets[index]
+                window.merge(summary)
+                if series:
+                    points.append({
+                        'start': datetime.fromtimestamp(index * self.bucket_seconds).isoformat(),
+                        'predictions': summary.predictions,
+                        'style_counts': dict(summary.style_counts),
+                        'engagements': summary.engagements
+                    })
+
+        result = {
+            'bucket_seconds': self.bucket_seconds,
+            'window_seconds': window_seconds,
+            'totals': totals,
+            'window': window.report()
+        }
+        if series:
+            result['series'] = points
+        return result
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'bucket_seconds': self.bucket_seconds,
+                'retention_buckets': self.retention_buckets,
+                'totals': self.totals.to_dict(),
+                'buckets': {str(index): summary.to_dict() for index, summary in self._buckets.items()}
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls(data['bucket_seconds'], data['retention_buckets'])
+        aggregator.totals = Summary.from_dict(data['totals'])
+        aggregator._buckets = {int(index): Summary.from_dict(summary)
+                               for index, summary in data['buckets'].items()}
+        aggregator._newest = max(aggregator._buckets) if aggregator._buckets else None
+        return aggregator
+
+    def save(self, path):
+        """Atomically write the aggregates as JSON"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+# ============================================
+# 3. REBUILD FROM RAW EVENTS
+# ============================================
+
+def rebuild_from_store(backend, bucket_seconds=300, retention_buckets=288):
+    """
+    Recompute the aggregates from every stored prediction and engagement
+    event, e.g. after changing the bucket width or losing the snapshot.
+    """
+    aggregator = AnalyticsAggregator(bucket_seconds, retention_buckets)
+    for _, kind, received_at, _, payload in backend.iter_events():
+        timestamp = datetime.fromisoformat(received_at).timestamp()
+        if kind == 'prediction':
+            aggregator.record_prediction(payload['predicted_style'], payload['confidence'],
+                                         payload.get('engagement'), timestamp=timestamp)
+        elif kind == 'engagement' and isinstance(payload, dict):
+            aggregator.record_engagement(payload.get('engagement'), timestamp=timestamp)
+    return aggregator
+
+if __name__ == "__main__":
+    from engagement_store import SQLiteBackend
+
+    parser = argparse.ArgumentParser(description='Rebuild or inspect VARK analytics aggregates')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rebuild = commands.add_parser('rebuild', help='Recompute aggregates from the engagement database')
+    rebuild.add_argument('--db', default='engagement.db')
+    rebuild.add_argument('--out', default='analytics_snapshot.json')
+    rebuild.add_argument('--bucket-seconds', type=int, default=300)
+    rebuild.add_argument('--retention-buckets', type=int, default=288)
+
+    show = commands.add_parser('show', help='Print the report for a snapshot')
+    show.add_argument('snapshot', nargs='?', default='analytics_snapshot.json')
+    show.add_argument('--window', type=float, default=None, help='Rolling window in seconds')
+
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        start = time.perf_counter()
+        backend = SQLiteBackend(args.db)
+        aggregator = rebuild_from_store(backend, args.bucket_seconds, args.retention_buckets)
+        backend.close()
+        aggregator.save(args.out)
+        totals = aggregator.totals
+        print(f"Rebuilt {totals.predictions} predictions and {totals.engagements} engagement samples "
+              f"in {time.perf_counter() - start:.2f}s -> {args.out}")
+    else:
+        aggregator = AnalyticsAggregator.load(args.snapshot)
+        print(json.dumps(aggregator.query(window_seconds=args.window), indent=2))
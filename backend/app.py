@@ -1,46 +1,383 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
 from datetime import datetime
+import atexit
 import pickle
 import os
+import glob
+import hmac
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import TimeoutError as InferenceTimeout
 
-# Import the enhanced model
-from vark_ml_model import HybridVARKPredictor, engineer_features, generate_synthetic_data
+# Serving only needs NumPy; TensorFlow and scikit-learn are imported lazily
+# when a model has to be trained or converted
+from vark_features import engineer_feature_matrix, select_feature_columns
+from vark_decoder import PayloadError, RequestDecoder
+from vark_cascade import DEFAULT_TREES
+from vark_serving import ServingPredictor
+from vark_artifacts import is_up_to_date, load_artifact, save_artifact
+from batching import BATCH_SIZE_BUCKETS, BatcherFull, MicroBatcher, QueueTimeout
+from admission import InFlightFull, InFlightLimit, RuleBasedFallback
+from prediction_cache import PredictionCache
+from engagement_store import EngagementStore, SQLiteBackend, StoreFull
+from analytics import AnalyticsAggregator
+from sessions import SessionNotFound, SessionStore, SQLiteSessionStore
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, cumulative_histogram_family, simple_family
+from profiling import RequestProfiler, format_cprofile
 
 app = Flask(__name__)
 CORS(app)
 
 predictor = None
+fallback = None
 MODEL_PATH = 'vark_model.pkl'
+# Versioned serving artifacts exported from MODEL_PATH (see vark_artifacts)
+ARTIFACT_DIR = 'models'
+# The small student distilled from the hybrid model by vark_distill.py,
+# served instead of it with VARK_SERVING_MODEL=student
+STUDENT_ARTIFACT_DIR = 'models_student'
+SERVING_MODEL = os.environ.get('VARK_SERVING_MODEL', 'hybrid')
 
-def initialize_model():
-    """Load or train the model"""
-    global predictor
+# Prediction payloads are validated and written straight into float64 input
+# rows following the feature schema in vark_features
+decoder = RequestDecoder()
+
+# Numeric precision of the serving engines: 'full' serves the artifact as
+# exported, 'float32', 'float16' and 'int8' trade a little accuracy for a
+# smaller model (see vark_precision.py for the accuracy/latency report)
+PRECISION = os.environ.get('VARK_PRECISION', 'full')
+
+# Cascade mode (see vark_cascade.py): rows the first CASCADE_TREES random
+# forest trees are at least CASCADE_THRESHOLD confident about skip the deep
+# model and the full ensemble. Off unless a threshold is set
+CASCADE_THRESHOLD = float(os.environ['VARK_CASCADE_THRESHOLD']) if os.environ.get('VARK_CASCADE_THRESHOLD') else None
+CASCADE_TREES = int(os.environ.get('VARK_CASCADE_TREES', str(DEFAULT_TREES)))
+
+# Concurrent /api/predict requests are coalesced into one model call for up to
+# BATCH_WINDOW_MS or MAX_BATCH_SIZE rows, whichever comes first
+BATCH_WINDOW_MS = float(os.environ.get('VARK_BATCH_WINDOW_MS', '2'))
+MAX_BATCH_SIZE = int(os.environ.get('VARK_MAX_BATCH_SIZE', '64'))
+
+# At most INFERENCE_WORKERS batches run at once. A request waits at most
+# INFERENCE_TIMEOUT_SECONDS for its result (504 after that), and once
+# MAX_PENDING_INFERENCE requests are waiting new ones get a 503, so request
+# threads stay free for lightweight endpoints (see serve.py)
+INFERENCE_WORKERS = int(os.environ.get('VARK_INFERENCE_WORKERS', '1'))
+INFERENCE_TIMEOUT_SECONDS = float(os.environ.get('VARK_INFERENCE_TIMEOUT_SECONDS', '10'))
+MAX_PENDING_INFERENCE = int(os.environ['VARK_MAX_PENDING_INFERENCE']) if os.environ.get('VARK_MAX_PENDING_INFERENCE') else None
+
+# Admission control on /api/predict (see admission.py): at most MAX_IN_FLIGHT
+# requests are processed at once, and one whose inference has not started
+# after QUEUE_DEADLINE_MS is withdrawn. Requests shed that way or by a full
+# inference queue, and requests that time out, get an instant rule-based
+# answer flagged 'degraded' instead of a 503/504 unless DEGRADED_FALLBACK=0
+MAX_IN_FLIGHT = int(os.environ['VARK_MAX_IN_FLIGHT']) if os.environ.get('VARK_MAX_IN_FLIGHT') else None
+QUEUE_DEADLINE_MS = float(os.environ['VARK_QUEUE_DEADLINE_MS']) if os.environ.get('VARK_QUEUE_DEADLINE_MS') else None
+DEGRADED_FALLBACK = os.environ.get('VARK_DEGRADED_FALLBACK', '1') != '0'
+admission = InFlightLimit(MAX_IN_FLIGHT)
+
+# Identical resubmissions (refreshes, retries) are answered from an LRU+TTL
+# cache keyed on the raw input row and the model version
+CACHE_SIZE = int(os.environ.get('VARK_CACHE_SIZE', '10000'))
+CACHE_TTL_SECONDS = float(os.environ.get('VARK_CACHE_TTL_SECONDS', '300'))
+prediction_cache = PredictionCache(maxsize=CACHE_SIZE, ttl_seconds=CACHE_TTL_SECONDS)
+
+# Engagement payloads are buffered in memory and written to SQLite in batches
+# by a background thread; the buffer is flushed on shutdown
+ENGAGEMENT_DB_PATH = os.environ.get('VARK_ENGAGEMENT_DB', 'engagement.db')
+ENGAGEMENT_BUFFER_SIZE = int(os.environ.get('VARK_ENGAGEMENT_BUFFER', '10000'))
+engagement_store = EngagementStore(SQLiteBackend(ENGAGEMENT_DB_PATH), max_buffer=ENGAGEMENT_BUFFER_SIZE)
+atexit.register(engagement_store.close)
+
+# /api/analytics reads pre-aggregated counters and rolling time buckets that
+# are updated on every prediction and saved engagement. They are snapshotted
+# on shutdown; `python analytics.py rebuild` recomputes them from the database
+ANALYTICS_SNAPSHOT_PATH = os.environ.get('VARK_ANALYTICS_SNAPSHOT', 'analytics_snapshot.json')
+ANALYTICS_BUCKET_SECONDS = int(os.environ.get('VARK_ANALYTICS_BUCKET_SECONDS', '300'))
+ANALYTICS_RETENTION_BUCKETS = int(os.environ.get('VARK_ANALYTICS_RETENTION_BUCKETS', '288'))
+ANALYTICS_SYNC_SECONDS = float(os.environ.get('VARK_ANALYTICS_SYNC_SECONDS', '5'))
+
+# Set by prefork.py in each worker process. Every worker keeps its own
+# aggregates, snapshots them every ANALYTICS_SYNC_SECONDS and merges the
+# other workers' snapshots when /api/analytics is queried
+WORKER_ID = os.environ.get('VARK_WORKER_ID')
+if WORKER_ID is not None:
+    _snapshot_root, _snapshot_ext = os.path.splitext(ANALYTICS_SNAPSHOT_PATH)
+    ANALYTICS_SNAPSHOT_PATH = f'{_snapshot_root}.worker{WORKER_ID}{_snapshot_ext}'
+    ANALYTICS_PEER_PATTERN = f'{glob.escape(_snapshot_root)}.worker*{_snapshot_ext}'
+
+if os.path.exists(ANALYTICS_SNAPSHOT_PATH):
+    analytics = AnalyticsAggregator.load(ANALYTICS_SNAPSHOT_PATH)
+else:
+    analytics = AnalyticsAggregator(ANALYTICS_BUCKET_SECONDS, ANALYTICS_RETENTION_BUCKETS)
+atexit.register(lambda: analytics.save(ANALYTICS_SNAPSHOT_PATH))
+
+def sync_analytics():
+    while True:
+        time.sleep(ANALYTICS_SYNC_SECONDS)
+        try:
+            analytics.save(ANALYTICS_SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"Error saving analytics snapshot: {str(e)}")
+
+if WORKER_ID is not None:
+    threading.Thread(target=sync_analytics, name='analytics-sync', daemon=True).start()
+
+def current_analytics():
+    """This process's aggregates, merged with the other workers' snapshots"""
+    if WORKER_ID is None:
+        return analytics
+    combined = AnalyticsAggregator(analytics.bucket_seconds, analytics.retention_buckets)
+    combined.merge(analytics)
+    for path in glob.glob(ANALYTICS_PEER_PATTERN):
+        if path != ANALYTICS_SNAPSHOT_PATH:
+            combined.merge(AnalyticsAggregator.load(path))
+    return combined
+
+# Streaming sessions accumulate the raw engagement counters as events arrive;
+# sessions idle for longer than SESSION_TTL_SECONDS are dropped. They live in
+# memory unless SESSION_DB_PATH is set, which prefork.py does so that all
+# workers share them
+SESSION_TTL_SECONDS = float(os.environ.get('VARK_SESSION_TTL_SECONDS', '1800'))
+MAX_SESSIONS = int(os.environ.get('VARK_MAX_SESSIONS', '100000'))
+MAX_SESSION_EVENTS = 1000
+SESSION_DB_PATH = os.environ.get('VARK_SESSION_DB')
+if SESSION_DB_PATH:
+    sessions = SQLiteSessionStore(SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS)
+else:
+    sessions = SessionStore(ttl_seconds=SESSION_TTL_SECONDS, max_sessions=MAX_SESSIONS)
+
+# Request counts and latencies plus a latency histogram per stage of the
+# prediction path, served in the Prometheus text format by /api/metrics.
+# Model stages are timed per batched model call, in this process only
+metrics_registry = Registry()
+REQUESTS = metrics_registry.counter('vark_http_requests', 'HTTP requests by endpoint and status',
+                                    ('endpoint', 'status'))
+REQUEST_ERRORS = metrics_registry.counter('vark_http_errors', 'HTTP requests that failed with a 5xx status',
+                                          ('endpoint',))
+REQUEST_SECONDS = metrics_registry.histogram('vark_http_request_duration_seconds',
+                                             'Request latency by endpoint', ('endpoint',))
+STAGE_SECONDS = metrics_registry.histogram('vark_stage_duration_seconds',
+                                           'Time spent in each stage of the prediction path', ('stage',))
+SHED = metrics_registry.counter('vark_predict_shed', 'Prediction requests turned away before inference',
+                                ('reason',))
+DEGRADED = metrics_registry.counter('vark_predict_degraded',
+                                    'Prediction requests answered by the rule-based fallback', ('reason',))
+STAGES = {stage: STAGE_SECONDS.labels(stage) for stage in (
+    'parse_json', 'decode', 'cache_lookup', 'engineer_features', 'inference',
+    'scaler', 'cascade', 'deep_model', 'ensemble', 'insights', 'recommendations', 'record', 'serialize'
+)}
+
+# Opt-in profiling of prediction requests (see profiling.py): a
+# PROFILE_SAMPLE_RATE fraction of requests, and every request slower than
+# PROFILE_SLOW_MS. Off unless one of them is set, in which case the latest
+# PROFILE_BUFFER_SIZE captures are served by /api/admin/profiles
+PROFILE_SAMPLE_RATE = float(os.environ.get('VARK_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SLOW_MS = float(os.environ['VARK_PROFILE_SLOW_MS']) if os.environ.get('VARK_PROFILE_SLOW_MS') else None
+PROFILE_MODE = os.environ.get('VARK_PROFILE_MODE', 'stack')
+PROFILE_BUFFER_SIZE = int(os.environ.get('VARK_PROFILE_BUFFER', '50'))
+PROFILED_ENDPOINTS = ('predict_learning_style', 'predict_learning_style_batch',
+                      'predict_session', 'finish_session')
+profiler = RequestProfiler(sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS,
+                           capacity=PROFILE_BUFFER_SIZE, mode=PROFILE_MODE, endpoints=PROFILED_ENDPOINTS)
+
+# Admin endpoints need this token in the X-Admin-Token header and are closed
+# without one. ADMIN_ALLOW_LOCALHOST=1 also opens them to requests from
+# localhost, for local debugging only: behind a reverse proxy every request
+# comes from localhost
+ADMIN_TOKEN = os.environ.get('VARK_ADMIN_TOKEN')
+ADMIN_ALLOW_LOCALHOST = os.environ.get('VARK_ADMIN_ALLOW_LOCALHOST') == '1'
+
+def artifact_is_current():
+    """True if the served artifact version is at least as new as the training pickle"""
+    return is_up_to_date(ARTIFACT_DIR, MODEL_PATH)
+
+def load_or_train_hybrid():
+    """Load the training pickle, or train a new model (imports TensorFlow)"""
+    from vark_ml_model import HybridVARKPredictor, generate_synthetic_data, prepare_training_data
     
     if os.path.exists(MODEL_PATH):
         print("Loading existing model...")
         with open(MODEL_PATH, 'rb') as f:
-            predictor = pickle.load(f)
+            hybrid = pickle.load(f)
         print("Model loaded successfully!")
     else:
         print("Training new model...")
         df = generate_synthetic_data(n_samples=5000)
-        df_featured = engineer_features(df)
-        
-        feature_cols = [col for col in df_featured.columns if col != 'label']
-        X = df_featured[feature_cols]
-        y = df_featured['label']
+        X, y = prepare_training_data(df)
         
-        predictor = HybridVARKPredictor()
-        predictor.fit(X, y, epochs=100, batch_size=32, validation_split=0.2)
+        hybrid = HybridVARKPredictor()
+        hybrid.fit(X, y, epochs=100, batch_size=32, validation_split=0.2)
         
         with open(MODEL_PATH, 'wb') as f:
-            pickle.dump(predictor, f)
+            pickle.dump(hybrid, f)
         print("Model trained and saved!")
+    
+    return hybrid
+
+def serving_artifact_dir():
+    if SERVING_MODEL not in ('hybrid', 'student'):
+        raise ValueError(f"Unknown VARK_SERVING_MODEL {SERVING_MODEL!r}, expected 'hybrid' or 'student'")
+    return STUDENT_ARTIFACT_DIR if SERVING_MODEL == 'student' else ARTIFACT_DIR
+
+def initialize_model():
+    """Load the serving model, exporting it from the trained model if needed"""
+    global predictor, fallback
+    
+    if SERVING_MODEL == 'student':
+        # Only published by vark_distill.py, never exported here
+        print("Loading distilled student model...")
+        predictor = load_artifact(serving_artifact_dir(), precision=PRECISION)
+        fallback = RuleBasedFallback(predictor.classes_)
+        prediction_cache.clear()
+        if CASCADE_THRESHOLD is not None:
+            print("The student has no tree ensemble, ignoring VARK_CASCADE_THRESHOLD")
+        print(f"Student model {predictor.model_version} ({predictor.precision}) loaded successfully!")
+        return
+    
+    if not artifact_is_current():
+        # Fold BatchNorm into the Dense weights and flatten the trees so that
+        # later starts can skip TensorFlow and scikit-learn entirely
+        hybrid = load_or_train_hybrid()
+        version = save_artifact(ServingPredictor.from_hybrid(hybrid), ARTIFACT_DIR,
+                                metadata={'source': MODEL_PATH})
+        print(f"Serving model exported as version {version}")
+    
+    print("Loading serving model...")
+    predictor = load_artifact(ARTIFACT_DIR, precision=PRECISION)
+    predictor.set_cascade(CASCADE_THRESHOLD, CASCADE_TREES)
+    fallback = RuleBasedFallback(predictor.classes_)
+    prediction_cache.clear()
+    print(f"Serving model {predictor.model_version} ({predictor.precision}) loaded successfully!")
+
+def run_inference(X):
+    """Labels and blended probabilities for a batch of feature rows"""
+    model = predictor
+    with STAGES['scaler'].time():
+        X_scaled = model.transform(X)
+    
+    def full_model(X_scaled):
+        with STAGES['deep_model'].time():
+            dl_probs = model.dl_engine.predict(X_scaled)
+        if model.ensemble_engine is None:
+            return model.blend(dl_probs, None)
+        with STAGES['ensemble'].time():
+            ensemble_probs = model.ensemble_engine.predict_proba(X_scaled)
+        return model.blend(dl_probs, ensemble_probs)
+    
+    if model.cascade is None:
+        return full_model(X_scaled)
+    with STAGES['cascade'].time():
+        probs, confident = model.cascade.screen(X_scaled)
+    probs, _ = model.cascade.resolve(X_scaled, probs, confident, lambda rows: full_model(rows)[1])
+    return model.classes_[np.argmax(probs, axis=1)], probs
+
+def create_batcher(predict_fn):
+    return MicroBatcher(predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=BATCH_WINDOW_MS,
+                        workers=INFERENCE_WORKERS, max_pending=MAX_PENDING_INFERENCE)
+
+def use_process_pool(processes=INFERENCE_WORKERS):
+    """
+    Run inference in worker processes instead of threads of this process.
+    
+    Must be called from a script whose top level is guarded by
+    `if __name__ == '__main__'` (serve.py does this), because spawned workers
+    re-import the main module.
+    """
+    global batcher
+    from inference_pool import ProcessInference
+    
+    cascade = predictor.cascade
+    pool = ProcessInference(serving_artifact_dir(), predictor.model_version, processes=processes,
+                            precision=PRECISION,
+                            cascade_threshold=cascade.threshold if cascade is not None else None,
+                            cascade_trees=CASCADE_TREES)
+    pool.warm_up(np.zeros((1, len(predictor.feature_columns))))
+    old_batcher, batcher = batcher, create_batcher(pool)
+    old_batcher.close()
+    atexit.register(pool.close)
+    print(f"Inference running in {processes} worker processes")
 
 initialize_model()
+batcher = create_batcher(run_inference)
+
+def service_metrics():
+    """Metric families for the batcher, cache, engagement store and sessions"""
+    batching = batcher.stats()
+    cache = prediction_cache.stats()
+    store = engagement_store.stats()
+    session_stats = sessions.stats()
+    return [
+        simple_family('vark_model_info', 'gauge', 'Serving model version',
+                      1, (('version', predictor.model_version),)),
+        simple_family('vark_inference_batches', 'counter', 'Batched model calls', batching['batches']),
+        simple_family('vark_inference_requests', 'counter', 'Requests served by batched model calls',
+                      batching['requests']),
+        simple_family('vark_inference_rows', 'counter', 'Rows passed to the model', batching['rows']),
+        simple_family('vark_inference_rejected', 'counter', 'Requests rejected because inference was full',
+                      batching['rejected']),
+        simple_family('vark_inference_timeouts', 'counter', 'Requests that timed out waiting for inference',
+                      batching['timeouts']),
+        simple_family('vark_inference_expired', 'counter', 'Requests withdrawn after their queue deadline',
+                      batching['expired']),
+        simple_family('vark_predict_in_flight', 'gauge', 'Prediction requests being processed',
+                      admission.stats()['in_flight']),
+        simple_family('vark_inference_pending', 'gauge', 'Requests waiting for or in inference',
+                      batching['pending']),
+        cumulative_histogram_family('vark_inference_batch_size', 'Rows per batched model call',
+                                    BATCH_SIZE_BUCKETS, list(batching['batch_size_histogram'].values()),
+                                    batching['rows']),
+        simple_family('vark_cache_hits', 'counter', 'Prediction cache hits', cache['hits']),
+        simple_family('vark_cache_misses', 'counter', 'Prediction cache misses', cache['misses']),
+        simple_family('vark_cache_evictions', 'counter', 'Prediction cache evictions', cache['evictions']),
+        simple_family('vark_cache_entries', 'gauge', 'Prediction cache entries', cache['size']),
+        simple_family('vark_engagement_written', 'counter', 'Engagement events written', store['written']),
+        simple_family('vark_engagement_rejected', 'counter', 'Engagement events rejected with a full buffer',
+                      store['rejected']),
+        simple_family('vark_engagement_dead_lettered', 'counter',
+                      'Engagement events set aside after failing to be written', store['dead_lettered']),
+        simple_family('vark_engagement_dropped', 'counter',
+                      'Engagement events lost because neither they nor their dead letter could be written',
+                      store['dropped']),
+        simple_family('vark_engagement_buffered', 'gauge', 'Engagement events waiting to be written',
+                      store['buffered']),
+        simple_family('vark_sessions_active', 'gauge', 'Streaming sessions in progress', session_stats['active'])
+    ] + cascade_metrics()
+
+def cascade_metrics():
+    """Metric families for the cascade, counted in this process only"""
+    cascade = predictor.cascade
+    if cascade is None:
+        return []
+    stats = cascade.stats()
+    return [
+        simple_family('vark_cascade_threshold', 'gauge', 'Cascade confidence threshold', stats['threshold']),
+        simple_family('vark_cascade_rows', 'counter', 'Rows screened by the cascade first stage', stats['rows']),
+        simple_family('vark_cascade_escalated', 'counter', 'Rows escalated to the full model',
+                      stats['escalated'])
+    ]
+
+metrics_registry.add_callback(service_metrics)
+
+@app.before_request
+def start_request_timer():
+    request.environ['vark.start_time'] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = request.environ.get('vark.start_time')
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+        REQUESTS.labels(endpoint, response.status_code).inc()
+        if response.status_code >= 500:
+            REQUEST_ERRORS.labels(endpoint).inc()
+    return response
+
+profiler.install(app)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -48,7 +385,19 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'model_loaded': predictor is not None
+        'model_loaded': predictor is not None,
+        'model_version': predictor.model_version if predictor is not None else None,
+        'serving_model': SERVING_MODEL,
+        'precision': PRECISION,
+        'cascade': predictor.cascade.stats() if predictor is not None and predictor.cascade is not None else None,
+        'worker_id': WORKER_ID,
+        'pid': os.getpid(),
+        'batching': batcher.stats(),
+        'admission': dict(admission.stats(), queue_deadline_ms=QUEUE_DEADLINE_MS,
+                          degraded_fallback=DEGRADED_FALLBACK),
+        'cache': prediction_cache.stats(),
+        'engagement_store': engagement_store.stats(),
+        'sessions': sessions.stats()
     })
 
 @app.route('/api/predict', methods=['POST'])
@@ -109,7 +458,8 @@ def predict_learning_style():
     }
     """
     try:
-        data = request.get_json()
+        with STAGES['parse_json'].time():
+            data = request.get_json()
         
         if not data or 'engagement' not in data or 'questionnaire' not in data:
             return jsonify({
@@ -119,108 +469,412 @@ def predict_learning_style():
         engagement = data['engagement']
         questionnaire = data['questionnaire']
         
-        if len(questionnaire) != 10:
+        if isinstance(questionnaire, list) and len(questionnaire) != 10:
             return jsonify({
                 'error': 'Questionnaire must have exactly 10 answers'
             }), 400
         
-        # Extract all metrics from engagement data
-        visual = engagement['visual']
-        auditory = engagement['auditory']
-        reading = engagement['reading']
-        kinesthetic = engagement['kinesthetic']
-        
-        # Prepare complete data for model
-        user_data = {
-            # Visual metrics
-            'visual_clicks': visual['clicks'],
-            'visual_time': visual['timeSpent'],
-            'video_plays': visual.get('videoPlays', 0),
-            'video_pauses': visual.get('videoPauses', 0),
-            'video_completion': visual.get('videoCompletionPercent', 0),
-            'visual_hover': visual.get('hoverTime', 0),
-            'visual_revisits': visual.get('revisits', 0),
-            
-            # Auditory metrics
-            'auditory_clicks': auditory['clicks'],
-            'auditory_time': auditory['timeSpent'],
-            'audio_plays': auditory.get('audioPlays', 0),
-            'audio_pauses': auditory.get('audioPauses', 0),
-            'audio_completion': auditory.get('audioCompletionPercent', 0),
-            'audio_seeks': auditory.get('seekEvents', 0),
-            'auditory_hover': auditory.get('hoverTime', 0),
-            'auditory_revisits': auditory.get('revisits', 0),
+        with STAGES['decode'].time():
+            row = decoder.decode(data)
+        
+        try:
+            prediction, probabilities = predict_row(row, queue_timeout=QUEUE_DEADLINE_MS, limit=admission)
+        except (InFlightFull, InferenceTimeout, BatcherFull, QueueTimeout) as e:
+            reason = overload_reason(e)
+            if reason != 'timeout':
+                SHED.labels(reason).inc()
+            if not DEGRADED_FALLBACK:
+                return inference_unavailable(e)
+            return degraded_prediction(row, engagement, questionnaire, reason)
+        
+        response = build_prediction_response(prediction, probabilities, engagement, questionnaire)
+        response['degraded'] = False
+        with STAGES['record'].time():
+            record_prediction(response, engagement, questionnaire)
+        
+        with STAGES['serialize'].time():
+            body = jsonify(response)
+        return body, 200
+        
+    except PayloadError as e:
+        return invalid_payload(e)
+    except Exception as e:
+        print(f"Error in prediction: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_learning_style_batch():
+    """
+    Predict learning styles for many learners in a single call
+    
+    Expected JSON format:
+    {
+        "items": [
+            {"engagement": {...}, "questionnaire": [...], "metadata": {...}},
+            ...
+        ]
+    }
+    
+    Every item uses the same format as /api/predict. Features are engineered
+    and both models are run once over all valid items; invalid items get their
+    own error entry and do not fail the rest of the batch. Results are returned
+    in request order.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({
+                'error': 'Missing required data. Need an items list.'
+            }), 400
+        
+        items = data['items']
+        results = [None] * len(items)
+        valid_indices = []
+        
+        # Every item is decoded into one preallocated matrix
+        all_rows, errors = decoder.decode_batch(items)
+        for i, error in enumerate(errors):
+            if error is None:
+                valid_indices.append(i)
+            else:
+                results[i] = {'success': False, 'error': str(error), 'fields': error.errors}
+        rows = all_rows[valid_indices]
+        
+        model_version = predictor.model_version
+        cache_keys = [prediction_cache.key(row, model_version) for row in rows]
+        outputs = [prediction_cache.get(key) for key in cache_keys]
+        misses = [j for j, output in enumerate(outputs) if output is None]
+        
+        if misses:
+            features = engineer_feature_matrix(rows[misses])
+            X = select_feature_columns(features, predictor.feature_columns)
             
-            # Reading metrics
-            'reading_clicks': reading['clicks'],
-            'reading_time': reading['timeSpent'],
-            'scroll_depth': reading.get('scrollDepth', 0),
-            'max_scroll': reading.get('maxScrollDepth', 0),
-            'text_selections': reading.get('textSelections', 0),
-            'reading_hover': reading.get('hoverTime', 0),
-            'reading_revisits': reading.get('revisits', 0),
+            # One blended inference over every item not already cached
+            predictions, probabilities = batcher.predict(X, timeout=INFERENCE_TIMEOUT_SECONDS)
             
-            # Kinesthetic metrics
-            'kinesthetic_clicks': kinesthetic['clicks'],
-            'kinesthetic_time': kinesthetic['timeSpent'],
-            'drag_attempts': kinesthetic.get('dragAttempts', 0),
-            'incorrect_drops': kinesthetic.get('incorrectDrops', 0),
-            'correct_drops': kinesthetic.get('correctDrops', 0),
-            'completion_time': kinesthetic.get('taskCompletionTime', 0),
-            'first_success': 1 if kinesthetic.get('firstAttemptSuccess', False) else 0,
-            'reset_clicks': kinesthetic.get('resetClicks', 0),
-            'kinesthetic_hover': kinesthetic.get('hoverTime', 0),
-            'kinesthetic_revisits': kinesthetic.get('revisits', 0)
-        }
-        
-        # Add questionnaire answers
-        for i, answer in enumerate(questionnaire):
-            user_data[f'q{i+1}'] = answer
+            for j, prediction, probs in zip(misses, predictions, probabilities):
+                outputs[j] = (prediction, probs.copy())
+                prediction_cache.put(cache_keys[j], outputs[j])
         
-        # Create DataFrame and engineer features
-        df = pd.DataFrame([user_data])
-        df_featured = engineer_features(df)
+        for i, (prediction, probs) in zip(valid_indices, outputs):
+            item = items[i]
+            try:
+                results[i] = build_prediction_response(
+                    prediction, probs, item['engagement'], item['questionnaire']
+                )
+                record_prediction(results[i], item['engagement'], item['questionnaire'])
+            except Exception as e:
+                results[i] = {'success': False, 'error': item_error_message(e)}
         
-        # Ensure all features are present
-        X = df_featured[predictor.feature_columns]
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'results': results,
+            'timestamp': datetime.now().isoformat()
+        }), 200
         
-        # Make prediction
-        prediction = predictor.predict(X)[0]
-        probabilities = predictor.predict_proba(X)[0]
+    except (InferenceTimeout, BatcherFull) as e:
+        return inference_unavailable(e)
+    except Exception as e:
+        print(f"Error in batch prediction: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+def predict_row(row, queue_timeout=None, limit=None):
+    """
+    Label and probabilities for one raw input row, cached and micro-batched.
+    With queue_timeout (ms), raises QueueTimeout if inference has not started
+    by then. A cache miss holds a slot of limit, an InFlightLimit, while it
+    is computed and raises InFlightFull if none is free.
+    """
+    with STAGES['cache_lookup'].time():
+        cache_key = prediction_cache.key(row, predictor.model_version)
+        cached = prediction_cache.get(cache_key)
+    
+    if cached is None:
+        with limit or nullcontext():
+            # Engineer features and order them as the model expects
+            with STAGES['engineer_features'].time():
+                features = engineer_feature_matrix(row)
+                X = select_feature_columns(features, predictor.feature_columns)
+            
+            # Make prediction, batched with any concurrent requests
+            with STAGES['inference'].time():
+                predictions, probabilities = batcher.predict(
+                    X, timeout=INFERENCE_TIMEOUT_SECONDS,
+                    queue_timeout=queue_timeout / 1000 if queue_timeout is not None else None)
+        cached = (predictions[0], probabilities[0].copy())
+        prediction_cache.put(cache_key, cached)
+    
+    return cached
+
+def record_prediction(response, engagement, questionnaire, session_id=None):
+    """Update the analytics aggregates and keep the raw event for rebuilds"""
+    analytics.record_prediction(response['predicted_style'], response['confidence'], engagement)
+    try:
+        engagement_store.record('prediction', {
+            'predicted_style': str(response['predicted_style']),
+            'confidence': response['confidence'],
+            'model_version': predictor.model_version,
+            'engagement': engagement,
+            'questionnaire': questionnaire
+        }, session_id=session_id)
+    except StoreFull:
+        # Analytics are best effort; the store counts the rejection
+        pass
+
+@app.route('/api/sessions', methods=['POST'])
+def start_session():
+    """
+    Start a streaming session
+    
+    Optional JSON body: {"metadata": {...}}. Returns the session_id used by
+    the other /api/sessions endpoints.
+    """
+    data = request.get_json(silent=True) or {}
+    metadata = data.get('metadata') if isinstance(data, dict) else None
+    session = sessions.create(metadata if isinstance(metadata, dict) else None)
+    
+    return jsonify({
+        'success': True,
+        'session_id': session.session_id,
+        'ttl_seconds': sessions.ttl,
+        'timestamp': datetime.now().isoformat()
+    }), 201
+
+@app.route('/api/sessions/<session_id>/events', methods=['POST'])
+def add_session_events(session_id):
+    """
+    Add a batch of engagement events to a session
+    
+    Expected JSON format:
+    {
+        "events": [
+            {"modality": "visual", "metric": "clicks", "value": 1},
+            {"modality": "visual", "metric": "videoCompletionPercent", "value": 60},
+            {"question": 1, "answer": 2}
+        ]
+    }
+    
+    Metric names are the engagement keys of /api/predict. Counters and times
+    are added, completion and maximum scroll depth keep the highest value and
+    the other metrics are overwritten. Invalid events are reported by index
+    and skipped.
+    """
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict) or not isinstance(data.get('events'), list):
+        return jsonify({
+            'error': 'Missing required data. Need an events list.',
+            'success': False
+        }), 400
+    
+    if len(data['events']) > MAX_SESSION_EVENTS:
+        return jsonify({
+            'error': f'At most {MAX_SESSION_EVENTS} events per request',
+            'success': False
+        }), 413
+    
+    try:
+        session, errors = sessions.apply_events(session_id, data['events'])
+    except SessionNotFound:
+        return session_not_found(session_id)
+    
+    return jsonify({
+        'success': True,
+        'accepted': len(data['events']) - len(errors),
+        'errors': [{'index': i, 'error': error} for i, error in errors],
+        'events': session.events,
+        'answered_questions': session.answered
+    }), 200
+
+@app.route('/api/sessions/<session_id>/predict', methods=['GET'])
+def predict_session(session_id):
+    """
+    Provisional prediction from the events received so far
+    
+    Unanswered questions are averaged over random answers, so this works
+    before the questionnaire is complete. Not recorded in analytics.
+    """
+    try:
+        rows, answered, events = sessions.snapshot(session_id)
+    except SessionNotFound:
+        return session_not_found(session_id)
+    
+    try:
+        features = engineer_feature_matrix(rows)
+        X = select_feature_columns(features, predictor.feature_columns)
+        _, probabilities = batcher.predict(X, timeout=INFERENCE_TIMEOUT_SECONDS)
+        probabilities = probabilities.mean(axis=0)
         
-        # Prepare confidence scores
         confidence_scores = {
-            'Visual': float(probabilities[predictor.label_encoder.transform(['Visual'])[0]]),
-            'Auditory': float(probabilities[predictor.label_encoder.transform(['Auditory'])[0]]),
-            'Reading': float(probabilities[predictor.label_encoder.transform(['Reading'])[0]]),
-            'Kinesthetic': float(probabilities[predictor.label_encoder.transform(['Kinesthetic'])[0]])
+            style: float(probabilities[index]) for style, index in predictor.class_index.items()
         }
+        prediction = max(confidence_scores, key=confidence_scores.get)
         
-        max_confidence = max(confidence_scores.values())
-        
-        # Generate insights based on engagement patterns
-        insights = generate_insights(engagement, questionnaire, prediction)
-        
-        response = {
+        return jsonify({
             'success': True,
+            'provisional': True,
             'predicted_style': prediction,
-            'confidence': max_confidence,
+            'confidence': confidence_scores[prediction],
             'all_scores': confidence_scores,
-            'timestamp': datetime.now().isoformat(),
-            'description': get_style_description(prediction),
-            'insights': insights,
-            'recommendations': get_recommendations(prediction, engagement)
-        }
+            'answered_questions': answered,
+            'events': events,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except (InferenceTimeout, BatcherFull) as e:
+        return inference_unavailable(e)
+    except Exception as e:
+        print(f"Error in session prediction: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
+
+@app.route('/api/sessions/<session_id>/finish', methods=['POST'])
+def finish_session(session_id):
+    """
+    Final prediction for a session, which is then closed
+    
+    Optional JSON body: {"questionnaire": [...10 answers...]} if the answers
+    were not streamed as events. The response matches /api/predict.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        answers = data.get('questionnaire') if isinstance(data, dict) else None
+        if answers is not None:
+            if not isinstance(answers, list) or len(answers) != 10:
+                return jsonify({
+                    'error': 'Questionnaire must have exactly 10 answers',
+                    'success': False
+                }), 400
+            _, errors = sessions.apply_events(session_id, [
+                {'question': i + 1, 'answer': answer} for i, answer in enumerate(answers)
+            ])
+            if errors:
+                return jsonify({
+                    'error': f'Invalid questionnaire answer {errors[0][0] + 1}: {errors[0][1]}',
+                    'success': False
+                }), 400
+        
+        row, engagement, questionnaire, answered = sessions.state(session_id)
+        if questionnaire is None:
+            return jsonify({
+                'error': f'Questionnaire incomplete: {answered} of 10 answers',
+                'success': False
+            }), 400
+        
+        prediction, probabilities = predict_row(row)
+        response = build_prediction_response(prediction, probabilities, engagement, questionnaire)
+        response['session_id'] = session_id
+        
+        sessions.pop(session_id)
+        record_prediction(response, engagement, questionnaire, session_id=session_id)
         
         return jsonify(response), 200
         
+    except SessionNotFound:
+        return session_not_found(session_id)
+    except (InferenceTimeout, BatcherFull) as e:
+        return inference_unavailable(e)
     except Exception as e:
-        print(f"Error in prediction: {str(e)}")
+        print(f"Error in session prediction: {str(e)}")
         return jsonify({
             'error': str(e),
             'success': False
         }), 500
 
+def inference_unavailable(error):
+    """503 when inference is saturated, 504 when the request timed out"""
+    if isinstance(error, (InFlightFull, BatcherFull, QueueTimeout)):
+        return jsonify({
+            'error': 'Inference is at capacity, retry shortly',
+            'success': False
+        }), 503, {'Retry-After': '1'}
+    return jsonify({
+        'error': f'Inference timed out after {INFERENCE_TIMEOUT_SECONDS:g}s',
+        'success': False
+    }), 504
+
+def overload_reason(error):
+    """Label of the shed and degraded counters for an inference error"""
+    if isinstance(error, InFlightFull):
+        return 'in_flight'
+    if isinstance(error, BatcherFull):
+        return 'queue_full'
+    if isinstance(error, QueueTimeout):
+        return 'queue_deadline'
+    return 'timeout'
+
+def degraded_prediction(row, engagement, questionnaire, reason):
+    """
+    200 with the rule-based fallback's answer for a request the model could
+    not serve. It is flagged degraded and kept out of the cache and analytics.
+    """
+    DEGRADED.labels(reason).inc()
+    prediction, probabilities = fallback.predict_row(row)
+    response = build_prediction_response(prediction, probabilities, engagement, questionnaire)
+    response['degraded'] = True
+    response['degraded_reason'] = reason
+    with STAGES['serialize'].time():
+        body = jsonify(response)
+    return body, 200
+
+def invalid_payload(error):
+    """400 listing every field that failed validation"""
+    return jsonify({
+        'error': str(error),
+        'fields': error.errors,
+        'success': False
+    }), 400
+
+def session_not_found(session_id):
+    return jsonify({
+        'error': f'Unknown or expired session {session_id}',
+        'success': False
+    }), 404
+
+def item_error_message(error):
+    """Readable error for a single batch item"""
+    if isinstance(error, KeyError):
+        return f"Missing field: {error.args[0]}"
+    return str(error)
+
+def build_prediction_response(prediction, probabilities, engagement, questionnaire):
+    """Assemble the API response for one predicted learner"""
+    # Prepare confidence scores
+    class_index = predictor.class_index
+    confidence_scores = {
+        style: float(probabilities[class_index[style]])
+        for style in ('Visual', 'Auditory', 'Reading', 'Kinesthetic')
+    }
+    
+    max_confidence = max(confidence_scores.values())
+    
+    # Generate insights based on engagement patterns
+    with STAGES['insights'].time():
+        insights = generate_insights(engagement, questionnaire, prediction)
+    with STAGES['recommendations'].time():
+        recommendations = get_recommendations(prediction, engagement)
+    
+    return {
+        'success': True,
+        'predicted_style': prediction,
+        'confidence': max_confidence,
+        'all_scores': confidence_scores,
+        'timestamp': datetime.now().isoformat(),
+        'description': get_style_description(prediction),
+        'insights': insights,
+        'recommendations': recommendations
+    }
+
 def generate_insights(engagement, questionnaire, predicted_style):
     """Generate personalized insights based on engagement patterns"""
     insights = []
@@ -333,46 +987,147 @@ def get_style_description(style):
 @app.route('/api/save-engagement', methods=['POST'])
 def save_engagement():
     """
-    Save engagement data for analytics (optional)
+    Save engagement data for analytics
+    
+    The payload is queued for the background writer; the request never waits
+    on the database. Returns 503 when the write buffer is full.
     """
     try:
         data = request.get_json()
-        # In production, you would save this to a database
-        # For now, just log it
-        print(f"Engagement data received at {datetime.now()}")
-        print(f"Session data: {data.get('metadata', {})}")
+        
+        if not isinstance(data, dict):
+            return jsonify({
+                'error': 'Expected a JSON object',
+                'success': False
+            }), 400
+        
+        metadata = data.get('metadata')
+        session_id = metadata.get('sessionId') if isinstance(metadata, dict) else None
+        if not isinstance(session_id, str):
+            # Stored in a TEXT column by the background writer
+            session_id = None
+        engagement_store.record('engagement', data, session_id=session_id)
+        analytics.record_engagement(data.get('engagement'))
         
         return jsonify({
             'success': True,
             'message': 'Engagement data received',
             'timestamp': datetime.now().isoformat()
         }), 200
+    except StoreFull as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({
             'error': str(e),
             'success': False
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, stage, batching and cache metrics in the Prometheus text format"""
+    return metrics_registry.render(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+def admin_allowed():
+    if ADMIN_TOKEN and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return True
+    return ADMIN_ALLOW_LOCALHOST and request.remote_addr in ('127.0.0.1', '::1')
+
+def admin_forbidden():
+    return jsonify({
+        'error': 'Admin access required',
+        'success': False
+    }), 403
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Profiler settings and the buffered request profiles, newest first"""
+    if not admin_allowed():
+        return admin_forbidden()
+    return jsonify({
+        'success': True,
+        'settings': profiler.settings(),
+        'profiles': profiler.profiles()
+    }), 200
+
+@app.route('/api/admin/profiles/<int:profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    Download one profile: folded stacks as text, or a cProfile capture as a
+    .prof file readable by pstats and snakeviz (?format=text for a report)
+    """
+    if not admin_allowed():
+        return admin_forbidden()
+    entry = profiler.get(profile_id)
+    if entry is None:
+        return jsonify({
+            'error': f'No buffered profile {profile_id}',
+            'success': False
+        }), 404
+    
+    if entry['format'] == 'folded':
+        return entry['data'], 200, {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'Content-Disposition': f'attachment; filename=profile-{profile_id}.folded'
+        }
+    if request.args.get('format') == 'text':
+        return format_cprofile(entry['data']), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return entry['data'], 200, {
+        'Content-Type': 'application/octet-stream',
+        'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'
+    }
+
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
     """
-    Get aggregated analytics (placeholder for future implementation)
+    Get aggregated analytics
+    
+    Query parameters:
+        window  rolling window in seconds (default: the whole retention period)
+        series  1 to include per-bucket counts
+    
+    Served from incrementally maintained aggregates, so the cost depends on
+    the number of time buckets and not on the number of sessions.
     """
-    return jsonify({
-        'message': 'Analytics endpoint - implement database queries here',
-        'timestamp': datetime.now().isoformat()
-    }), 200
+    try:
+        window = request.args.get('window', type=float)
+        series = request.args.get('series', '0') in ('1', 'true', 'yes')
+        
+        if window is not None and window <= 0:
+            return jsonify({
+                'error': 'window must be a positive number of seconds',
+                'success': False
+            }), 400
+        
+        result = current_analytics().query(window_seconds=window, series=series)
+        result['success'] = True
+        result['timestamp'] = datetime.now().isoformat()
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 500
 
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("VARK LEARNING STYLE PREDICTOR API")
     print("="*60)
-    print("API running on http://localhost:5000")
+    print("API running on http://localhost:5000 (development server; use serve.py in production)")
     print("\nEndpoints:")
     print("  GET  /api/health           - Health check")
     print("  POST /api/predict          - Predict learning style")
+    print("  POST /api/predict/batch    - Predict learning styles in bulk")
+    print("  POST /api/sessions         - Start a streaming session")
+    print("  POST /api/sessions/<id>/events  - Add session events")
+    print("  GET  /api/sessions/<id>/predict - Provisional prediction")
+    print("  POST /api/sessions/<id>/finish  - Final prediction")
     print("  POST /api/save-engagement  - Save engagement data")
     print("  GET  /api/analytics        - Get analytics")
+    print("  GET  /api/metrics          - Prometheus metrics")
+    print("  GET  /api/admin/profiles   - Request profiles (when profiling is enabled)")
     print("="*60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
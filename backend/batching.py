@@ -0,0 +1,209 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+# ============================================
+# DYNAMIC MICRO-BATCHING
+# ============================================
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+class BatcherFull(Exception):
+    """More requests are waiting for inference than max_pending allows"""
+
+class QueueTimeout(Exception):
+    """A request's batch had not started by its queue deadline"""
+
+class MicroBatcher:
+    """
+    Coalesce concurrent inference requests into batched model calls.
+
+    Callers submit feature rows from any thread. Each of the `workers`
+    threads takes the first waiting request, keeps collecting more for up to
+    max_wait_ms or until max_batch_size rows are queued, runs predict_fn once
+    on the stacked rows and hands each caller back its own slice of the
+    results. At most `workers` model calls therefore run at once, whatever
+    the number of request threads.
+
+    predict_fn takes a 2-D array and returns a tuple of arrays that are
+    indexed by row, e.g. HybridVARKPredictor.predict_with_proba.
+
+    With max_pending set, submit() raises BatcherFull instead of queueing
+    once that many requests are unfinished, and a request that times out in
+    predict() is cancelled so its rows are skipped if not yet started.
+    predict() can also withdraw a request that is still queued after
+    queue_timeout, so callers under overload fail fast with QueueTimeout
+    instead of waiting out the full timeout.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0, workers=1, max_pending=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._largest_batch = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._rejected = 0
+        self._timeouts = 0
+        self._expired = 0
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._run, name=f'micro-batcher-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, X):
+        """Queue feature rows for inference; returns a Future"""
+        if self._closed:
+            raise RuntimeError('MicroBatcher is closed')
+        X = np.atleast_2d(X)
+        with self._lock:
+            if self.max_pending is not None and self._pending >= self.max_pending:
+                self._rejected += 1
+                raise BatcherFull(f'{self._pending} inference requests already pending')
+            self._pending += 1
+        future = Future()
+        future.add_done_callback(self._done)
+        self._queue.put((X, future))
+        return future
+
+    def predict(self, X, timeout=None, queue_timeout=None):
+        """
+        Submit rows and wait for their slice of the batched results.
+
+        With queue_timeout, raises QueueTimeout if the rows' batch has not
+        started after that many seconds; timeout bounds the whole wait.
+        """
+        future = self.submit(X)
+        start = time.perf_counter()
+        try:
+            if queue_timeout is not None:
+                try:
+                    return future.result(timeout=queue_timeout if timeout is None else min(queue_timeout, timeout))
+                except TimeoutError:
+                    # Fails if the batch is already running, which is then awaited
+                    if future.cancel():
+                        with self._lock:
+                            self._expired += 1
+                        raise QueueTimeout(f'Inference did not start within {queue_timeout * 1000:g} ms')
+            remaining = None if timeout is None else max(0.0, timeout - (time.perf_counter() - start))
+            return future.result(timeout=remaining)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def close(self):
+        """Stop the workers after the requests already queued are served"""
+        if not self._closed:
+            self._closed = True
+            for _ in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self):
+        """Queue depth and batch size metrics"""
+        with self._lock:
+            histogram = {}
+            cumulative = 0
+            for bound, count in zip(BATCH_SIZE_BUCKETS + ['+Inf'], self._batch_size_counts):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            return {
+                'queue_depth': self._queue.qsize(),
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'workers': len(self._workers),
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'expired': self._expired,
+                'batches': self._batches,
+                'requests': self._requests,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'largest_batch_size': self._largest_batch,
+                'batch_size_histogram': histogram,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0
+            }
+
+    def _collect(self, first):
+        """Gather requests after the first until the window or batch is full"""
+        batch = [first]
+        rows = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Let the run loop see the shutdown sentinel after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+            rows += len(item[0])
+
+        return batch, rows
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch, _ = self._collect(first)
+            # Drop requests whose caller already gave up
+            batch = [(X, future) for X, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            rows = sum(len(X) for X, _ in batch)
+            futures = [future for _, future in batch]
+
+            try:
+                X = np.concatenate([X for X, _ in batch]) if len(batch) > 1 else batch[0][0]
+                outputs = self.predict_fn(X)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                start = 0
+                for X_part, future in batch:
+                    stop = start + len(X_part)
+                    future.set_result(tuple(output[start:stop] for output in outputs))
+                    start = stop
+
+            self._record(len(batch), rows)
+
+    def _record(self, n_requests, rows):
+        with self._lock:
+            self._batches += 1
+            self._requests += n_requests
+            self._rows += rows
+            self._largest_batch = max(self._largest_batch, rows)
+            for i, bound in enumerate(BATCH_SIZE_BUCKETS):
+                if rows <= bound:
+                    self._batch_size_counts[i] += 1
+                    break
+            else:
+                self._batch_size_counts[-1] += 1
@@ -0,0 +1,518 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from vark_features import INPUT_COLUMNS, FEATURE_COLUMNS, engineer_feature_matrix
+
+# ============================================
+# 1. HELPERS
+# ============================================
+
+def time_call(fn, repeat=5):
+    """Best-of-N wall-clock time of fn() in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def latency_summary(samples):
+    """Mean and percentiles of per-call latencies in seconds"""
+    samples = np.asarray(samples)
+    return {
+        'mean_s': float(samples.mean()),
+        'p50_s': float(np.percentile(samples, 50)),
+        'p95_s': float(np.percentile(samples, 95)),
+        'p99_s': float(np.percentile(samples, 99))
+    }
+
+def sample_inputs(n_rows, seed=0):
+    """Draw n_rows raw input rows by resampling a synthetic dataset"""
+    from vark_ml_model import generate_synthetic_data
+
+    np.random.seed(seed)
+    base = generate_synthetic_data(n_samples=min(n_rows, 5000))
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(base), size=n_rows)
+    return base[INPUT_COLUMNS].iloc[index].reset_index(drop=True)
+
+# ============================================
+# 2. FEATURE ENGINEERING
+# ============================================
+
+def check_feature_parity(df):
+    """Assert the NumPy fast path matches engineer_features bit for bit"""
+    from vark_ml_model import engineer_features
+
+    expected = engineer_features(df)[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    actual = engineer_feature_matrix(df[INPUT_COLUMNS].to_numpy(dtype=np.float64))
+
+    if expected.shape != actual.shape or not np.array_equal(expected, actual):
+        mismatched = [name for j, name in enumerate(FEATURE_COLUMNS)
+                      if not np.array_equal(expected[:, j], actual[:, j])]
+        raise AssertionError(f"engineer_feature_matrix differs on: {mismatched}")
+
+def bench_features(sizes=(1, 1000, 1000000), reference_limit=1000000):
+    """Compare engineer_features against engineer_feature_matrix"""
+    from vark_ml_model import engineer_features
+
+    results = []
+    for n_rows in sizes:
+        df = sample_inputs(n_rows)
+        X = df[INPUT_COLUMNS].to_numpy(dtype=np.float64)
+        check_feature_parity(df if n_rows <= 10000 else df.iloc[:10000])
+
+        repeat = 5 if n_rows <= 1000 else 1
+        fast = time_call(lambda: engineer_feature_matrix(X), repeat=repeat)
+        reference = None
+        if n_rows <= reference_limit:
+            reference = time_call(lambda: engineer_features(df), repeat=repeat)
+
+        results.append({'rows': n_rows, 'pandas_s': reference, 'numpy_s': fast})
+
+    print(f"{'rows':>10} {'pandas (ms)':>14} {'numpy (ms)':>12} {'speedup':>10}")
+    for r in results:
+        pandas_ms = f"{r['pandas_s'] * 1000:.3f}" if r['pandas_s'] is not None else '-'
+        speedup = f"{r['pandas_s'] / r['numpy_s']:.0f}x" if r['pandas_s'] is not None else '-'
+        print(f"{r['rows']:>10} {pandas_ms:>14} {r['numpy_s'] * 1000:>12.3f} {speedup:>10}")
+
+    return results
+
+def bench_generate(sizes=(5000, 100000)):
+    """Time generate_synthetic_data at several sizes"""
+    from vark_ml_model import generate_synthetic_data
+
+    results = []
+    for n_rows in sizes:
+        repeat = 3 if n_rows <= 10000 else 1
+        seconds = time_call(lambda: generate_synthetic_data(n_samples=n_rows, seed=0), repeat=repeat)
+        results.append({'rows': n_rows, 'generate_s': seconds})
+
+    print(f"{'rows':>10} {'generate (ms)':>15} {'rows/s':>12}")
+    for r in results:
+        print(f"{r['rows']:>10} {r['generate_s'] * 1000:>15.2f} {r['rows'] / r['generate_s']:>12.0f}")
+
+    return results
+
+# ============================================
+# 3. MODELS
+# ============================================
+
+def load_predictor(path):
+    """Unpickle a trained HybridVARKPredictor"""
+    import pickle
+    import vark_ml_model  # noqa: F401 - needed to unpickle the predictor
+
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def bench_dense(predictor, sizes=(1, 64, 1024)):
+    """Compare keras.Model.predict against the folded NumPy forward pass"""
+    from vark_dense import DenseNetwork, check_dense_parity
+
+    network = DenseNetwork.from_keras(predictor.dl_model)
+    X = predictor.scaler.transform(sample_inputs_featured(max(sizes), predictor))
+    max_diff = check_dense_parity(predictor.dl_model, network, X)
+    print(f"Max |keras - numpy| probability difference: {max_diff:.2e}")
+
+    results = []
+    for n_rows in sizes:
+        keras_s = time_call(lambda: predictor.dl_model.predict(X[:n_rows], verbose=0))
+        numpy_s = time_call(lambda: network.predict(X[:n_rows]))
+        results.append({'rows': n_rows, 'keras_s': keras_s, 'numpy_s': numpy_s})
+
+    print(f"{'rows':>10} {'keras (ms)':>12} {'numpy (ms)':>12} {'speedup':>10}")
+    for r in results:
+        print(f"{r['rows']:>10} {r['keras_s'] * 1000:>12.3f} {r['numpy_s'] * 1000:>12.3f} "
+              f"{r['keras_s'] / r['numpy_s']:>9.0f}x")
+
+    return results
+
+def bench_trees(predictor, sizes=(1, 64, 1024, 10000)):
+    """Compare the sklearn VotingClassifier against the flattened tree arrays"""
+    import pickle
+    from vark_trees import FlatVotingEnsemble, check_tree_parity
+
+    flat = FlatVotingEnsemble.from_sklearn(predictor.ensemble_model)
+    X = predictor.scaler.transform(sample_inputs_featured(max(sizes), predictor))
+    max_diff = check_tree_parity(predictor.ensemble_model, flat, X)
+    pickled_mb = len(pickle.dumps(predictor.ensemble_model)) / 1e6
+    print(f"Max |sklearn - flat| probability difference: {max_diff:.2e}")
+    print(f"Pickled VotingClassifier: {pickled_mb:.2f} MB, flat node arrays: {flat.nbytes / 1e6:.2f} MB")
+
+    results = []
+    for n_rows in sizes:
+        sklearn_s = time_call(lambda: predictor.ensemble_model.predict_proba(X[:n_rows]))
+        flat_s = time_call(lambda: flat.predict_proba(X[:n_rows]))
+        results.append({'rows': n_rows, 'sklearn_s': sklearn_s, 'flat_s': flat_s})
+
+    print(f"{'rows':>10} {'sklearn (ms)':>14} {'flat (ms)':>12} {'speedup':>10}")
+    for r in results:
+        print(f"{r['rows']:>10} {r['sklearn_s'] * 1000:>14.3f} {r['flat_s'] * 1000:>12.3f} "
+              f"{r['sklearn_s'] / r['flat_s']:>9.1f}x")
+
+    return results
+
+def bench_members(predictor, sizes=(1, 64, 1024)):
+    """Time each member of the voting ensemble on its own"""
+    X = predictor.scaler.transform(sample_inputs_featured(max(sizes), predictor))
+    members = predictor.ensemble_model.named_estimators_
+
+    results = []
+    for n_rows in sizes:
+        result = {'rows': n_rows}
+        for name, estimator in members.items():
+            result[f'{name}_s'] = time_call(lambda: estimator.predict_proba(X[:n_rows]))
+        results.append(result)
+
+    print(f"{'rows':>10} " + ' '.join(f"{name + ' (ms)':>12}" for name in members))
+    for r in results:
+        print(f"{r['rows']:>10} " + ' '.join(f"{r[f'{name}_s'] * 1000:>12.3f}" for name in members))
+
+    return results
+
+def bench_hybrid(predictor, sizes=(1, 64, 1024)):
+    """Time HybridVARKPredictor.predict and predict_proba with each engine"""
+    X = pd.DataFrame(sample_inputs_featured(max(sizes), predictor), columns=predictor.feature_columns)
+    engines = (getattr(predictor, 'dl_engine', None), getattr(predictor, 'ensemble_engine', None))
+
+    results = []
+    try:
+        for n_rows in sizes:
+            batch = X.iloc[:n_rows]
+            result = {'rows': n_rows}
+            for engine in ('keras', 'numpy'):
+                predictor.use_numpy_engine(engine == 'numpy')
+                result[f'{engine}_predict_s'] = time_call(lambda: predictor.predict(batch))
+                result[f'{engine}_predict_proba_s'] = time_call(lambda: predictor.predict_proba(batch))
+            results.append(result)
+    finally:
+        predictor.dl_engine, predictor.ensemble_engine = engines
+
+    print(f"{'rows':>10} {'keras predict':>14} {'keras proba':>12} {'numpy predict':>14} {'numpy proba':>12}   (ms)")
+    for r in results:
+        print(f"{r['rows']:>10} {r['keras_predict_s'] * 1000:>14.3f} {r['keras_predict_proba_s'] * 1000:>12.3f} "
+              f"{r['numpy_predict_s'] * 1000:>14.3f} {r['numpy_predict_proba_s'] * 1000:>12.3f}")
+
+    return results
+
+def sample_inputs_featured(n_rows, predictor):
+    """Engineered feature rows in the predictor's column order"""
+    from vark_features import select_feature_columns
+
+    X = sample_inputs(n_rows)[INPUT_COLUMNS].to_numpy(dtype=np.float64)
+    return select_feature_columns(engineer_feature_matrix(X), predictor.feature_columns)
+
+# ============================================
+# 4. SERVING STARTUP
+# ============================================
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Regression budgets for a serving process whose model is already exported
+STARTUP_BUDGETS = {
+    'import_serving_s': 0.5,
+    'cold_start_s': 2.0
+}
+
+# Training-only dependencies that must not be imported for serving
+TRAINING_ONLY_MODULES = ('tensorflow', 'keras', 'sklearn', 'pandas')
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import vark_serving
+import_serving_s = time.perf_counter() - start
+# Load what app imports first, so importing app times its module setup,
+# which is dominated by initialize_model
+import flask, flask_cors, vark_artifacts, batching, prediction_cache, engagement_store, analytics, sessions
+app_start = time.perf_counter()
+import app
+initialize_model_s = time.perf_counter() - app_start
+assert app.app.test_client().get('/api/health').status_code == 200
+cold_start_s = time.perf_counter() - start
+# ru_maxrss survives exec on Linux and would report the parent's peak
+with open('/proc/self/status') as f:
+    rss_mb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS')) / 1024
+print(json.dumps({
+    'import_serving_s': import_serving_s,
+    'initialize_model_s': initialize_model_s,
+    'cold_start_s': cold_start_s,
+    'rss_mb': rss_mb,
+    'training_modules': [m for m in %r if m in sys.modules]
+}))
+''' % (TRAINING_ONLY_MODULES,)
+
+def run_startup_probe(model_dir):
+    """Start the API in a fresh interpreter and report its startup costs"""
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=model_dir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def check_startup(model_dir, budgets=STARTUP_BUDGETS):
+    """Fail if serving imports training code or starts slower than its budget"""
+    # The first start may still have to export the serving model
+    run_startup_probe(model_dir)
+    result = run_startup_probe(model_dir)
+
+    print(f"Import vark_serving: {result['import_serving_s'] * 1000:.0f} ms "
+          f"(budget {budgets['import_serving_s'] * 1000:.0f} ms)")
+    print(f"initialize_model (import app): {result['initialize_model_s'] * 1000:.0f} ms")
+    print(f"Cold start to first health check: {result['cold_start_s'] * 1000:.0f} ms "
+          f"(budget {budgets['cold_start_s'] * 1000:.0f} ms)")
+    print(f"RSS after startup: {result['rss_mb']:.0f} MB")
+
+    failures = [f"{name} {result[name]:.3f}s > {budget:.3f}s"
+                for name, budget in budgets.items() if result[name] > budget]
+    if result['training_modules']:
+        failures.append(f"training-only modules imported: {result['training_modules']}")
+    return result, failures
+
+# ============================================
+# 5. END-TO-END API
+# ============================================
+
+SAMPLE_PAYLOAD = {
+    'engagement': {
+        'visual': {'clicks': 15, 'timeSpent': 300, 'videoPlays': 5, 'videoPauses': 2,
+                   'videoCompletionPercent': 85, 'hoverTime': 45, 'revisits': 1},
+        'auditory': {'clicks': 3, 'timeSpent': 45, 'audioPlays': 1, 'audioPauses': 0,
+                     'audioCompletionPercent': 30, 'seekEvents': 0, 'hoverTime': 10, 'revisits': 0},
+        'reading': {'clicks': 5, 'timeSpent': 80, 'scrollDepth': 45, 'maxScrollDepth': 60,
+                    'textSelections': 2, 'hoverTime': 15, 'revisits': 0},
+        'kinesthetic': {'clicks': 2, 'timeSpent': 30, 'dragAttempts': 4, 'incorrectDrops': 1,
+                        'correctDrops': 3, 'taskCompletionTime': 45, 'firstAttemptSuccess': True,
+                        'resetClicks': 0, 'hoverTime': 20, 'revisits': 0}
+    },
+    'questionnaire': [0, 0, 1, 0, 2, 0, 0, 1, 0, 0],
+    'metadata': {'firstInteraction': 'visual', 'totalSessionTime': 500}
+}
+
+API_SCRIPT = '''
+import copy, json, sys, time
+import app
+payload, n_requests = json.loads(sys.argv[1]), int(sys.argv[2])
+client = app.app.test_client()
+
+def post(body):
+    start = time.perf_counter()
+    response = client.post('/api/predict', json=body)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return time.perf_counter() - start
+
+def varied(i):
+    # A distinct input row per request so the prediction cache never answers
+    body = copy.deepcopy(payload)
+    body['engagement']['visual']['timeSpent'] += i
+    return body
+
+for i in range(10):
+    post(varied(n_requests + i))
+uncached = [post(varied(i)) for i in range(n_requests)]
+post(payload)
+cached = [post(payload) for _ in range(n_requests)]
+print(json.dumps({'uncached': uncached, 'cached': cached}))
+'''
+
+def bench_api(model_dir, n_requests=200):
+    """Sequential /api/predict latency through the Flask test client"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Keep the benchmark's events and analytics out of the model directory
+        env = dict(os.environ, PYTHONPATH=BACKEND_DIR,
+                   VARK_ENGAGEMENT_DB=os.path.join(tmp_dir, 'engagement.db'),
+                   VARK_ANALYTICS_SNAPSHOT=os.path.join(tmp_dir, 'analytics_snapshot.json'))
+        env.pop('VARK_SESSION_DB', None)
+        completed = subprocess.run(
+            [sys.executable, '-c', API_SCRIPT, json.dumps(SAMPLE_PAYLOAD), str(n_requests)],
+            cwd=model_dir, env=env, capture_output=True, text=True, check=True
+        )
+    latencies = json.loads(completed.stdout.strip().splitlines()[-1])
+    result = {'requests': n_requests}
+    result.update({name: latency_summary(samples) for name, samples in latencies.items()})
+
+    print(f"{'requests':>10} {'mean (ms)':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}")
+    for name in ('uncached', 'cached'):
+        r = result[name]
+        print(f"{name:>10} {r['mean_s'] * 1000:>10.2f} {r['p50_s'] * 1000:>10.2f} "
+              f"{r['p95_s'] * 1000:>10.2f} {r['p99_s'] * 1000:>10.2f}")
+
+    return result
+
+# ============================================
+# 6. RESULTS AND BASELINES
+# ============================================
+
+def flatten_metrics(results):
+    """
+    Every timing in the results as {name: seconds}, e.g. 'features.numpy@1000'
+    for a per-batch-size row or 'api.uncached.p95' for a summary value.
+    """
+    metrics = {}
+
+    def add(prefix, value):
+        if isinstance(value, list):
+            for row in value:
+                for key, item in row.items():
+                    if key.endswith('_s') and item is not None:
+                        metrics[f"{prefix}.{key[:-2]}@{row['rows']}"] = float(item)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if isinstance(item, dict):
+                    add(f'{prefix}.{key}', item)
+                elif key.endswith('_s') and item is not None:
+                    metrics[f'{prefix}.{key[:-2]}'] = float(item)
+
+    for section, value in results.items():
+        add(section, value)
+    return metrics
+
+def environment_info():
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+def compare_to_baseline(metrics, baseline, threshold=0.25, min_delta=0.0005):
+    """
+    Compare against the metrics of an earlier run. A metric regresses when it
+    is more than threshold (a fraction) and more than min_delta seconds slower
+    than the baseline; metrics missing from either run are skipped.
+    """
+    failures = []
+    print(f"{'metric':<40} {'baseline (ms)':>14} {'current (ms)':>14} {'change':>8}")
+    for name in sorted(set(metrics) & set(baseline)):
+        current, previous = metrics[name], baseline[name]
+        change = (current - previous) / previous if previous > 0 else 0.0
+        regressed = current > previous * (1 + threshold) and current - previous > min_delta
+        if regressed:
+            failures.append(f"{name} {previous * 1000:.3f} ms -> {current * 1000:.3f} ms ({change:+.0%})")
+        print(f"{name:<40} {previous * 1000:>14.3f} {current * 1000:>14.3f} {change:>+8.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return failures
+
+# ============================================
+# 7. ENTRY POINT
+# ============================================
+
+def main():
+    parser = argparse.ArgumentParser(description='VARK prediction pipeline benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 1000, 1000000],
+                        help='Batch sizes for the feature engineering benchmark')
+    parser.add_argument('--reference-limit', type=int, default=1000000,
+                        help='Largest batch size to time the pandas implementation on')
+    parser.add_argument('--data-sizes', type=int, nargs='+', default=[5000, 100000],
+                        help='Row counts for the synthetic data benchmark')
+    parser.add_argument('--model', default=None,
+                        help='Pickled HybridVARKPredictor to benchmark model inference with')
+    parser.add_argument('--model-sizes', type=int, nargs='+', default=[1, 64, 1024, 10000],
+                        help='Batch sizes for the model benchmarks')
+    parser.add_argument('--api-dir', default=None,
+                        help='Directory holding vark_model.pkl to benchmark /api/predict in')
+    parser.add_argument('--api-requests', type=int, default=200)
+    parser.add_argument('--startup-dir', default=None,
+                        help='Directory holding vark_model.pkl to check API startup budgets in')
+    parser.add_argument('--json', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline, as a fraction')
+    parser.add_argument('--min-delta', type=float, default=0.0005,
+                        help='Slowdowns smaller than this many seconds never count as regressions')
+    args = parser.parse_args()
+
+    # TensorFlow would pick up a GPU where there is one; keep runs comparable
+    os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+    results = {}
+    failures = []
+
+    print("=" * 60)
+    print("FEATURE ENGINEERING")
+    print("=" * 60)
+    results['features'] = bench_features(args.sizes, args.reference_limit)
+    
+    print("\n" + "=" * 60)
+    print("SYNTHETIC DATA")
+    print("=" * 60)
+    results['data'] = bench_generate(args.data_sizes)
+    
+    if args.model:
+        predictor = load_predictor(args.model)
+        
+        print("\n" + "=" * 60)
+        print("DEEP MODEL")
+        print("=" * 60)
+        results['dense'] = bench_dense(predictor, args.model_sizes)
+        
+        print("\n" + "=" * 60)
+        print("TREE ENSEMBLE")
+        print("=" * 60)
+        results['trees'] = bench_trees(predictor, args.model_sizes)
+        
+        print("\n" + "=" * 60)
+        print("ENSEMBLE MEMBERS")
+        print("=" * 60)
+        results['members'] = bench_members(predictor, args.model_sizes)
+        
+        print("\n" + "=" * 60)
+        print("HYBRID PREDICTOR")
+        print("=" * 60)
+        results['hybrid'] = bench_hybrid(predictor, args.model_sizes)
+    
+    if args.api_dir:
+        print("\n" + "=" * 60)
+        print("END-TO-END /api/predict")
+        print("=" * 60)
+        results['api'] = bench_api(args.api_dir, args.api_requests)
+    
+    if args.startup_dir:
+        print("\n" + "=" * 60)
+        print("SERVING STARTUP")
+        print("=" * 60)
+        results['startup'], startup_failures = check_startup(args.startup_dir)
+        failures.extend(startup_failures)
+    
+    metrics = flatten_metrics(results)
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['metrics']
+        print("\n" + "=" * 60)
+        print(f"COMPARISON WITH {args.baseline}")
+        print("=" * 60)
+        failures.extend(compare_to_baseline(metrics, baseline, args.threshold, args.min_delta))
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(),
+                'environment': environment_info(),
+                'arguments': vars(args),
+                'results': results,
+                'metrics': metrics
+            }, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    
+    if failures:
+        print("\nRegressions: " + "; ".join(failures))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# ============================================
+# 1. STORAGE BACKENDS
+# ============================================
+
+class SQLiteBackend:
+    """
+    Append-only event table in a SQLite database running in WAL mode.
+
+    Events are written in batched transactions by a single writer thread, so
+    after a crash the table holds a prefix of the submitted events in order.
+    Events that cannot be stored are set aside in a dead_letters table with
+    the error that rejected them.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            received_at TEXT NOT NULL,
+            session_id TEXT,
+            payload TEXT NOT NULL
+        )
+    """
+
+    DEAD_LETTER_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT,
+            received_at TEXT,
+            session_id TEXT,
+            payload TEXT,
+            error TEXT NOT NULL,
+            failed_at TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # WAL with synchronous=NORMAL keeps committed transactions intact and
+        # in order across an application crash without an fsync per commit
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute(self.DEAD_LETTER_SCHEMA)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS events_kind ON events (kind, seq)')
+        self._conn.commit()
+
+    def write_batch(self, records):
+        """Insert (kind, received_at, session_id, payload) records in one transaction"""
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO events (kind, received_at, session_id, payload) VALUES (?, ?, ?, ?)',
+                [(kind, received_at, session_id, json.dumps(payload))
+                 for kind, received_at, session_id, payload in records]
+            )
+
+    def write_dead_letter(self, record, error):
+        """Keep a record that write_batch rejected, as text, with its error"""
+        kind, received_at, session_id, payload = record
+        try:
+            payload = json.dumps(payload, default=repr)
+        except Exception:
+            payload = repr(payload)
+        with self._conn:
+            self._conn.execute(
+                'INSERT INTO dead_letters (kind, received_at, session_id, payload, error, failed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (str(kind), str(received_at), None if session_id is None else str(session_id),
+                 payload, str(error), datetime.now().isoformat())
+            )
+
+    def iter_events(self, kind=None, batch_size=1000):
+        """Yield stored (seq, kind, received_at, session_id, payload) rows in order"""
+        conn = sqlite3.connect(self.path)
+        try:
+            query = 'SELECT seq, kind, received_at, session_id, payload FROM events'
+            params = ()
+            if kind is not None:
+                query += ' WHERE kind = ?'
+                params = (kind,)
+            cursor = conn.execute(query + ' ORDER BY seq', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for seq, row_kind, received_at, session_id, payload in rows:
+                    yield seq, row_kind, received_at, session_id, json.loads(payload)
+        finally:
+            conn.close()
+
+    def close(self):
+        self._conn.close()
+
+# ============================================
+# 2. WRITE-BEHIND STORE
+# ============================================
+
+class StoreFull(Exception):
+    """The write buffer stayed full for longer than the enqueue timeout"""
+
+class EngagementStore:
+    """
+    Bounded in-memory buffer in front of a storage backend.
+
+    Request handlers only enqueue. A background writer drains the buffer in
+    FIFO order and flushes a batch once flush_size events are waiting or
+    flush_interval seconds have passed since the first one. When the buffer
+    is full, record() waits up to enqueue_timeout and then raises StoreFull
+    so callers can shed load instead of stalling.
+
+    A batch that still fails after max_attempts writes is retried one event
+    at a time, and events that fail on their own go to the backend's dead
+    letters (or are dropped if that fails too), so one bad event cannot
+    stall the writer.
+    """
+
+    def __init__(self, backend, max_buffer=10000, flush_size=500, flush_interval=0.25,
+                 enqueue_timeout=0.05, max_attempts=8):
+        self.backend = backend
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.write_errors = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self._writer = threading.Thread(target=self._run, name='engagement-writer', daemon=True)
+        self._writer.start()
+
+    def record(self, kind, payload, session_id=None):
+        """Queue an event for durable storage"""
+        if self._closed:
+            raise RuntimeError('EngagementStore is closed')
+        item = (kind, datetime.now().isoformat(), session_id, payload)
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise StoreFull(f'Engagement buffer is full ({self._queue.maxsize} events)')
+        with self._lock:
+            self.enqueued += 1
+
+    def flush(self):
+        """Block until every event queued so far has been written"""
+        self._queue.join()
+
+    def close(self):
+        """Write out everything still buffered and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        self.backend.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': self._queue.qsize(),
+                'max_buffer': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'rejected': self.rejected,
+                'write_errors': self.write_errors,
+                'dead_lettered': self.dead_lettered,
+                'dropped': self.dropped,
+                'last_flush_ms': self.last_flush_ms
+            }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+        while len(batch) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _write(self, batch):
+        """Write a batch, retrying with backoff, then set aside what keeps failing"""
+        delay = 0.05
+        # Do not hang shutdown on a backend that keeps failing
+        max_attempts = min(self.max_attempts, 5) if self._closed else self.max_attempts
+        for attempt in range(1, max_attempts + 1):
+            start = time.perf_counter()
+            try:
+                self.backend.write_batch(batch)
+            except Exception as e:
+                with self._lock:
+                    self.write_errors += 1
+                print(f"Engagement store write failed (attempt {attempt}/{max_attempts}): {str(e)}")
+                if attempt < max_attempts:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 2.0)
+                continue
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self.last_flush_ms = (time.perf_counter() - start) * 1000
+            return
+        self._write_each(batch)
+
+    def _write_each(self, batch):
+        """Write a failing batch event by event, in order, dead-lettering the events that fail"""
+        for record in batch:
+            try:
+                self.backend.write_batch([record])
+            except Exception as e:
+                with self._lock:
+                    self.write_errors += 1
+                self._dead_letter(record, e)
+                continue
+            with self._lock:
+                self.written += 1
+                self.batches += 1
+
+    def _dead_letter(self, record, error):
+        try:
+            self.backend.write_dead_letter(record, error)
+        except Exception as e:
+            with self._lock:
+                self.dropped += 1
+            print(f"Engagement store dropping a {record[0]} event: {str(error)} ({str(e)})")
+            return
+        with self._lock:
+            self.dead_lettered += 1
+        print(f"Engagement store set aside a {record[0]} event: {str(error)}")
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                break
+            batch, stop = self._collect(first)
+            self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from vark_cascade import DEFAULT_TREES
+
+# ============================================
+# PROCESS POOL FOR MODEL INFERENCE
+# ============================================
+
+# Serving model of the current worker process
+_worker_predictor = None
+
+def _init_worker(artifact_dir, version, blas_threads, precision, cascade_threshold, cascade_trees):
+    global _worker_predictor
+
+    # One BLAS thread per process so the pool size is the real CPU budget.
+    # NumPy's BLAS is already loaded here (unpickling this initializer imports
+    # this module), so the variables only reach libraries loaded later and the
+    # loaded thread pools are capped with threadpoolctl (a scikit-learn dependency)
+    from threadpoolctl import threadpool_limits
+
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[name] = str(blas_threads)
+    threadpool_limits(limits=blas_threads)
+
+    from vark_artifacts import load_artifact
+    # Memory-mapped, so every worker shares the same page-cache copy of the weights
+    _worker_predictor = load_artifact(artifact_dir, version=version, verify=False, precision=precision)
+    _worker_predictor.set_cascade(cascade_threshold, cascade_trees)
+
+def _predict(X):
+    return _worker_predictor.predict_with_proba(X)
+
+class ProcessInference:
+    """
+    Run ServingPredictor.predict_with_proba in a pool of worker processes.
+
+    Each worker loads the given artifact version once at startup. Use it as
+    the predict_fn of a MicroBatcher with as many workers as processes, so
+    batching and timeouts stay in the parent while the model arithmetic runs
+    outside the GIL of the web server process.
+    """
+
+    def __init__(self, artifact_dir, version, processes=2, blas_threads=1, precision='full',
+                 cascade_threshold=None, cascade_trees=DEFAULT_TREES):
+        self.artifact_dir = artifact_dir
+        self.version = version
+        self.precision = precision
+        self.processes = processes
+        # Spawned workers only import NumPy and the artifact loader
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(artifact_dir, version, blas_threads, precision, cascade_threshold, cascade_trees)
+        )
+
+    def __call__(self, X):
+        return self._executor.submit(_predict, X).result()
+
+    def warm_up(self, X):
+        """Start every worker and load its model before serving traffic"""
+        futures = [self._executor.submit(_predict, X) for _ in range(self.processes)]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
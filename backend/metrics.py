@@ -0,0 +1,205 @@
+import bisect
+import math
+import threading
+import time
+
+# ============================================
+# PROMETHEUS METRICS
+# ============================================
+#
+# Counters and histograms cheap enough to update on every request: a labelled
+# child is looked up once (usually at import time) and an update is a lock,
+# an addition and, for histograms, a bisect over the bucket bounds. Values are
+# per process; under prefork.py every worker is scraped separately.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds, from the sub-millisecond stages to slow requests
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name + '_total', labels, self.value)]
+
+class _Timer:
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager that observes the seconds spent inside it"""
+        return _Timer(self)
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        result = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            result.append((name + '_bucket', labels + (('le', _format_value(float(bound))),), cumulative))
+        result.append((name + '_sum', labels, total))
+        result.append((name + '_count', labels, cumulative))
+        return result
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """The child for one combination of label values, created on first use"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self):
+        samples = []
+        for values, child in sorted(self._children.items()):
+            samples.extend(child.samples(self.name, tuple(zip(self.labelnames, values))))
+        return self.name, self.kind, self.help, samples
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def collect(self):
+        # Counter families are named after their _total samples
+        _, kind, help, samples = super().collect()
+        return self.name + '_total', kind, help, samples
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+class Registry:
+    """
+    Metrics owned by this module plus callbacks that report values kept
+    elsewhere (cache and batcher stats, queue depths) at scrape time.
+
+    A callback returns (name, kind, help, samples) families, where samples
+    are (sample_name, labels, value) tuples and labels a tuple of pairs.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_callback(self, fn):
+        self._callbacks.append(fn)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        families = [metric.collect() for metric in self._metrics]
+        for fn in self._callbacks:
+            families.extend(fn())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_name, labels, value in samples:
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def simple_family(name, kind, help, value, labels=()):
+    """A callback family with a single sample"""
+    if kind == 'counter':
+        name += '_total'
+    return name, kind, help, [(name, labels, value)]
+
+def cumulative_histogram_family(name, help, bounds, cumulative_counts, total):
+    """A callback family for a histogram whose cumulative bucket counts are kept elsewhere"""
+    samples = [(name + '_bucket', (('le', _format_value(float(bound))),), count)
+               for bound, count in zip(list(bounds) + [math.inf], cumulative_counts)]
+    samples.append((name + '_sum', (), total))
+    samples.append((name + '_count', (), cumulative_counts[-1] if cumulative_counts else 0))
+    return name, 'histogram', help, samples
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ============================================
+# LRU + TTL PREDICTION CACHE
+# ============================================
+
+class PredictionCache:
+    """
+    Bounded LRU cache with per-entry time-to-live for model outputs.
+
+    Keys are digests of the canonical raw input row plus the model version,
+    so identical resubmissions hit and a model reload never serves stale
+    results. A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=10000, ttl_seconds=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(row, model_version):
+        """Digest of a raw input row in INPUT_COLUMNS order and the model version"""
+        # Adding 0.0 folds -0.0 into 0.0 so equal payloads hash equally
+        canonical = np.ascontiguousarray(row, dtype=np.float64) + 0.0
+        digest = hashlib.blake2b(canonical.tobytes(), digest_size=16)
+        digest.update(str(model_version).encode())
+        return digest.digest()
+
+    def get(self, key):
+        """Cached value, or None on a miss or an expired entry"""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the model is reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,409 @@
+import argparse
+import atexit
+import gc
+import mmap
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+import numpy as np
+
+from serve import add_server_arguments, configure_environment
+from vark_artifacts import is_up_to_date, preload_artifact
+
+# ============================================
+# PRE-FORK MULTI-WORKER SERVER
+# ============================================
+#
+# The parent imports the serving stack, loads the current model artifact once
+# and freezes the garbage collector's view of those objects, then forks
+# workers that serve a shared listening socket with waitress. The weights and
+# tree arrays are memory-mapped read-only and the Python objects are only
+# read, so workers share those pages with the parent instead of each holding
+# a copy.
+#
+# Signals to the parent:
+#     SIGHUP            reload the current artifact and restart workers one
+#                       at a time, each finishing its in-flight requests
+#     SIGUSR1           print the per-worker memory report
+#     SIGTERM, SIGINT   stop all workers gracefully and exit
+
+# Same locations as app.py, which runs in the workers
+MODEL_PATH = 'vark_model.pkl'
+ARTIFACT_DIR = 'models'
+STUDENT_ARTIFACT_DIR = 'models_student'
+
+# ============================================
+# 1. MEMORY REPORT
+# ============================================
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap')
+
+def read_smaps_rollup(pid):
+    """Memory totals of a process in kB from /proc/<pid>/smaps_rollup, or None"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    totals = {}
+    for line in lines:
+        name, _, rest = line.partition(':')
+        if name in SMAPS_FIELDS:
+            totals[name] = int(rest.split()[0])
+    return totals
+
+def memory_report(processes):
+    """Unique (private) and shared resident memory for (name, pid) pairs"""
+    rows = []
+    for name, pid in processes:
+        totals = read_smaps_rollup(pid)
+        if totals is None:
+            continue
+        rows.append({
+            'name': name,
+            'pid': pid,
+            'rss_kb': totals.get('Rss', 0),
+            'pss_kb': totals.get('Pss', 0),
+            'uss_kb': totals.get('Private_Clean', 0) + totals.get('Private_Dirty', 0),
+            'shared_kb': totals.get('Shared_Clean', 0) + totals.get('Shared_Dirty', 0)
+        })
+    return rows
+
+def format_memory_report(rows):
+    lines = [f"{'process':<10} {'pid':>7} {'RSS MB':>8} {'USS MB':>8} {'shared MB':>10} {'PSS MB':>8}"]
+    for row in rows:
+        lines.append(f"{row['name']:<10} {row['pid']:>7} {row['rss_kb'] / 1024:>8.1f} "
+                     f"{row['uss_kb'] / 1024:>8.1f} {row['shared_kb'] / 1024:>10.1f} "
+                     f"{row['pss_kb'] / 1024:>8.1f}")
+    # PSS splits every shared page between the processes mapping it, so its
+    # sum is the real footprint; compare with RSS x workers for N independent servers
+    lines.append(f"{'total':<10} {'':>7} {sum(r['rss_kb'] for r in rows) / 1024:>8.1f} "
+                 f"{sum(r['uss_kb'] for r in rows) / 1024:>8.1f} {'':>10} "
+                 f"{sum(r['pss_kb'] for r in rows) / 1024:>8.1f}")
+    return '\n'.join(lines)
+
+# ============================================
+# 2. WORKER PROCESS
+# ============================================
+
+def run_worker(worker_id, sock, heartbeats, slot, threads, graceful_timeout):
+    """Body of a forked worker; never returns"""
+    stopping = []
+
+    def request_stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    # Ctrl-C and reloads are coordinated by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+    exit_code = 0
+    try:
+        os.environ['VARK_WORKER_ID'] = str(worker_id)
+        import app as vark_app
+        from waitress.server import create_server
+
+        server = create_server(vark_app.app, sockets=[sock], threads=threads)
+
+        # The heartbeat is written by the I/O loop itself, so a worker whose
+        # loop stops turning is detected even if its other threads still run
+        while not stopping:
+            heartbeats[slot] = time.monotonic()
+            server.asyncore.loop(timeout=1.0, map=server._map, use_poll=server.adj.asyncore_use_poll, count=1)
+
+        # Stop accepting (the socket stays open in the parent and the other
+        # workers) and finish the requests already received
+        server.accepting = False
+        deadline = time.monotonic() + graceful_timeout
+        while time.monotonic() < deadline:
+            busy = [channel for channel in server.active_channels.values()
+                    if channel.requests or channel.total_outbufs_len]
+            if not busy:
+                break
+            server.asyncore.loop(timeout=0.1, map=server._map, use_poll=server.adj.asyncore_use_poll, count=1)
+        server.task_dispatcher.shutdown(timeout=1.0)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        # Flush the engagement store and analytics like a normal exit would,
+        # but never return into the parent's code
+        try:
+            atexit._run_exitfuncs()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+# ============================================
+# 3. SUPERVISOR
+# ============================================
+
+class Worker:
+    def __init__(self, worker_id, pid, slot):
+        self.worker_id = worker_id
+        self.pid = pid
+        self.slot = slot
+        self.started_at = time.monotonic()
+        self.stopping = False
+
+class PreforkServer:
+    """
+    Parent process: owns the listening socket and the preloaded model, forks
+    the workers and keeps them healthy.
+
+    Each worker writes a heartbeat into shared memory on every turn of its
+    I/O loop. A worker that never becomes ready within startup_timeout or
+    stops beating for heartbeat_timeout is killed, and any worker that exits
+    unexpectedly is replaced, with exponential backoff if it keeps failing
+    soon after starting.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}
+        # Two slots per worker id so a replacement never shares a slot with
+        # the worker it replaces
+        n_slots = 2 * args.workers
+        self._heartbeat_buffer = mmap.mmap(-1, 8 * n_slots)
+        self.heartbeats = np.frombuffer(self._heartbeat_buffer, dtype=np.float64)
+        self.free_slots = list(range(n_slots))
+        self.failures = [0] * args.workers
+        self.respawn_at = {}
+        self.restarts = 0
+        self.sock = None
+        self._stop = False
+        self._reload = False
+        self._report = False
+
+    def listen(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.args.host, self.args.port))
+        self.sock.listen(1024)
+        self.sock.setblocking(False)
+
+    def preload(self):
+        """Import the serving stack and load the model once, before forking"""
+        student = os.environ.get('VARK_SERVING_MODEL') == 'student'
+        if not student and not is_up_to_date(ARTIFACT_DIR, MODEL_PATH):
+            # Let app export (or train) the model in a separate process,
+            # so TensorFlow is never imported into the parent
+            print("Serving artifact missing or stale, exporting it...")
+            env = {key: value for key, value in os.environ.items() if key != 'VARK_WORKER_ID'}
+            subprocess.run([sys.executable, '-c', 'import app'], env=env, check=True)
+
+        # Everything app imports, so workers only run app's own module body
+        import flask, flask_cors, waitress.server
+        import batching, prediction_cache, engagement_store, analytics, sessions
+
+        predictor = preload_artifact(STUDENT_ARTIFACT_DIR if student else ARTIFACT_DIR,
+                                     precision=os.environ.get('VARK_PRECISION', 'full'))
+        # Objects created so far are never collected or moved, so the
+        # collector does not write to (and unshare) their pages in workers
+        gc.collect()
+        gc.freeze()
+        print(f"Preloaded serving model {predictor.model_version}")
+        return predictor
+
+    def spawn(self, worker_id):
+        slot = self.free_slots.pop()
+        self.heartbeats[slot] = 0.0
+        pid = os.fork()
+        if pid == 0:
+            run_worker(worker_id, self.sock, self.heartbeats, slot,
+                       self.args.threads, self.args.graceful_timeout)
+        worker = Worker(worker_id, pid, slot)
+        self.workers[pid] = worker
+        return worker
+
+    def is_ready(self, worker):
+        return self.heartbeats[worker.slot] > 0.0
+
+    def wait_ready(self, worker):
+        deadline = time.monotonic() + self.args.startup_timeout
+        while time.monotonic() < deadline:
+            if self.is_ready(worker):
+                return True
+            if self._reap_one(worker.pid):
+                return False
+            time.sleep(0.05)
+        return False
+
+    def _release(self, worker):
+        self.workers.pop(worker.pid, None)
+        self.free_slots.append(worker.slot)
+
+    def _reap_one(self, pid):
+        """Collect pid if it has exited; True if it is gone"""
+        try:
+            done, status = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            done, status = pid, 0
+        if done == 0:
+            return False
+        worker = self.workers.get(pid)
+        if worker is not None:
+            self._release(worker)
+            if not worker.stopping:
+                self._worker_died(worker, status)
+        return True
+
+    def _worker_died(self, worker, status):
+        lifetime = time.monotonic() - worker.started_at
+        print(f"Worker {worker.worker_id} (pid {worker.pid}) exited with status {status} after {lifetime:.1f}s")
+        if lifetime < self.args.startup_timeout:
+            self.failures[worker.worker_id] += 1
+        else:
+            self.failures[worker.worker_id] = 0
+        delay = min(2 ** self.failures[worker.worker_id] - 1, 30)
+        self.respawn_at[worker.worker_id] = time.monotonic() + delay
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.get(pid)
+            if worker is not None:
+                self._release(worker)
+                if not worker.stopping:
+                    self._worker_died(worker, status)
+
+    def check_health(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.stopping:
+                continue
+            beat = self.heartbeats[worker.slot]
+            if beat == 0.0:
+                stuck = now - worker.started_at > self.args.startup_timeout
+            else:
+                stuck = now - beat > self.args.heartbeat_timeout
+            if stuck:
+                print(f"Worker {worker.worker_id} (pid {worker.pid}) is unresponsive, killing it")
+                os.kill(worker.pid, signal.SIGKILL)
+
+    def respawn_due(self):
+        now = time.monotonic()
+        for worker_id, due in list(self.respawn_at.items()):
+            if due <= now:
+                del self.respawn_at[worker_id]
+                self.spawn(worker_id)
+                self.restarts += 1
+
+    def stop_worker(self, worker):
+        """SIGTERM a worker and wait for it to drain, then SIGKILL"""
+        worker.stopping = True
+        try:
+            os.kill(worker.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while time.monotonic() < deadline:
+            if self._reap_one(worker.pid):
+                return
+            time.sleep(0.05)
+        print(f"Worker {worker.worker_id} (pid {worker.pid}) did not stop in time, killing it")
+        os.kill(worker.pid, signal.SIGKILL)
+        os.waitpid(worker.pid, 0)
+        self._release(worker)
+
+    def rolling_restart(self):
+        """Reload the model and replace the workers one at a time"""
+        print("Reloading: restarting workers one at a time")
+        gc.unfreeze()
+        self.preload()
+        for worker in sorted(self.workers.values(), key=lambda w: w.worker_id):
+            self.stop_worker(worker)
+            replacement = self.spawn(worker.worker_id)
+            if not self.wait_ready(replacement):
+                print(f"Replacement worker {worker.worker_id} failed to start, aborting the reload")
+                return
+        self.restarts += len(self.workers)
+        print("Reload complete")
+
+    def memory_report(self):
+        processes = [('parent', os.getpid())]
+        processes += [(f'worker-{w.worker_id}', w.pid)
+                      for w in sorted(self.workers.values(), key=lambda w: w.worker_id)]
+        return memory_report(processes)
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_report(self, signum, frame):
+        self._report = True
+
+    def run(self):
+        self.listen()
+        self.preload()
+
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGUSR1, self._on_report)
+
+        for worker_id in range(self.args.workers):
+            self.spawn(worker_id)
+        for worker in list(self.workers.values()):
+            self.wait_ready(worker)
+        print(f"{len(self.workers)} workers serving on http://{self.args.host}:{self.args.port}")
+        print(format_memory_report(self.memory_report()))
+
+        while not self._stop:
+            time.sleep(0.5)
+            self.reap()
+            self.check_health()
+            self.respawn_due()
+            if self._reload:
+                self._reload = False
+                self.rolling_restart()
+            if self._report:
+                self._report = False
+                print(format_memory_report(self.memory_report()))
+
+        print("Stopping workers...")
+        for worker in list(self.workers.values()):
+            worker.stopping = True
+            os.kill(worker.pid, signal.SIGTERM)
+        for worker in list(self.workers.values()):
+            self.stop_worker(worker)
+        self.sock.close()
+        print("All workers stopped")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve the VARK API from pre-forked workers')
+    add_server_arguments(parser)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes')
+    parser.add_argument('--inference-workers', type=int, default=1,
+                        help='Model calls that may run concurrently in each worker')
+    parser.add_argument('--session-db', default='sessions.db',
+                        help='SQLite file for streaming sessions shared by the workers')
+    parser.add_argument('--graceful-timeout', type=float, default=30.0,
+                        help='Seconds a stopping worker may spend finishing requests')
+    parser.add_argument('--startup-timeout', type=float, default=60.0,
+                        help='Seconds a new worker may take to become ready')
+    parser.add_argument('--heartbeat-timeout', type=float, default=30.0,
+                        help='Seconds without a heartbeat before a worker is killed')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    configure_environment(args)
+    os.environ['VARK_SESSION_DB'] = args.session_db
+    PreforkServer(args).run()
@@ -0,0 +1,220 @@
+import collections
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import g, request
+
+# ============================================
+# REQUEST PROFILING
+# ============================================
+#
+# Opt-in profiles of individual requests on the prediction path, kept in a
+# ring buffer of the most recent `capacity` captures:
+#
+# - a `sample_rate` fraction of requests is profiled from the start, with
+#   cProfile (mode='cprofile', request thread only) or with stack samples
+#   (mode='stack');
+# - with `slow_ms` set, every request is stack-sampled and the samples are
+#   kept only if it took longer than slow_ms, since a request is only known
+#   to be slow once it has finished.
+#
+# Stack samples are taken by one background thread every interval_ms from
+# the request threads being profiled and from the micro-batcher threads that
+# run their inference, and are stored as folded stacks (one
+# "thread;outer;...;inner count" line per distinct stack), the input format
+# of flamegraph.pl and speedscope. When neither option is set no hooks are
+# installed and requests run exactly as without the profiler.
+
+class _StackSampler:
+    """Samples the stacks of registered threads while any are registered"""
+
+    def __init__(self, interval, thread_prefixes):
+        self.interval = interval
+        self.thread_prefixes = thread_prefixes
+        self._captures = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def register(self, capture):
+        with self._lock:
+            self._captures[id(capture)] = capture
+            self._active.set()
+
+    def unregister(self, capture):
+        with self._lock:
+            self._captures.pop(id(capture), None)
+            if not self._captures:
+                self._active.clear()
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            related = {thread.ident: thread.name for thread in threading.enumerate()
+                       if thread.name.startswith(self.thread_prefixes)}
+            # Held while sampling, so a capture is complete once unregistered
+            with self._lock:
+                if not self._captures:
+                    continue
+                frames = sys._current_frames()
+                related_stacks = [_fold(name, frames[ident]) for ident, name in related.items()
+                                  if ident in frames]
+                for capture in self._captures.values():
+                    frame = frames.get(capture.thread_id)
+                    if frame is not None:
+                        capture.add(_fold('request', frame))
+                    for stack in related_stacks:
+                        capture.add(stack)
+                del frames
+
+def _fold(thread_name, frame):
+    """One folded stack line prefix, outermost frame first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    names.append(thread_name)
+    return ';'.join(reversed(names))
+
+class _Capture:
+    __slots__ = ('thread_id', 'stacks', 'samples', 'profile', 'sampled', 'start')
+
+    def __init__(self, sampled):
+        self.thread_id = threading.get_ident()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.profile = None
+        self.sampled = sampled
+        self.start = time.perf_counter()
+
+    def add(self, stack):
+        # Called by the sampler thread with its lock held
+        self.stacks[stack] += 1
+        self.samples += 1
+
+class RequestProfiler:
+    def __init__(self, sample_rate=0.0, slow_ms=None, capacity=50, mode='stack', interval_ms=5.0,
+                 endpoints=None, thread_prefixes=('micro-batcher',)):
+        if mode not in ('stack', 'cprofile'):
+            raise ValueError(f"Unknown profiling mode {mode!r}")
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.mode = mode
+        self.interval_ms = interval_ms
+        self.endpoints = set(endpoints) if endpoints is not None else None
+        self.thread_prefixes = tuple(thread_prefixes)
+        self._profiles = collections.deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sampler = None
+        self.captured = 0
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_ms is not None
+
+    def install(self, app):
+        """Register the request hooks on a Flask app, if profiling is enabled"""
+        if not self.enabled:
+            return
+        if self.slow_ms is not None or self.mode == 'stack':
+            self._sampler = _StackSampler(self.interval_ms / 1000.0, self.thread_prefixes)
+        app.before_request(self._start)
+        app.teardown_request(self._finish)
+
+    def settings(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'mode': self.mode,
+            'interval_ms': self.interval_ms,
+            'capacity': self._profiles.maxlen,
+            'endpoints': sorted(self.endpoints) if self.endpoints is not None else None,
+            'captured': self.captured
+        }
+
+    def _start(self):
+        if self.endpoints is not None and request.endpoint not in self.endpoints:
+            return
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms is None:
+            return
+        capture = _Capture(sampled)
+        if sampled and self.mode == 'cprofile':
+            capture.profile = cProfile.Profile()
+            capture.profile.enable()
+        if self._sampler is not None:
+            self._sampler.register(capture)
+        g.vark_profile = capture
+
+    def _finish(self, exc=None):
+        capture = g.pop('vark_profile', None)
+        if capture is None:
+            return
+        duration_ms = (time.perf_counter() - capture.start) * 1000
+        if capture.profile is not None:
+            capture.profile.disable()
+        if self._sampler is not None:
+            self._sampler.unregister(capture)
+
+        slow = self.slow_ms is not None and duration_ms >= self.slow_ms
+        if not capture.sampled and not slow:
+            return
+
+        entry = {
+            'id': next(self._ids),
+            'timestamp': datetime.now().isoformat(),
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'duration_ms': duration_ms,
+            'reason': 'sampled' if capture.sampled else 'slow',
+            'error': repr(exc) if exc is not None else None
+        }
+        if capture.profile is not None:
+            capture.profile.create_stats()
+            entry['format'] = 'cprofile'
+            entry['data'] = marshal.dumps(capture.profile.stats)
+        else:
+            entry['format'] = 'folded'
+            entry['samples'] = capture.samples
+            entry['data'] = ''.join(f'{stack} {count}\n' for stack, count in capture.stacks.most_common())
+        with self._lock:
+            self._profiles.append(entry)
+            self.captured += 1
+
+    def profiles(self):
+        """Summaries of the buffered profiles, newest first"""
+        with self._lock:
+            entries = list(self._profiles)
+        return [{key: value for key, value in entry.items() if key != 'data'}
+                for entry in reversed(entries)]
+
+    def get(self, profile_id):
+        """A buffered profile by id, or None if it was never taken or has been dropped"""
+        with self._lock:
+            for entry in self._profiles:
+                if entry['id'] == profile_id:
+                    return entry
+        return None
+
+def format_cprofile(data, limit=40):
+    """pstats report of a marshalled cProfile capture, sorted by cumulative time"""
+    out = io.StringIO()
+    stats = pstats.Stats(stream=out)
+    stats.stats = marshal.loads(data)
+    stats.get_top_level_stats()
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,94 @@
+import argparse
+import os
+
+from vark_precision import PRECISIONS
+
+# ============================================
+# PRODUCTION SERVER
+# ============================================
+#
+# app.py's __main__ block runs the Flask development server with debug on.
+# This entry point serves the same app from a waitress thread pool instead:
+# connections are accepted by an asynchronous I/O loop and handed to request
+# threads, and model calls are funnelled into a bounded inference pool. Only
+# inference_workers batches run at once and at most max_pending requests may
+# wait for one, so some request threads are always free for /api/health,
+# /api/save-engagement and the session event endpoints.
+#
+# The app module is imported inside main() because process-pool workers
+# re-import this file when they start. To use several cores with one shared
+# copy of the model, see prefork.py.
+
+def add_server_arguments(parser):
+    """Options shared with prefork.py"""
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=16,
+                        help='Request handler threads')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='Seconds a request may wait for inference before a 504')
+    parser.add_argument('--reserved-threads', type=int, default=4,
+                        help='Request threads never used to wait for inference')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='Requests that may wait for inference before a 503 '
+                             '(default: threads - reserved threads)')
+    parser.add_argument('--precision', choices=PRECISIONS,
+                        default=os.environ.get('VARK_PRECISION', 'full'),
+                        help='Numeric precision of the serving model (see vark_precision.py)')
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='Prediction requests processed at once; the rest get a degraded answer')
+    parser.add_argument('--queue-deadline-ms', type=float, default=None,
+                        help='Milliseconds a prediction may wait for inference to start '
+                             'before it gets a degraded answer')
+
+def configure_environment(args):
+    """Pass the inference limits to app, which reads them at import time"""
+    max_pending = args.max_pending or max(1, args.threads - args.reserved_threads)
+    os.environ['VARK_INFERENCE_WORKERS'] = str(args.inference_workers)
+    os.environ['VARK_INFERENCE_TIMEOUT_SECONDS'] = str(args.timeout)
+    os.environ['VARK_MAX_PENDING_INFERENCE'] = str(max_pending)
+    os.environ['VARK_PRECISION'] = args.precision
+    if args.max_in_flight is not None:
+        os.environ['VARK_MAX_IN_FLIGHT'] = str(args.max_in_flight)
+    if args.queue_deadline_ms is not None:
+        os.environ['VARK_QUEUE_DEADLINE_MS'] = str(args.queue_deadline_ms)
+    return max_pending
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Serve the VARK API in production mode')
+    add_server_arguments(parser)
+    parser.add_argument('--inference-pool', choices=['thread', 'process'], default='thread',
+                        help='Run model calls in threads of this process or in worker processes')
+    parser.add_argument('--inference-workers', type=int, default=min(2, os.cpu_count() or 1),
+                        help='Model calls that may run concurrently')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    max_pending = configure_environment(args)
+
+    import app as vark_app
+
+    if args.inference_pool == 'process':
+        vark_app.use_process_pool(args.inference_workers)
+
+    print("\n" + "="*60)
+    print("VARK LEARNING STYLE PREDICTOR API (production)")
+    print("="*60)
+    print(f"Listening on http://{args.host}:{args.port}")
+    print(f"Request threads: {args.threads}, inference: {args.inference_workers} "
+          f"{args.inference_pool} worker(s), max pending: {max_pending}, timeout: {args.timeout:g}s, "
+          f"precision: {args.precision}")
+    print("="*60 + "\n")
+
+    try:
+        from waitress import serve
+    except ImportError:
+        from werkzeug.serving import run_simple
+        print("waitress is not installed, falling back to the threaded Werkzeug server")
+        run_simple(args.host, args.port, vark_app.app, threaded=True)
+    else:
+        serve(vark_app.app, host=args.host, port=args.port, threads=args.threads)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from vark_features import (
+    ENGAGEMENT_SCHEMA, INPUT_COLUMNS, INPUT_INDEX, MAX_ENGAGEMENT_VALUE, N_ANSWERS, N_QUESTIONS,
+    QUESTIONNAIRE_COLUMNS
+)
+
+# ============================================
+# 1. ENGAGEMENT COUNTERS
+# ============================================
+
+# (modality, payload key, model input column, merge rule) for the 32 raw
+# engagement inputs, from the feature schema. Events add to counters and
+# durations, keep the highest value seen for completion and scroll maxima,
+# and overwrite the rest, which mirrors how VARKContent.jsx updates its
+# engagement state.
+ENGAGEMENT_FIELDS = [(field.modality, field.key, field.column, field.merge)
+                     for field in ENGAGEMENT_SCHEMA]
+
+# (modality, payload key) -> (row index, merge rule)
+FIELD_INDEX = {(modality, key): (INPUT_INDEX[column], rule)
+               for modality, key, column, rule in ENGAGEMENT_FIELDS}
+
+QUESTIONNAIRE_OFFSET = INPUT_INDEX[QUESTIONNAIRE_COLUMNS[0]]
+
+# ============================================
+# 2. SESSION ACCUMULATOR
+# ============================================
+
+class Session:
+    """
+    Running raw inputs for one learner.
+
+    The state is a single float64 row in INPUT_COLUMNS order; unanswered
+    questions are NaN. Applying an event touches one cell, so the row is
+    always ready for feature engineering without replaying history.
+    """
+
+    __slots__ = ('session_id', 'row', 'metadata', 'events', 'created_at', 'last_seen')
+
+    def __init__(self, session_id, metadata=None):
+        self.session_id = session_id
+        self.row = np.zeros(len(INPUT_COLUMNS), dtype=np.float64)
+        self.row[QUESTIONNAIRE_OFFSET:QUESTIONNAIRE_OFFSET + N_QUESTIONS] = np.nan
+        self.metadata = metadata or {}
+        self.events = 0
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+
+    @classmethod
+    def restore(cls, session_id, row, metadata, events, created_at):
+        session = cls(session_id, metadata)
+        session.row = row
+        session.events = events
+        session.created_at = created_at
+        return session
+
+    def apply(self, event):
+        """
+        Apply one event; raises ValueError if it is malformed.
+
+        Engagement events look like {"modality": "visual", "metric": "clicks",
+        "value": 1} (value defaults to 1); answers look like {"question": 3,
+        "answer": 2} with 1-based question numbers.
+        """
+        if not isinstance(event, dict):
+            raise ValueError('Event must be an object')
+
+        if 'question' in event:
+            question = event['question']
+            answer = event.get('answer')
+            if not isinstance(question, int) or not 1 <= question <= N_QUESTIONS:
+                raise ValueError(f'question must be an integer from 1 to {N_QUESTIONS}')
+            if not isinstance(answer, int) or not 0 <= answer < N_ANSWERS:
+                raise ValueError(f'answer must be an integer from 0 to {N_ANSWERS - 1}')
+            self.row[QUESTIONNAIRE_OFFSET + question - 1] = answer
+            self.events += 1
+            return
+
+        field = FIELD_INDEX.get((event.get('modality'), event.get('metric')))
+        if field is None:
+            raise ValueError(f"Unknown metric {event.get('modality')}.{event.get('metric')}")
+        index, rule = field
+
+        value = event.get('value', 1)
+        if isinstance(value, bool):
+            value = 1.0 if value else 0.0
+        # Chained comparison also rejects NaN, infinities and huge ints
+        if not isinstance(value, (int, float)) or not 0 <= value <= MAX_ENGAGEMENT_VALUE:
+            raise ValueError(f'value must be a number from 0 to {MAX_ENGAGEMENT_VALUE:g}')
+
+        if rule == 'add':
+            self.row[index] += value
+        elif rule == 'max':
+            self.row[index] = max(self.row[index], value)
+        else:
+            self.row[index] = value
+        self.events += 1
+
+    @property
+    def answers(self):
+        return self.row[QUESTIONNAIRE_OFFSET:QUESTIONNAIRE_OFFSET + N_QUESTIONS]
+
+    @property
+    def answered(self):
+        return int(np.count_nonzero(~np.isnan(self.answers)))
+
+    def questionnaire(self):
+        """Answers as a list of ints, or None until every question is answered"""
+        if self.answered < N_QUESTIONS:
+            return None
+        return [int(answer) for answer in self.answers]
+
+    def engagement(self):
+        """Counters in the /api/predict engagement payload format"""
+        engagement = {}
+        for field in ENGAGEMENT_SCHEMA:
+            value = self.row[INPUT_INDEX[field.column]]
+            if field.kind == 'flag':
+                value = bool(value)
+            elif value == int(value):
+                value = int(value)
+            else:
+                value = float(value)
+            engagement.setdefault(field.modality, {})[field.key] = value
+        return engagement
+
+    def questionnaire_samples(self, n_samples=32, seed=0):
+        """
+        Input rows with unanswered questions drawn uniformly at random.
+
+        Averaging the model over these rows gives a provisional prediction
+        before the questionnaire is complete. The seed is fixed so the same
+        session state always gives the same provisional answer.
+        """
+        missing = np.isnan(self.answers)
+        if not missing.any():
+            return self.row.reshape(1, -1).copy()
+        rng = np.random.default_rng(seed)
+        rows = np.repeat(self.row.reshape(1, -1), n_samples, axis=0)
+        answers = rows[:, QUESTIONNAIRE_OFFSET:QUESTIONNAIRE_OFFSET + N_QUESTIONS]
+        answers[:, missing] = rng.integers(0, N_ANSWERS, size=(n_samples, int(missing.sum())))
+        return rows
+
+# ============================================
+# 3. SESSION STORE
+# ============================================
+
+class SessionNotFound(KeyError):
+    """Unknown, finished or expired session"""
+
+class SessionStore:
+    """
+    In-memory sessions with idle-time eviction.
+
+    Sessions are kept in least-recently-used order, so expired ones are
+    always at the front and are dropped as they are reached; when
+    max_sessions is exceeded the least recently used session is evicted.
+    """
+
+    def __init__(self, ttl_seconds=1800.0, max_sessions=100000):
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.finished = 0
+        self.expired = 0
+        self.evicted = 0
+        self.events = 0
+
+    def _expire(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def create(self, metadata=None):
+        session = Session(uuid.uuid4().hex, metadata)
+        with self._lock:
+            self._expire(session.last_seen)
+            self._sessions[session.session_id] = session
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return session
+
+    def _touch(self, session_id):
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            return self._touch(session_id)
+
+    def apply_events(self, session_id, events):
+        """Apply a batch of events; returns (session, [(index, error), ...])"""
+        errors = []
+        with self._lock:
+            session = self._touch(session_id)
+            for i, event in enumerate(events):
+                try:
+                    session.apply(event)
+                except ValueError as e:
+                    errors.append((i, str(e)))
+            self.events += len(events) - len(errors)
+        return session, errors
+
+    def snapshot(self, session_id, n_samples=32):
+        """Copy of the session's input rows for a provisional prediction"""
+        with self._lock:
+            session = self._touch(session_id)
+            return session.questionnaire_samples(n_samples), session.answered, session.events
+
+    def state(self, session_id):
+        """Copy of the session's (row, engagement, questionnaire, answered count)"""
+        with self._lock:
+            session = self._touch(session_id)
+            return session.row.copy(), session.engagement(), session.questionnaire(), session.answered
+
+    def pop(self, session_id):
+        """Remove a finished session"""
+        with self._lock:
+            session = self._touch(session_id)
+            del self._sessions[session_id]
+            self.finished += 1
+            return session
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'created': self.created,
+                'finished': self.finished,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'events': self.events
+            }
+
+class SQLiteSessionStore:
+    """
+    SessionStore with the accumulators in a SQLite table, so that every
+    pre-forked worker (see prefork.py) sees the same sessions whichever one
+    accepts a request.
+
+    Each call is one short transaction on one row; the row is kept as the
+    raw float64 bytes of the accumulator. Idle sessions are deleted as new
+    ones are created. Counters in stats() are per process, except active.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            row BLOB NOT NULL,
+            metadata TEXT NOT NULL,
+            events INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_seen REAL NOT NULL
+        )
+    """
+
+    # Enforce max_sessions every this many creates; counting rows is a scan
+    CAPACITY_CHECK_INTERVAL = 256
+
+    def __init__(self, path, ttl_seconds=1800.0, max_sessions=100000):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_sessions = max_sessions
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)')
+        self._lock = threading.Lock()
+        self.created = 0
+        self.finished = 0
+        self.expired = 0
+        self.evicted = 0
+        self.events = 0
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def _load(self, conn, session_id):
+        now = time.time()
+        found = conn.execute(
+            'SELECT row, metadata, events, created_at, last_seen FROM sessions WHERE session_id = ?',
+            (session_id,)
+        ).fetchone()
+        if found is None:
+            raise SessionNotFound(session_id)
+        row, metadata, events, created_at, last_seen = found
+        if now - last_seen >= self.ttl:
+            # Deleted by the next sweep in create()
+            raise SessionNotFound(session_id)
+        conn.execute('UPDATE sessions SET last_seen = ? WHERE session_id = ?', (now, session_id))
+        return Session.restore(session_id, np.frombuffer(row, dtype=np.float64).copy(),
+                               json.loads(metadata), events, created_at)
+
+    def _save(self, conn, session):
+        conn.execute('UPDATE sessions SET row = ?, events = ? WHERE session_id = ?',
+                     (session.row.tobytes(), session.events, session.session_id))
+
+    def create(self, metadata=None):
+        session = Session(uuid.uuid4().hex, metadata)
+
+        def create(conn):
+            now = time.time()
+            self.expired += conn.execute('DELETE FROM sessions WHERE last_seen < ?', (now - self.ttl,)).rowcount
+            conn.execute('INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)',
+                         (session.session_id, session.row.tobytes(), json.dumps(session.metadata),
+                          0, session.created_at, now))
+            self.created += 1
+            if self.created % self.CAPACITY_CHECK_INTERVAL == 0:
+                excess = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] - self.max_sessions
+                if excess > 0:
+                    self.evicted += conn.execute(
+                        'DELETE FROM sessions WHERE session_id IN '
+                        '(SELECT session_id FROM sessions ORDER BY last_seen LIMIT ?)', (excess,)
+                    ).rowcount
+
+        self._transaction(create)
+        return session
+
+    def get(self, session_id):
+        return self._transaction(lambda conn: self._load(conn, session_id))
+
+    def apply_events(self, session_id, events):
+        """Apply a batch of events; returns (session, [(index, error), ...])"""
+        def apply(conn):
+            session = self._load(conn, session_id)
+            errors = []
+            for i, event in enumerate(events):
+                try:
+                    session.apply(event)
+                except ValueError as e:
+                    errors.append((i, str(e)))
+            self._save(conn, session)
+            self.events += len(events) - len(errors)
+            return session, errors
+
+        return self._transaction(apply)
+
+    def snapshot(self, session_id, n_samples=32):
+        """Copy of the session's input rows for a provisional prediction"""
+        session = self.get(session_id)
+        return session.questionnaire_samples(n_samples), session.answered, session.events
+
+    def state(self, session_id):
+        """Copy of the session's (row, engagement, questionnaire, answered count)"""
+        session = self.get(session_id)
+        return session.row.copy(), session.engagement(), session.questionnaire(), session.answered
+
+    def pop(self, session_id):
+        """Remove a finished session"""
+        def pop(conn):
+            session = self._load(conn, session_id)
+            conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+            self.finished += 1
+            return session
+
+        return self._transaction(pop)
+
+    def stats(self):
+        with self._lock:
+            active = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+            return {
+                'active': active,
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'created': self.created,
+                'finished': self.finished,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'events': self.events
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
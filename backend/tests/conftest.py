@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# TensorFlow would pick up a GPU where there is one; keep runs comparable
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '-1')
+
+@pytest.fixture(scope='session')
+def hybrid():
+    """A small HybridVARKPredictor trained on a fixed-seed synthetic sample"""
+    pytest.importorskip('tensorflow')
+    from vark_ml_model import (HybridVARKPredictor, create_ensemble_model, fit_deep_model,
+                               generate_synthetic_data, prepare_training_data)
+
+    X, y = prepare_training_data(generate_synthetic_data(n_samples=1000, seed=0))
+    predictor = HybridVARKPredictor()
+    X_train, X_val, y_train, y_val = predictor.prepare_fit(X, y)
+    predictor.dl_model, _ = fit_deep_model(X_train, y_train, X_val, y_val, epochs=3, verbose=0)
+    predictor.ensemble_model = create_ensemble_model()
+    predictor.ensemble_model.set_params(rf__n_estimators=10, rf__n_jobs=1, gb__n_estimators=10)
+    predictor.ensemble_model.fit(X_train, y_train)
+    return predictor
+
+@pytest.fixture(scope='session')
+def app_module(hybrid, tmp_path_factory):
+    """The Flask app module, started in a scratch directory holding an exported model"""
+    from vark_artifacts import save_artifact
+    from vark_serving import ServingPredictor
+
+    work_dir = tmp_path_factory.mktemp('app')
+    save_artifact(ServingPredictor.from_hybrid(hybrid), str(work_dir / 'models'))
+    os.environ['VARK_ENGAGEMENT_DB'] = str(work_dir / 'engagement.db')
+    os.environ['VARK_ANALYTICS_SNAPSHOT'] = str(work_dir / 'analytics_snapshot.json')
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,65 @@
+import copy
+
+import numpy as np
+import pytest
+
+from admission import InFlightFull, InFlightLimit, RuleBasedFallback
+from benchmarks import SAMPLE_PAYLOAD
+from vark_decoder import RequestDecoder
+
+def varied(i):
+    """SAMPLE_PAYLOAD with a distinct input row, so the prediction cache cannot answer it"""
+    payload = copy.deepcopy(SAMPLE_PAYLOAD)
+    payload['engagement']['visual']['timeSpent'] += 1000 + i
+    return payload
+
+def test_in_flight_limit_rejects_past_the_limit():
+    limit = InFlightLimit(1)
+    with limit:
+        with pytest.raises(InFlightFull):
+            with limit:
+                pass
+    assert limit.stats() == {'limit': 1, 'in_flight': 0, 'rejected': 1}
+    assert limit.try_acquire()
+
+def test_without_a_limit_everything_is_admitted():
+    limit = InFlightLimit()
+    assert all(limit.try_acquire() for _ in range(100))
+    assert limit.stats()['rejected'] == 0
+
+def test_fallback_follows_questionnaire_and_time():
+    classes = np.array(['Auditory', 'Kinesthetic', 'Reading', 'Visual'])
+    row = RequestDecoder().decode(SAMPLE_PAYLOAD)
+    label, probabilities = RuleBasedFallback(classes).predict_row(row)
+    # Mostly visual answers and more than half the time on visual content
+    assert label == 'Visual'
+    assert probabilities.sum() == pytest.approx(1.0)
+    assert probabilities.argmax() == 3
+
+def test_overloaded_predict_answers_degraded(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.admission, 'limit', 0)
+    response = client.post('/api/predict', json=varied(0))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert body['degraded'] is True
+    assert body['degraded_reason'] == 'in_flight'
+    label, probabilities = app_module.fallback.predict_row(RequestDecoder().decode(varied(0)))
+    assert body['predicted_style'] == label
+    assert body['confidence'] == pytest.approx(probabilities.max())
+
+def test_overload_does_not_degrade_cached_answers(app_module, client, monkeypatch):
+    first = client.post('/api/predict', json=varied(1)).get_json()
+    assert first['degraded'] is False
+
+    monkeypatch.setattr(app_module.admission, 'limit', 0)
+    again = client.post('/api/predict', json=varied(1)).get_json()
+    assert again['degraded'] is False
+    assert again['all_scores'] == first['all_scores']
+
+def test_overload_without_fallback_is_503(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.admission, 'limit', 0)
+    monkeypatch.setattr(app_module, 'DEGRADED_FALLBACK', False)
+    response = client.post('/api/predict', json=varied(2))
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
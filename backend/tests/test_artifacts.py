@@ -0,0 +1,92 @@
+import copy
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from benchmarks import sample_inputs_featured
+from vark_artifacts import (MANIFEST_NAME, convert_pickle, current_version, list_versions, load_artifact,
+                            load_legacy_pickle, read_manifest, save_artifact)
+from vark_serving import ServingPredictor
+
+# Scalar parameters must come back as scalars, not 1-element arrays
+pytestmark = pytest.mark.filterwarnings('error:Conversion of an array with ndim > 0:DeprecationWarning')
+
+@pytest.fixture(scope='module')
+def serving(hybrid):
+    return ServingPredictor.from_hybrid(hybrid)
+
+@pytest.fixture(scope='module')
+def X(hybrid):
+    return sample_inputs_featured(300, hybrid)
+
+def test_saved_artifact_loads_memory_mapped_with_the_same_outputs(serving, X, tmp_path):
+    root = str(tmp_path / 'models')
+    version = save_artifact(serving, root, metadata={'source': 'test'})
+
+    assert current_version(root) == version
+    assert list_versions(root) == [version]
+    manifest = read_manifest(os.path.join(root, version))
+    assert manifest['model_version'] == version
+    assert manifest['metadata'] == {'source': 'test'}
+    assert sorted(manifest['files']) == sorted(f'{name}.npy' for name in serving.arrays())
+    assert manifest['files']['ensemble_m0_max_depth.npy']['shape'] == []
+
+    loaded = load_artifact(root)
+    assert loaded.model_version == version
+    assert list(loaded.classes_) == [str(label) for label in serving.classes_]
+    assert isinstance(loaded.scaler_mean, np.memmap)
+    assert not loaded.scaler_mean.flags.writeable
+    np.testing.assert_array_equal(loaded.predict_proba(X), serving.predict_proba(X))
+
+def test_corrupted_file_is_rejected(serving, tmp_path):
+    root = str(tmp_path / 'models')
+    version_dir = os.path.join(root, save_artifact(serving, root))
+    path = os.path.join(version_dir, 'scaler_mean.npy')
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    with pytest.raises(ValueError, match='Checksum mismatch'):
+        load_artifact(root)
+    # The same file still loads when verification is skipped
+    load_artifact(root, verify=False)
+
+def test_newer_format_version_is_rejected(serving, tmp_path):
+    root = str(tmp_path / 'models')
+    version_dir = os.path.join(root, save_artifact(serving, root))
+    manifest_path = os.path.join(version_dir, MANIFEST_NAME)
+    with open(manifest_path) as f:
+        text = f.read()
+    with open(manifest_path, 'w') as f:
+        f.write(text.replace('"format_version": 1', '"format_version": 99'))
+
+    with pytest.raises(ValueError, match='format version 99'):
+        load_artifact(root, verify=False)
+
+def test_legacy_pickle_is_converted(hybrid, serving, X, tmp_path):
+    pickle_path = str(tmp_path / 'vark_model.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump(hybrid, f)
+
+    legacy = load_legacy_pickle(pickle_path)
+    assert isinstance(legacy, ServingPredictor)
+    np.testing.assert_array_equal(legacy.predict_proba(X), serving.predict_proba(X))
+
+    root = str(tmp_path / 'models')
+    version = convert_pickle(pickle_path, root)
+    manifest = read_manifest(os.path.join(root, version))
+    assert manifest['metadata']['source'] == 'vark_model.pkl'
+    np.testing.assert_array_equal(load_artifact(root).predict_proba(X), serving.predict_proba(X))
+
+def test_legacy_serving_pickle_gets_no_version(serving, tmp_path):
+    # Pickled before ServingPredictor had a model_version
+    legacy = copy.copy(serving)
+    del legacy.model_version
+    pickle_path = str(tmp_path / 'vark_serving.pkl')
+    with open(pickle_path, 'wb') as f:
+        pickle.dump(legacy, f)
+    assert load_legacy_pickle(pickle_path).model_version is None
@@ -0,0 +1,132 @@
+import copy
+
+import numpy as np
+import pytest
+
+from benchmarks import SAMPLE_PAYLOAD
+from vark_decoder import PayloadError, RequestDecoder
+from vark_features import INPUT_INDEX, MAX_ENGAGEMENT_VALUE
+
+def payload_with(path, value):
+    """SAMPLE_PAYLOAD with the engagement field at modality.key set to value (or removed if None)"""
+    payload = copy.deepcopy(SAMPLE_PAYLOAD)
+    modality, key = path.split('.')
+    if value is None:
+        del payload['engagement'][modality][key]
+    else:
+        payload['engagement'][modality][key] = value
+    return payload
+
+def decode_errors(payload):
+    with pytest.raises(PayloadError) as info:
+        RequestDecoder().decode(payload)
+    return info.value.errors
+
+def test_valid_payload_decodes_exactly():
+    row = RequestDecoder().decode(payload_with('visual.timeSpent', 300.1))
+    assert row.dtype == np.float64
+    assert row[INPUT_INDEX['visual_time']] == 300.1
+    assert row[INPUT_INDEX['first_success']] == 1.0
+
+@pytest.mark.parametrize('value, message', [
+    ('300', 'must be a non-negative number'),
+    (-1, 'must be a non-negative number'),
+    (float('nan'), 'must be a non-negative number'),
+    (float('inf'), 'must be a non-negative number'),
+    ([1], 'must be a non-negative number'),
+    (MAX_ENGAGEMENT_VALUE * 10, f'must be at most {MAX_ENGAGEMENT_VALUE:g}'),
+    (1e39, f'must be at most {MAX_ENGAGEMENT_VALUE:g}'),
+])
+def test_bad_numbers_are_reported_per_field(value, message):
+    assert decode_errors(payload_with('visual.timeSpent', value)) == {'engagement.visual.timeSpent': message}
+
+def test_largest_accepted_value():
+    row = RequestDecoder().decode(payload_with('visual.timeSpent', MAX_ENGAGEMENT_VALUE))
+    assert row[INPUT_INDEX['visual_time']] == MAX_ENGAGEMENT_VALUE
+
+def test_narrow_rows_reject_what_their_dtype_cannot_hold():
+    decoder = RequestDecoder(dtype=np.float16)
+    with pytest.raises(PayloadError) as info:
+        decoder.decode(payload_with('visual.timeSpent', 70000))
+    assert info.value.errors == {'engagement.visual.timeSpent': 'must be at most 65504'}
+
+@pytest.mark.parametrize('value', [True, False, 0, 1, 1.0])
+def test_flags_accept_booleans_and_zero_or_one(value):
+    row = RequestDecoder().decode(payload_with('kinesthetic.firstAttemptSuccess', value))
+    assert row[INPUT_INDEX['first_success']] == float(value)
+
+@pytest.mark.parametrize('value', [float('nan'), -1, 2, 0.5, 'yes'])
+def test_flags_reject_anything_else(value):
+    errors = decode_errors(payload_with('kinesthetic.firstAttemptSuccess', value))
+    assert errors == {'engagement.kinesthetic.firstAttemptSuccess': 'must be a boolean'}
+
+def test_missing_and_null_fields():
+    payload = payload_with('visual.clicks', None)
+    payload['engagement']['auditory']['timeSpent'] = None
+    del payload['engagement']['reading']
+    assert decode_errors(payload) == {
+        'engagement.visual.clicks': 'required',
+        'engagement.auditory.timeSpent': 'must not be null',
+        'engagement.reading': 'required'
+    }
+
+def test_optional_fields_take_their_default():
+    row = RequestDecoder().decode(payload_with('kinesthetic.firstAttemptSuccess', None))
+    assert row[INPUT_INDEX['first_success']] == 0.0
+
+@pytest.mark.parametrize('questionnaire, errors', [
+    (None, {'questionnaire': 'required'}),
+    ('0000000000', {'questionnaire': 'must be a list'}),
+    ([0] * 9, {'questionnaire': 'must have exactly 10 answers'}),
+    ([0] * 8 + [4, 1.5], {'questionnaire[8]': 'must be an integer from 0 to 3',
+                          'questionnaire[9]': 'must be an integer from 0 to 3'}),
+    ([0] * 9 + [True], {'questionnaire[9]': 'must be an integer from 0 to 3'}),
+])
+def test_questionnaire_errors(questionnaire, errors):
+    payload = copy.deepcopy(SAMPLE_PAYLOAD)
+    if questionnaire is None:
+        del payload['questionnaire']
+    else:
+        payload['questionnaire'] = questionnaire
+    assert decode_errors(payload) == errors
+
+def test_non_object_payloads():
+    assert decode_errors([]) == {'payload': 'must be an object'}
+    assert decode_errors({'engagement': [], 'questionnaire': [0] * 10}) == {'engagement': 'must be an object'}
+
+def test_decode_batch_reports_errors_per_item():
+    items = [SAMPLE_PAYLOAD, payload_with('visual.clicks', -3), 'not an object', SAMPLE_PAYLOAD]
+    rows, errors = RequestDecoder().decode_batch(items)
+    assert rows.shape[0] == 4
+    assert errors[0] is None and errors[3] is None
+    assert errors[1].errors == {'engagement.visual.clicks': 'must be a non-negative number'}
+    assert errors[2].errors == {'payload': 'must be an object'}
+    np.testing.assert_array_equal(rows[0], rows[3])
+    np.testing.assert_array_equal(rows[0], RequestDecoder().decode(SAMPLE_PAYLOAD))
+
+def test_predict_answers_400_with_every_field(client):
+    payload = payload_with('visual.timeSpent', 1e39)
+    payload['engagement']['kinesthetic']['firstAttemptSuccess'] = float('nan')
+    payload['questionnaire'][0] = 7
+    response = client.post('/api/predict', json=payload)
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['success'] is False
+    assert body['fields'] == {
+        'engagement.visual.timeSpent': f'must be at most {MAX_ENGAGEMENT_VALUE:g}',
+        'engagement.kinesthetic.firstAttemptSuccess': 'must be a boolean',
+        'questionnaire[0]': 'must be an integer from 0 to 3'
+    }
+    assert 'engagement.visual.timeSpent' in body['error']
+
+def test_predict_batch_reports_invalid_items(client):
+    items = [SAMPLE_PAYLOAD, payload_with('reading.scrollDepth', 'deep')]
+    response = client.post('/api/predict/batch', json={'items': items})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['success'] is True
+    assert results[1] == {
+        'success': False,
+        'error': 'engagement.reading.scrollDepth: must be a non-negative number',
+        'fields': {'engagement.reading.scrollDepth': 'must be a non-negative number'}
+    }
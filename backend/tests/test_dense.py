@@ -0,0 +1,25 @@
+import numpy as np
+
+from benchmarks import sample_inputs_featured
+from vark_dense import DenseNetwork, check_dense_parity
+
+def scaled_sample(hybrid, n_rows=2000):
+    return hybrid.scaler.transform(sample_inputs_featured(n_rows, hybrid))
+
+def test_folded_network_matches_keras(hybrid):
+    network = DenseNetwork.from_keras(hybrid.dl_model)
+    check_dense_parity(hybrid.dl_model, network, scaled_sample(hybrid))
+
+def test_saved_network_matches_keras(hybrid, tmp_path):
+    path = tmp_path / 'dense.npz'
+    DenseNetwork.from_keras(hybrid.dl_model).save(path)
+    check_dense_parity(hybrid.dl_model, DenseNetwork.load(path), scaled_sample(hybrid))
+
+def test_folded_network_keeps_keras_labels(hybrid):
+    X = scaled_sample(hybrid)
+    expected = hybrid.dl_model.predict(X.astype(np.float32), verbose=0)
+    actual = DenseNetwork.from_keras(hybrid.dl_model).predict(X)
+    # Rows whose top two classes are closer than the tolerance may flip
+    top_two = np.sort(expected, axis=1)[:, -2:]
+    clear = top_two[:, 1] - top_two[:, 0] > 1e-5
+    assert np.array_equal(expected.argmax(axis=1)[clear], actual.argmax(axis=1)[clear])
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from engagement_store import EngagementStore, SQLiteBackend
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteBackend(str(tmp_path / 'engagement.db'))
+
+def test_bad_event_is_dead_lettered_and_the_rest_written_in_order(backend):
+    store = EngagementStore(backend, flush_interval=0.01, max_attempts=2)
+    store.record('engagement', {'n': 0})
+    # Sets are not JSON serializable, so the whole batch fails to insert
+    store.record('engagement', {'n': {1}}, session_id='bad')
+    store.record('engagement', {'n': 2})
+    store.flush()
+
+    stats = store.stats()
+    assert stats['written'] == 2
+    assert stats['dead_lettered'] == 1
+    assert stats['dropped'] == 0
+    assert stats['write_errors'] >= 3
+    assert [payload['n'] for _, _, _, _, payload in backend.iter_events()] == [0, 2]
+
+    conn = sqlite3.connect(backend.path)
+    rows = conn.execute('SELECT session_id, payload, error FROM dead_letters').fetchall()
+    conn.close()
+    assert rows == [('bad', '{"n": "{1}"}', 'Object of type set is not JSON serializable')]
+    store.close()
+
+def test_writer_keeps_going_after_a_failing_batch(backend):
+    store = EngagementStore(backend, flush_interval=0.01, max_attempts=2)
+    store.record('engagement', {'n': {1}})
+    store.flush()
+    store.record('engagement', {'n': 1})
+    store.flush()
+    assert store.stats()['written'] == 1
+    assert store.stats()['buffered'] == 0
+    store.close()
+
+def test_event_is_dropped_when_the_dead_letter_fails_too(backend):
+    def reject(*args):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    backend.write_dead_letter = reject
+    store = EngagementStore(backend, flush_interval=0.01, max_attempts=1)
+    store.record('engagement', {'n': {1}})
+    store.flush()
+    assert store.stats()['dropped'] == 1
+    store.close()
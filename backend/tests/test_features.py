@@ -0,0 +1,20 @@
+import numpy as np
+
+from benchmarks import check_feature_parity, sample_inputs
+from vark_features import INPUT_COLUMNS, FEATURE_COLUMNS, RAW_ENGAGEMENT_COLUMNS, engineer_feature_matrix
+
+def test_numpy_features_match_pandas_bit_for_bit():
+    check_feature_parity(sample_inputs(5000, seed=0))
+
+def test_numpy_features_match_pandas_without_engagement():
+    # Zero time and clicks exercise every guarded division
+    df = sample_inputs(50, seed=1)
+    df.loc[:, RAW_ENGAGEMENT_COLUMNS] = 0
+    check_feature_parity(df)
+
+def test_single_row_matches_batch():
+    X = sample_inputs(100, seed=2)[INPUT_COLUMNS].to_numpy(dtype=np.float64)
+    batch = engineer_feature_matrix(X)
+    assert batch.shape == (100, len(FEATURE_COLUMNS))
+    for i in (0, 57, 99):
+        assert np.array_equal(engineer_feature_matrix(X[i:i + 1])[0], batch[i])
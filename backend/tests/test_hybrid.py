@@ -0,0 +1,12 @@
+from vark_ml_model import HybridVARKPredictor, generate_synthetic_data, prepare_training_data
+
+def test_refit_rebuilds_class_index():
+    X, y = prepare_training_data(generate_synthetic_data(n_samples=200, seed=0))
+    predictor = HybridVARKPredictor()
+    predictor.prepare_fit(X, y)
+    assert predictor.class_index == {'Auditory': 0, 'Kinesthetic': 1, 'Reading': 2, 'Visual': 3}
+
+    # The same styles under names that sort in a different order
+    relabeled = y.map({'Visual': 'a', 'Reading': 'b', 'Auditory': 'c', 'Kinesthetic': 'd'})
+    predictor.prepare_fit(X, relabeled)
+    assert predictor.class_index == {'a': 0, 'b': 1, 'c': 2, 'd': 3}
@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks import STARTUP_BUDGETS, TRAINING_ONLY_MODULES, check_startup, run_startup_probe
+
+@pytest.fixture(scope='module')
+def model_dir(hybrid, tmp_path_factory):
+    """A working directory whose serving model is already exported, as after a first start"""
+    from vark_artifacts import save_artifact
+    from vark_serving import ServingPredictor
+
+    path = tmp_path_factory.mktemp('startup')
+    save_artifact(ServingPredictor.from_hybrid(hybrid), str(path / 'models'))
+    return str(path)
+
+def test_serving_does_not_import_training_modules(model_dir):
+    result = run_startup_probe(model_dir)
+    assert result['training_modules'] == [], f"app imported {result['training_modules']}"
+    assert set(TRAINING_ONLY_MODULES) >= {'tensorflow', 'sklearn', 'pandas'}
+
+def test_startup_budgets_hold(model_dir):
+    _, failures = check_startup(model_dir)
+    assert failures == [], f"budgets {STARTUP_BUDGETS} not met: {failures}"
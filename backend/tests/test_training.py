@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import vark_ml_model
+from vark_training import compare_predictors, train_parallel
+
+pytest.importorskip('tensorflow')
+
+create_ensemble_model = vark_ml_model.create_ensemble_model
+
+def small_ensemble_model():
+    """The production ensemble with fewer trees, to keep the test quick"""
+    ensemble = create_ensemble_model()
+    ensemble.set_params(rf__n_estimators=10, gb__n_estimators=10)
+    return ensemble
+
+def test_parallel_training_matches_serial(monkeypatch):
+    # Both paths build their members through create_ensemble_model, and the
+    # spawned stages receive the members already configured
+    monkeypatch.setattr(vark_ml_model, 'create_ensemble_model', small_ensemble_model)
+    X, y = vark_ml_model.prepare_training_data(vark_ml_model.generate_synthetic_data(n_samples=600, seed=0))
+
+    parallel, _ = train_parallel(X, y, epochs=3, seed=42, budgets={'deep_model': 1, 'random_forest': 1})
+    serial = vark_ml_model.HybridVARKPredictor()
+    serial.fit(X, y, epochs=3)
+
+    comparison = compare_predictors(parallel, serial, X)
+    assert comparison['scaler_identical']
+    assert comparison['ensemble_identical']
+    assert comparison['deep_model_max_abs_diff'] < 1e-5
+    np.testing.assert_allclose(parallel.predict_proba(X), serial.predict_proba(X), atol=1e-5)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from benchmarks import sample_inputs_featured
+from vark_trees import ROW_BLOCK_SIZE, FlatGradientBoosting, FlatVotingEnsemble, check_tree_parity
+
+def scaled_sample(hybrid, n_rows):
+    return hybrid.scaler.transform(sample_inputs_featured(n_rows, hybrid))
+
+@pytest.fixture(scope='module')
+def flat(hybrid):
+    return FlatVotingEnsemble.from_sklearn(hybrid.ensemble_model)
+
+@pytest.mark.parametrize('n_rows', [1, 3 * ROW_BLOCK_SIZE + 7])
+def test_flat_ensemble_matches_sklearn(hybrid, flat, n_rows):
+    check_tree_parity(hybrid.ensemble_model, flat, scaled_sample(hybrid, n_rows))
+
+def test_flat_boosting_recovers_the_prior(hybrid):
+    gb = hybrid.ensemble_model.named_estimators_['gb']
+    flat_gb = FlatGradientBoosting.from_sklearn(gb)
+    # The multiclass log-loss prior is the log of the training class frequencies
+    prior = np.log(gb.init_.class_prior_)
+    assert not np.allclose(prior, prior[0])
+    np.testing.assert_allclose(flat_gb.init_raw, prior, atol=1e-12)
+
+    X = scaled_sample(hybrid, 2 * ROW_BLOCK_SIZE + 1)
+    np.testing.assert_allclose(flat_gb.decision_function(X.astype(np.float32)), gb.decision_function(X),
+                               atol=1e-9)
+    np.testing.assert_allclose(flat_gb.predict_proba(X.astype(np.float32)), gb.predict_proba(X), atol=1e-9)
+
+def test_saved_ensemble_matches_sklearn(hybrid, flat, tmp_path):
+    path = tmp_path / 'trees.npz'
+    flat.save(path)
+    check_tree_parity(hybrid.ensemble_model, FlatVotingEnsemble.load(path),
+                      scaled_sample(hybrid, ROW_BLOCK_SIZE + 1))
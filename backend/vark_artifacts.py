@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+from vark_precision import reduce_precision
+from vark_serving import ServingPredictor, DL_WEIGHT, ENSEMBLE_WEIGHT
+
+# ============================================
+# 1. VERSIONED ARTIFACT LAYOUT
+# ============================================
+#
+# <root>/
+#     CURRENT                      name of the version being served
+#     <version>/
+#         manifest.json            format, version, columns, classes, checksums
+#         scaler_mean.npy          one raw .npy file per array, loadable with
+#         dl_kernel_0.npy          mmap_mode='r' so forked workers share pages
+#         ensemble_m0_feature.npy
+#         ...
+
+ARTIFACT_FORMAT = 'vark-serving-model'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_text(path, text):
+    """Atomically replace a small text file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def current_version(root):
+    """Name of the version CURRENT points at, or None"""
+    path = os.path.join(root, CURRENT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip() or None
+
+def current_mtime(root):
+    """When the served version was last switched, or None"""
+    path = os.path.join(root, CURRENT_NAME)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def is_up_to_date(root, source_path):
+    """True if the served version was switched after source_path last changed"""
+    served_at = current_mtime(root)
+    if served_at is None:
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return served_at >= os.path.getmtime(source_path)
+
+def set_current(root, version):
+    if not os.path.exists(os.path.join(root, version, MANIFEST_NAME)):
+        raise ValueError(f"No artifact version {version} in {root}")
+    _write_text(os.path.join(root, CURRENT_NAME), version + '\n')
+
+def list_versions(root):
+    """All complete versions under root, oldest first"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.exists(os.path.join(root, name, MANIFEST_NAME)))
+
+def read_manifest(version_dir):
+    with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"{version_dir} is not a {ARTIFACT_FORMAT} artifact")
+    if manifest.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError(f"{version_dir} uses format version {manifest['format_version']}, "
+                         f"this code reads up to {FORMAT_VERSION}")
+    return manifest
+
+# ============================================
+# 2. SAVE AND LOAD
+# ============================================
+
+def save_artifact(predictor, root, metadata=None, make_current=True):
+    """
+    Write a ServingPredictor as a new version under root.
+
+    The version directory is assembled under a temporary name and renamed
+    into place, and CURRENT is switched only afterwards, so readers never see
+    a partial artifact. Returns the new version name.
+    """
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=root)
+
+    files = {}
+    for name, array in sorted(predictor.arrays().items()):
+        filename = f'{name}.npy'
+        path = os.path.join(tmp_dir, filename)
+        # asarray keeps 0-d parameters 0-d, ascontiguousarray would make them 1-d
+        np.save(path, np.asarray(array, order='C'))
+        files[filename] = {
+            'sha256': file_sha256(path),
+            'dtype': str(array.dtype),
+            'shape': list(array.shape)
+        }
+
+    content_digest = hashlib.sha256(
+        ''.join(f"{name}:{info['sha256']}\n" for name, info in files.items()).encode()
+    ).hexdigest()
+    created_at = datetime.now(timezone.utc)
+    version = f"{created_at:%Y%m%dT%H%M%S}Z-{content_digest[:12]}"
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'format_version': FORMAT_VERSION,
+        'model_version': version,
+        'created_at': created_at.isoformat(),
+        'feature_columns': list(predictor.feature_columns),
+        'classes': [str(label) for label in predictor.classes_],
+        'blend': ({'dl': DL_WEIGHT, 'ensemble': ENSEMBLE_WEIGHT} if predictor.ensemble_engine is not None
+                  else {'dl': 1.0}),
+        'metadata': metadata or {},
+        'files': files
+    }
+    _write_text(os.path.join(tmp_dir, MANIFEST_NAME), json.dumps(manifest, indent=2))
+
+    if os.path.exists(os.path.join(root, version)):
+        # Same content saved within the same second
+        shutil.rmtree(tmp_dir)
+    else:
+        os.rename(tmp_dir, os.path.join(root, version))
+    if make_current:
+        set_current(root, version)
+    return version
+
+# Predictor loaded by preload_artifact, keyed by its version directory and precision
+_preloaded = {}
+
+def _version_dir(root, version=None):
+    if os.path.exists(os.path.join(root, MANIFEST_NAME)):
+        return root
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No current model version in {root}")
+    return os.path.join(root, version)
+
+def preload_artifact(root, version=None, precision='full'):
+    """
+    Load a version once so that later load_artifact calls for it in this
+    process, or in processes forked from it, return the same predictor.
+
+    prefork.py calls this in the parent so every worker shares one copy of
+    the model instead of reading and verifying the files again.
+    """
+    version_dir = _version_dir(root, version)
+    _preloaded.clear()
+    predictor = load_artifact(version_dir, precision=precision)
+    _preloaded[os.path.abspath(version_dir), precision] = predictor
+    return predictor
+
+def load_artifact(root, version=None, mmap_mode='r', verify=True, precision='full'):
+    """
+    Load a ServingPredictor from an artifact root or a version directory.
+
+    Arrays are memory-mapped read-only by default, so processes forked after
+    loading (or loading the same files) share the pages. With verify, every
+    file is checked against its manifest checksum first. A precision other
+    than 'full' converts the engines in memory (see vark_precision), so the
+    converted arrays are heap copies rather than shared file mappings.
+    """
+    version_dir = _version_dir(root, version)
+    preloaded = _preloaded.get((os.path.abspath(version_dir), precision))
+    if preloaded is not None:
+        return preloaded
+
+    manifest = read_manifest(version_dir)
+    arrays = {}
+    for filename, info in manifest['files'].items():
+        path = os.path.join(version_dir, filename)
+        if verify and file_sha256(path) != info['sha256']:
+            raise ValueError(f"Checksum mismatch for {path}")
+        arrays[filename[:-len('.npy')]] = np.load(path, mmap_mode=mmap_mode)
+
+    predictor = ServingPredictor.from_arrays(arrays, manifest['feature_columns'], manifest['classes'])
+    predictor.model_version = manifest['model_version']
+    return reduce_precision(predictor, precision)
+
+# ============================================
+# 3. LEGACY PICKLES
+# ============================================
+
+def load_legacy_pickle(path):
+    """
+    Load vark_model.pkl (a whole HybridVARKPredictor) or vark_serving.pkl as
+    a ServingPredictor. Unpickling a HybridVARKPredictor imports TensorFlow.
+    """
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    if isinstance(model, ServingPredictor):
+        if not hasattr(model, 'model_version'):
+            model.model_version = None
+        return model
+    return ServingPredictor.from_hybrid(model)
+
+def load_serving_model(path, **kwargs):
+    """Load an artifact directory, or fall back to a legacy pickle file"""
+    if os.path.isdir(path):
+        return load_artifact(path, **kwargs)
+    return load_legacy_pickle(path)
+
+def convert_pickle(pickle_path, root, make_current=True):
+    """Convert a legacy pickle into a new artifact version under root"""
+    predictor = load_legacy_pickle(pickle_path)
+    metadata = {
+        'source': os.path.basename(pickle_path),
+        'source_sha256': file_sha256(pickle_path)
+    }
+    return save_artifact(predictor, root, metadata=metadata, make_current=make_current)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage versioned VARK serving artifacts')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help='Convert a legacy pickle into an artifact version')
+    convert.add_argument('pickle_path')
+    convert.add_argument('root')
+
+    show = commands.add_parser('show', help='List versions and verify the current one')
+    show.add_argument('root')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        version = convert_pickle(args.pickle_path, args.root)
+        print(f"Wrote {os.path.join(args.root, version)}")
+    else:
+        current = current_version(args.root)
+        for name in list_versions(args.root):
+            print(f"{'*' if name == current else ' '} {name}")
+        if current:
+            load_artifact(args.root)
+            print(f"Current version {current} verified")
@@ -0,0 +1,196 @@
+import argparse
+import copy
+import json
+import threading
+import time
+
+import numpy as np
+
+from vark_trees import FlatForest
+
+# ============================================
+# CONFIDENCE-GATED CASCADE
+# ============================================
+#
+# Most learners have a clearly dominant style, and for them the first few
+# trees of the random forest already agree with the full model. A cascade
+# runs only those trees first and keeps their answer when its top class
+# probability reaches `threshold`; the remaining rows escalate to the full
+# 0.6/0.4 blend of the deep model and the tree ensemble. A threshold above 1
+# escalates every row, so it behaves exactly like the full model.
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_TREES = 25
+
+def forest_subset(member, n_trees):
+    """A copy of a flat random forest member that only walks its first n_trees trees"""
+    forest = member.forest
+    subset = copy.copy(member)
+    subset.forest = FlatForest(forest.feature, forest.threshold, forest.children, forest.value,
+                               forest.roots[:n_trees], forest.max_depth)
+    return subset
+
+class ConfidenceCascade:
+    """
+    First stage of a cascade over a flat tree ensemble (see vark_trees).
+
+    The first stage reuses the node arrays of the ensemble's random forest,
+    including any reduced-precision encoding, so it adds no model memory.
+    rows and escalated count the rows seen and sent to the full model.
+    """
+
+    def __init__(self, ensemble, threshold=DEFAULT_THRESHOLD, n_trees=DEFAULT_TREES):
+        forest = next((member for member in ensemble.members if member.kind == 'forest'), None)
+        if forest is None:
+            raise ValueError("The cascade needs a random forest in the tree ensemble")
+        self.threshold = float(threshold)
+        self.n_trees = min(int(n_trees), forest.forest.n_trees)
+        self.encode = ensemble.encode
+        self.first_stage = forest_subset(forest, self.n_trees)
+        self.rows = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Predictors holding a cascade stay picklable
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def screen(self, X_scaled):
+        """First-stage probabilities and which rows they are confident about"""
+        probs = self.first_stage.predict_proba(self.encode(X_scaled))
+        return probs, probs.max(axis=1) >= self.threshold
+
+    def predict_proba(self, X_scaled, full_proba):
+        """
+        Probabilities for scaled rows: the first stage's where it is confident,
+        full_proba(rows) for the rest. Returns (probs, escalated) where
+        escalated is the index array of rows sent to full_proba.
+        """
+        return self.resolve(X_scaled, *self.screen(X_scaled), full_proba)
+
+    def resolve(self, X_scaled, probs, confident, full_proba):
+        """Second half of predict_proba, for callers that time the screen separately"""
+        escalated = np.flatnonzero(~confident)
+        if len(escalated):
+            probs = probs.astype(np.float64)
+            probs[escalated] = full_proba(X_scaled[escalated])
+        with self._lock:
+            self.rows += len(probs)
+            self.escalated += len(escalated)
+        return probs, escalated
+
+    def stats(self):
+        with self._lock:
+            rows, escalated = self.rows, self.escalated
+        return {
+            'threshold': self.threshold,
+            'trees': self.n_trees,
+            'rows': rows,
+            'escalated': escalated,
+            'escalation_rate': escalated / rows if rows else 0.0
+        }
+
+# ============================================
+# EVALUATION
+# ============================================
+
+def _per_row_seconds(fn, X, latency_rows):
+    """Mean seconds of single-row calls over the first latency_rows rows"""
+    n = min(latency_rows, len(X))
+    start = time.perf_counter()
+    for i in range(n):
+        fn(X[i:i + 1])
+    return (time.perf_counter() - start) / n
+
+def evaluate_cascade(predictor, X, y, thresholds, n_trees=DEFAULT_TREES, latency_rows=300):
+    """
+    Escalation rate, cost and accuracy of the cascade at every threshold,
+    next to the full model without one, on raw feature rows X.
+
+    Cost is the mean latency of single-row predictions, the common case
+    behind the micro-batcher, and its ratio to the full model's.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    previous = getattr(predictor, 'cascade', None)
+    predictor.set_cascade(None)
+    try:
+        full_labels = predictor.predict(X)
+        full_seconds = _per_row_seconds(predictor.predict, X, latency_rows)
+        full = {
+            'accuracy': float(np.mean(full_labels == y)),
+            'us_per_row': full_seconds * 1e6
+        }
+
+        results = []
+        for threshold in thresholds:
+            predictor.set_cascade(threshold, n_trees)
+            labels = predictor.predict(X)
+            escalation_rate = predictor.cascade.stats()['escalation_rate']
+            seconds = _per_row_seconds(predictor.predict, X, latency_rows)
+            accuracy = float(np.mean(labels == y))
+            results.append({
+                'threshold': float(threshold),
+                'trees': predictor.cascade.n_trees,
+                'escalation_rate': escalation_rate,
+                'us_per_row': seconds * 1e6,
+                'relative_cost': seconds / full_seconds,
+                'accuracy': accuracy,
+                'accuracy_delta': accuracy - full['accuracy'],
+                'agreement': float(np.mean(labels == full_labels))
+            })
+    finally:
+        predictor.cascade = previous
+    return full, results
+
+def format_results(full, results):
+    lines = [f"Full model: accuracy {full['accuracy']:.4f}, {full['us_per_row']:.1f} us/row\n",
+             f"{'threshold':>10}{'escalated':>11}{'us/row':>9}{'cost':>7}{'accuracy':>10}"
+             f"{'delta':>9}{'agree':>8}"]
+    for r in results:
+        lines.append(
+            f"{r['threshold']:>10.3f}{r['escalation_rate']:>11.1%}{r['us_per_row']:>9.1f}"
+            f"{r['relative_cost']:>7.2f}{r['accuracy']:>10.4f}{r['accuracy_delta']:>+9.4f}"
+            f"{r['agreement']:>8.4f}"
+        )
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    from vark_artifacts import load_serving_model
+    from vark_data import generate_synthetic_data
+    from vark_features import INPUT_COLUMNS, engineer_feature_matrix, select_feature_columns
+
+    parser = argparse.ArgumentParser(description='Tune the confidence threshold of the inference cascade')
+    parser.add_argument('--model', default='models',
+                        help='Artifact directory, or a vark_model.pkl / vark_serving.pkl pickle')
+    parser.add_argument('--samples', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=2024,
+                        help='Seed of the held-out synthetic set; differs from the training data')
+    parser.add_argument('--thresholds', type=float, nargs='+',
+                        default=[0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99])
+    parser.add_argument('--trees', type=int, default=DEFAULT_TREES,
+                        help='Random forest trees in the first stage')
+    parser.add_argument('--latency-rows', type=int, default=300)
+    parser.add_argument('--json', default=None, help='Also write the results to this file')
+    args = parser.parse_args()
+
+    predictor = load_serving_model(args.model)
+    df = generate_synthetic_data(n_samples=args.samples, seed=args.seed)
+    features = engineer_feature_matrix(df[INPUT_COLUMNS].to_numpy(dtype=np.float64))
+    X = select_feature_columns(features, predictor.feature_columns)
+
+    full, results = evaluate_cascade(predictor, X, df['label'].to_numpy(), args.thresholds,
+                                     n_trees=args.trees, latency_rows=args.latency_rows)
+    print(f"Held-out rows: {len(X)}, first stage: {results[0]['trees']} random forest trees\n")
+    print(format_results(full, results))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'samples': len(X), 'seed': args.seed, 'full': full, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
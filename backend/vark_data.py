@@ -0,0 +1,223 @@
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from vark_features import RAW_ENGAGEMENT_COLUMNS, QUESTIONNAIRE_COLUMNS
+
+# ============================================
+# 1. PER-STYLE DISTRIBUTIONS
+# ============================================
+
+STYLES = ['Visual', 'Auditory', 'Reading', 'Kinesthetic']
+
+# Each modality has a high-engagement profile for learners of that style, a low
+# profile, and for some styles a slightly wider "mid" profile. Integer columns
+# are drawn uniformly from [low, high) like np.random.randint; first_success is
+# a Bernoulli draw with the given probability of 1.
+MODALITY_PROFILES = {
+    'visual': {
+        'high': {
+            'visual_clicks': (8, 25), 'visual_time': (120, 600), 'video_plays': (3, 10),
+            'video_pauses': (1, 5), 'video_completion': (60, 100), 'visual_hover': (10, 60),
+            'visual_revisits': (0, 3)
+        },
+        'mid': {
+            'visual_clicks': (0, 10), 'visual_time': (0, 180), 'video_plays': (0, 3),
+            'video_pauses': (0, 2), 'video_completion': (0, 40), 'visual_hover': (0, 20),
+            'visual_revisits': (0, 1)
+        },
+        'low': {
+            'visual_clicks': (0, 8), 'visual_time': (0, 120), 'video_plays': (0, 3),
+            'video_pauses': (0, 2), 'video_completion': (0, 40), 'visual_hover': (0, 20),
+            'visual_revisits': (0, 1)
+        }
+    },
+    'auditory': {
+        'high': {
+            'auditory_clicks': (8, 25), 'auditory_time': (120, 600), 'audio_plays': (3, 10),
+            'audio_pauses': (1, 5), 'audio_completion': (60, 100), 'audio_seeks': (1, 5),
+            'auditory_hover': (10, 60), 'auditory_revisits': (0, 3)
+        },
+        'low': {
+            'auditory_clicks': (0, 8), 'auditory_time': (0, 120), 'audio_plays': (0, 3),
+            'audio_pauses': (0, 2), 'audio_completion': (0, 40), 'audio_seeks': (0, 2),
+            'auditory_hover': (0, 20), 'auditory_revisits': (0, 1)
+        }
+    },
+    'reading': {
+        'high': {
+            'reading_clicks': (8, 25), 'reading_time': (120, 600), 'scroll_depth': (60, 100),
+            'max_scroll': (70, 100), 'text_selections': (2, 8), 'reading_hover': (10, 60),
+            'reading_revisits': (0, 3)
+        },
+        'mid': {
+            'reading_clicks': (0, 10), 'reading_time': (0, 180), 'scroll_depth': (0, 50),
+            'max_scroll': (0, 60), 'text_selections': (0, 3), 'reading_hover': (0, 20),
+            'reading_revisits': (0, 1)
+        },
+        'low': {
+            'reading_clicks': (0, 8), 'reading_time': (0, 120), 'scroll_depth': (0, 40),
+            'max_scroll': (0, 50), 'text_selections': (0, 2), 'reading_hover': (0, 20),
+            'reading_revisits': (0, 1)
+        }
+    },
+    'kinesthetic': {
+        'high': {
+            'kinesthetic_clicks': (8, 25), 'kinesthetic_time': (120, 600), 'drag_attempts': (5, 15),
+            'incorrect_drops': (1, 5), 'correct_drops': (2, 4), 'completion_time': (30, 180),
+            'first_success': 0.6, 'reset_clicks': (0, 4), 'kinesthetic_hover': (10, 60),
+            'kinesthetic_revisits': (0, 3)
+        },
+        'mid': {
+            'kinesthetic_clicks': (0, 10), 'kinesthetic_time': (0, 180), 'drag_attempts': (0, 6),
+            'incorrect_drops': (0, 3), 'correct_drops': (0, 3), 'completion_time': (0, 80),
+            'first_success': 0.4, 'reset_clicks': (0, 3), 'kinesthetic_hover': (0, 30),
+            'kinesthetic_revisits': (0, 2)
+        },
+        'low': {
+            'kinesthetic_clicks': (0, 8), 'kinesthetic_time': (0, 120), 'drag_attempts': (0, 5),
+            'incorrect_drops': (0, 3), 'correct_drops': (0, 2), 'completion_time': (0, 60),
+            'first_success': 0.3, 'reset_clicks': (0, 2), 'kinesthetic_hover': (0, 20),
+            'kinesthetic_revisits': (0, 1)
+        }
+    }
+}
+
+# Which profile each modality uses for learners of a given style
+STYLE_PROFILES = {
+    'Visual': {'visual': 'high', 'auditory': 'low', 'reading': 'mid', 'kinesthetic': 'low'},
+    'Auditory': {'visual': 'mid', 'auditory': 'high', 'reading': 'low', 'kinesthetic': 'low'},
+    'Reading': {'visual': 'low', 'auditory': 'low', 'reading': 'high', 'kinesthetic': 'mid'},
+    'Kinesthetic': {'visual': 'low', 'auditory': 'low', 'reading': 'low', 'kinesthetic': 'high'}
+}
+
+# Probability that a questionnaire answer matches the learner's true style
+PREFERRED_ANSWER_PROB = 0.7
+
+def style_distribution(style):
+    """Column -> distribution for every raw engagement metric of one style"""
+    distribution = {}
+    for modality, level in STYLE_PROFILES[style].items():
+        distribution.update(MODALITY_PROFILES[modality][level])
+    return distribution
+
+# ============================================
+# 2. VECTORIZED GENERATION
+# ============================================
+
+def generate_synthetic_chunk(n_samples, rng):
+    """
+    Draw n_samples rows with array-level sampling.
+
+    Returns a dict of int32 column arrays in RAW_ENGAGEMENT_COLUMNS and
+    QUESTIONNAIRE_COLUMNS order plus 'label_code', an int8 index into STYLES.
+    """
+    label_code = rng.integers(0, len(STYLES), size=n_samples).astype(np.int8)
+    columns = {name: np.empty(n_samples, dtype=np.int32) for name in RAW_ENGAGEMENT_COLUMNS}
+
+    for code, style in enumerate(STYLES):
+        rows = np.flatnonzero(label_code == code)
+        for name, dist in style_distribution(style).items():
+            if isinstance(dist, tuple):
+                columns[name][rows] = rng.integers(dist[0], dist[1], size=len(rows))
+            else:
+                columns[name][rows] = rng.random(len(rows)) < dist
+
+    # Questionnaire: mostly the preferred answer, otherwise uniform
+    preferred = rng.random((n_samples, len(QUESTIONNAIRE_COLUMNS))) < PREFERRED_ANSWER_PROB
+    random_answers = rng.integers(0, len(STYLES), size=preferred.shape)
+    answers = np.where(preferred, label_code[:, None], random_answers).astype(np.int32)
+    for i, name in enumerate(QUESTIONNAIRE_COLUMNS):
+        columns[name] = answers[:, i]
+
+    columns['label_code'] = label_code
+    return columns
+
+def chunk_to_frame(columns):
+    """DataFrame with the same columns and dtypes as generate_synthetic_data"""
+    data = {name: columns[name].astype(np.int64) for name in RAW_ENGAGEMENT_COLUMNS}
+    data['label'] = np.array(STYLES, dtype=object)[columns['label_code']]
+    for name in QUESTIONNAIRE_COLUMNS:
+        data[name] = columns[name].astype(np.int64)
+    return pd.DataFrame(data)
+
+def generate_synthetic_data(n_samples=5000, seed=None):
+    """
+    Generate synthetic training data with ALL tracked metrics.
+
+    Without a seed, one is drawn from the global np.random state so that
+    np.random.seed still makes runs reproducible.
+    """
+    if seed is None:
+        seed = np.random.randint(0, 2**31 - 1)
+    rng = np.random.default_rng(seed)
+    return chunk_to_frame(generate_synthetic_chunk(n_samples, rng))
+
+# ============================================
+# 3. SHARDED STREAMING TO DISK
+# ============================================
+
+def _write_shard(out_dir, shard, n_samples, chunk_size, seed_sequence):
+    """Stream one shard to disk chunk by chunk; returns the written paths"""
+    rng = np.random.default_rng(seed_sequence)
+    paths = []
+    for chunk, start in enumerate(range(0, n_samples, chunk_size)):
+        columns = generate_synthetic_chunk(min(chunk_size, n_samples - start), rng)
+        path = os.path.join(out_dir, f'part-{shard:05d}-{chunk:05d}.npz')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+def generate_synthetic_shards(n_samples, out_dir, shard_size=1_000_000, chunk_size=100_000,
+                              seed=42, n_jobs=1):
+    """
+    Generate n_samples rows into out_dir as columnar .npz chunks.
+
+    Every shard draws from its own child of SeedSequence(seed), so the output
+    is identical whatever n_jobs is and shards can be produced by separate
+    processes. Only one chunk per worker is held in memory at a time.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    shard_rows = [min(shard_size, n_samples - start) for start in range(0, n_samples, shard_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(shard_rows))
+    tasks = [(out_dir, shard, rows, chunk_size, seed_sequences[shard])
+             for shard, rows in enumerate(shard_rows)]
+
+    if n_jobs == 1:
+        results = [_write_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_write_shard, *zip(*tasks)))
+
+    return [path for paths in results for path in paths]
+
+def iter_synthetic_chunks(data_dir):
+    """Yield each stored chunk as a DataFrame, in generation order"""
+    for path in sorted(glob.glob(os.path.join(data_dir, 'part-*.npz'))):
+        with np.load(path) as columns:
+            yield chunk_to_frame(columns)
+
+def load_synthetic_data(data_dir):
+    """Load every stored chunk into one DataFrame"""
+    return pd.concat(iter_synthetic_chunks(data_dir), ignore_index=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate sharded synthetic VARK training data')
+    parser.add_argument('--rows', type=int, required=True, help='Total number of rows')
+    parser.add_argument('--out', required=True, help='Output directory')
+    parser.add_argument('--shard-size', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    paths = generate_synthetic_shards(args.rows, args.out, args.shard_size, args.chunk_size,
+                                      args.seed, args.jobs)
+    print(f"Wrote {args.rows} rows to {len(paths)} chunks in {args.out}")
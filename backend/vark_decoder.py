@@ -0,0 +1,153 @@
+import math
+
+import numpy as np
+
+from vark_features import (
+    ENGAGEMENT_SCHEMA, INPUT_COLUMNS, INPUT_INDEX, MAX_ENGAGEMENT_VALUE, N_ANSWERS, N_QUESTIONS,
+    QUESTIONNAIRE_COLUMNS
+)
+
+# ============================================
+# REQUEST DECODER
+# ============================================
+
+class PayloadError(ValueError):
+    """
+    A payload that does not match the feature schema. errors maps each
+    offending field path, e.g. 'engagement.visual.clicks' or
+    'questionnaire[3]', to what is wrong with it.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f'{path}: {message}' for path, message in errors.items()))
+
+def _number(value):
+    """value as a float, or None if it is not a finite non-negative number"""
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if not isinstance(value, (int, float)):
+        return None
+    try:
+        value = float(value)
+    except OverflowError:
+        return None
+    if not math.isfinite(value) or value < 0:
+        return None
+    return value
+
+def _flag(value):
+    """value as 0.0 or 1.0, or None if it is neither a boolean nor 0 or 1"""
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return float(value)
+    return None
+
+def _answer(value):
+    """value as an option index, or None if it is not an integer below N_ANSWERS"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if isinstance(value, float) and not value.is_integer():
+        return None
+    return int(value) if 0 <= value < N_ANSWERS else None
+
+class RequestDecoder:
+    """
+    Validate /api/predict payloads and write their raw inputs straight into
+    rows in INPUT_COLUMNS order.
+
+    The walk over the payload is planned once from ENGAGEMENT_SCHEMA: fields
+    are grouped by modality with their row index and default, so decoding
+    does one dict lookup per field and no intermediate dict, list or frame.
+    Every problem in a payload is collected before raising, so clients see
+    all of them at once. Numbers above MAX_ENGAGEMENT_VALUE, or above what
+    dtype can hold, are rejected; float64 rows keep every accepted number
+    exactly as the JSON parser read it.
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = dtype
+        self.max_value = min(MAX_ENGAGEMENT_VALUE, float(np.finfo(dtype).max))
+        plan = {}
+        for field in ENGAGEMENT_SCHEMA:
+            plan.setdefault(field.modality, []).append(
+                (field.key, INPUT_INDEX[field.column], field.default, field.kind == 'flag',
+                 f'engagement.{field.modality}.{field.key}')
+            )
+        self._plan = list(plan.items())
+        self._questionnaire_offset = INPUT_INDEX[QUESTIONNAIRE_COLUMNS[0]]
+
+    def decode_into(self, payload, out):
+        """Fill out, a row of len(INPUT_COLUMNS), from payload; raises PayloadError"""
+        if not isinstance(payload, dict):
+            raise PayloadError({'payload': 'must be an object'})
+        errors = {}
+
+        engagement = payload.get('engagement')
+        if not isinstance(engagement, dict):
+            errors['engagement'] = 'required' if engagement is None else 'must be an object'
+        else:
+            max_value = self.max_value
+            for modality, fields in self._plan:
+                metrics = engagement.get(modality)
+                if not isinstance(metrics, dict):
+                    errors[f'engagement.{modality}'] = 'required' if metrics is None else 'must be an object'
+                    continue
+                for key, index, default, flag, path in fields:
+                    value = metrics.get(key, default)
+                    if value is None:
+                        errors[path] = 'required' if key not in metrics else 'must not be null'
+                    elif flag:
+                        number = _flag(value)
+                        if number is None:
+                            errors[path] = 'must be a boolean'
+                        else:
+                            out[index] = number
+                    else:
+                        number = _number(value)
+                        if number is None:
+                            errors[path] = 'must be a non-negative number'
+                        elif number > max_value:
+                            errors[path] = f'must be at most {max_value:g}'
+                        else:
+                            out[index] = number
+
+        questionnaire = payload.get('questionnaire')
+        if not isinstance(questionnaire, list):
+            errors['questionnaire'] = 'required' if questionnaire is None else 'must be a list'
+        elif len(questionnaire) != N_QUESTIONS:
+            errors['questionnaire'] = f'must have exactly {N_QUESTIONS} answers'
+        else:
+            offset = self._questionnaire_offset
+            for i, value in enumerate(questionnaire):
+                answer = _answer(value)
+                if answer is None:
+                    errors[f'questionnaire[{i}]'] = f'must be an integer from 0 to {N_ANSWERS - 1}'
+                else:
+                    out[offset + i] = answer
+
+        if errors:
+            raise PayloadError(errors)
+        return out
+
+    def decode(self, payload):
+        """A new raw input row for one payload"""
+        return self.decode_into(payload, np.empty(len(INPUT_COLUMNS), dtype=self.dtype))
+
+    def decode_batch(self, payloads, out=None):
+        """
+        Decode many payloads into one (n, len(INPUT_COLUMNS)) array.
+
+        Returns (rows, errors) where errors[i] is the PayloadError of item i,
+        or None if it decoded; rows of invalid items are unspecified.
+        """
+        if out is None:
+            out = np.empty((len(payloads), len(INPUT_COLUMNS)), dtype=self.dtype)
+        errors = [None] * len(payloads)
+        for i, payload in enumerate(payloads):
+            try:
+                self.decode_into(payload, out[i])
+            except PayloadError as e:
+                errors[i] = e
+        return out, errors
@@ -0,0 +1,135 @@
+import numpy as np
+
+# ============================================
+# NUMPY SERVING ENGINE FOR THE DEEP MODEL
+# ============================================
+
+ACTIVATIONS = ('linear', 'relu', 'softmax')
+
+def _apply_activation(z, activation):
+    if activation == 'relu':
+        return np.maximum(z, 0, out=z)
+    if activation == 'softmax':
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+    return z
+
+def fold_keras_model(model):
+    """
+    Flatten a sequential Dense/BatchNorm/Activation/Dropout Keras model into
+    a list of (weights, bias, activation) layers.
+
+    Each inference-mode BatchNormalization is folded into the Dense layer in
+    front of it and Dropout layers are dropped, so the whole network becomes
+    one GEMM plus activation per Dense layer.
+    """
+    layers = []
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+
+        if kind in ('InputLayer', 'Dropout'):
+            continue
+
+        if kind == 'Dense':
+            weights = layer.get_weights()
+            kernel = weights[0]
+            bias = weights[1] if layer.use_bias else np.zeros(kernel.shape[1])
+            layers.append([kernel.astype(np.float64), bias.astype(np.float64),
+                           layer.activation.__name__])
+
+        elif kind == 'BatchNormalization':
+            if not layers or layers[-1][2] != 'linear':
+                raise ValueError(f"Cannot fold {layer.name}: it must directly follow a linear Dense layer")
+            gamma = layer.gamma.numpy() if layer.scale else 1.0
+            beta = layer.beta.numpy() if layer.center else 0.0
+            mean = layer.moving_mean.numpy()
+            variance = layer.moving_variance.numpy()
+
+            scale = gamma / np.sqrt(variance.astype(np.float64) + layer.epsilon)
+            kernel, bias, activation = layers[-1]
+            layers[-1] = [kernel * scale, (bias - mean) * scale + beta, activation]
+
+        elif kind == 'Activation':
+            if not layers or layers[-1][2] != 'linear':
+                raise ValueError(f"Cannot merge {layer.name}: it must directly follow a linear layer")
+            layers[-1][2] = layer.activation.__name__
+
+        else:
+            raise ValueError(f"Unsupported layer type for NumPy serving: {kind}")
+
+    for _, _, activation in layers:
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation for NumPy serving: {activation}")
+
+    return [tuple(layer) for layer in layers]
+
+class DenseNetwork:
+    """NumPy forward pass for a folded feed-forward network"""
+
+    def __init__(self, layers, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.layers = [(np.ascontiguousarray(kernel, dtype=self.dtype),
+                        np.ascontiguousarray(bias, dtype=self.dtype),
+                        activation)
+                       for kernel, bias, activation in layers]
+
+    @classmethod
+    def from_keras(cls, model, dtype=np.float32):
+        return cls(fold_keras_model(model), dtype=dtype)
+
+    @property
+    def nbytes(self):
+        return sum(kernel.nbytes + bias.nbytes for kernel, bias, _ in self.layers)
+
+    def predict(self, X):
+        """Class probabilities for a batch of scaled feature rows"""
+        h = np.asarray(X, dtype=self.dtype)
+        for kernel, bias, activation in self.layers:
+            h = h @ kernel
+            h += bias
+            h = _apply_activation(h, activation)
+        return h
+
+    def arrays(self, prefix=''):
+        """Folded weights as named arrays"""
+        arrays = {}
+        for i, (kernel, bias, activation) in enumerate(self.layers):
+            arrays[f'{prefix}kernel_{i}'] = kernel
+            arrays[f'{prefix}bias_{i}'] = bias
+        arrays[f'{prefix}activations'] = np.array([activation for _, _, activation in self.layers])
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix='', dtype=None):
+        activations = [str(a) for a in arrays[f'{prefix}activations']]
+        layers = [(arrays[f'{prefix}kernel_{i}'], arrays[f'{prefix}bias_{i}'], activation)
+                  for i, activation in enumerate(activations)]
+        return cls(layers, dtype=dtype or layers[0][0].dtype)
+
+    def save(self, path):
+        """Write the folded weights to a compact .npz file"""
+        with open(path, 'wb') as f:
+            np.savez(f, **self.arrays())
+
+    @classmethod
+    def load(cls, path, dtype=None):
+        with np.load(path) as arrays:
+            return cls.from_arrays(arrays, dtype=dtype)
+
+def export_dense_network(model, path, dtype=np.float32):
+    """Fold a Keras model and save it for NumPy-only serving"""
+    network = DenseNetwork.from_keras(model, dtype=dtype)
+    network.save(path)
+    return network
+
+def check_dense_parity(model, network, X, atol=1e-5):
+    """Largest absolute difference between Keras and NumPy probabilities"""
+    expected = model.predict(np.asarray(X, dtype=np.float32), verbose=0)
+    actual = network.predict(X)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    if max_diff > atol:
+        raise AssertionError(f"NumPy forward pass differs from Keras by {max_diff:.2e}")
+    return max_diff
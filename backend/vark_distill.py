@@ -0,0 +1,229 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from vark_data import chunk_to_frame, generate_synthetic_chunk, iter_synthetic_chunks
+from vark_dense import DenseNetwork, fold_keras_model
+from vark_features import INPUT_COLUMNS, engineer_feature_matrix, select_feature_columns
+from vark_serving import ServingPredictor
+
+# ============================================
+# KNOWLEDGE DISTILLATION
+# ============================================
+#
+# Trains a small MLP (the student) to reproduce the blended probabilities of
+# the hybrid model (the teacher: deep model + 200-tree forest + 200-stage
+# boosting) on large generated datasets, and publishes it as a separate
+# serving artifact. The student reuses the teacher's feature columns, scaler
+# and classes, so it is served by ServingPredictor without a tree ensemble
+# and app.py selects it with VARK_SERVING_MODEL=student.
+#
+# Soft targets are the teacher's blended probabilities, optionally softened
+# with a temperature; the student is trained on KL divergence to them and
+# served at temperature 1.
+
+# Where app.py loads the student from
+STUDENT_ARTIFACT_DIR = 'models_student'
+
+DEFAULT_HIDDEN = (32, 16)
+
+# ============================================
+# 1. SOFT TARGETS
+# ============================================
+
+def generated_chunks(n_samples, seed=42, chunk_size=100_000):
+    """Fresh synthetic rows as DataFrames of at most chunk_size rows"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, chunk_size):
+        yield chunk_to_frame(generate_synthetic_chunk(min(chunk_size, n_samples - start), rng))
+
+def teacher_targets(teacher, chunks, batch_size=8192):
+    """
+    Scaled feature rows, the teacher's blended probabilities and the true
+    labels for every row of chunks, as float32 arrays (labels as strings).
+    """
+    X_parts, target_parts, label_parts = [], [], []
+    for df in chunks:
+        features = engineer_feature_matrix(df[INPUT_COLUMNS].to_numpy(dtype=np.float64))
+        X_scaled = teacher.transform(select_feature_columns(features, teacher.feature_columns))
+        for start in range(0, len(X_scaled), batch_size):
+            batch = X_scaled[start:start + batch_size]
+            target_parts.append(teacher.blended_proba(batch).astype(np.float32))
+        X_parts.append(X_scaled.astype(np.float32))
+        label_parts.append(df['label'].to_numpy())
+    return np.concatenate(X_parts), np.concatenate(target_parts), np.concatenate(label_parts)
+
+def soften(probs, temperature):
+    """Probabilities with their logits divided by temperature"""
+    if temperature == 1.0:
+        return probs
+    logits = np.log(np.clip(probs, 1e-12, None)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    softened = np.exp(logits)
+    return (softened / softened.sum(axis=1, keepdims=True)).astype(probs.dtype)
+
+# ============================================
+# 2. STUDENT TRAINING
+# ============================================
+
+def create_student_model(input_dim, num_classes=4, hidden=DEFAULT_HIDDEN):
+    """Small ReLU MLP ending in class logits"""
+    from tensorflow import keras
+
+    inputs = keras.Input(shape=(input_dim,))
+    x = inputs
+    for units in hidden:
+        x = keras.layers.Dense(units, activation='relu')(x)
+    outputs = keras.layers.Dense(num_classes)(x)
+    return keras.Model(inputs=inputs, outputs=outputs)
+
+def fit_student(X, targets, hidden=DEFAULT_HIDDEN, epochs=30, batch_size=256, temperature=1.0,
+                learning_rate=1e-3, validation_split=0.1, seed=42, verbose=0):
+    """Train a student on soft targets; returns (model, history)"""
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    keras.utils.set_random_seed(seed)
+    model = create_student_model(X.shape[1], targets.shape[1], hidden)
+
+    def distillation_loss(y_true, logits):
+        # Scaled by T^2 so gradients keep their size across temperatures
+        return keras.losses.kl_divergence(y_true, tf.nn.softmax(logits / temperature)) * temperature ** 2
+
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss=distillation_loss)
+    early_stop = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+    history = model.fit(
+        X, soften(targets, temperature),
+        validation_split=validation_split,
+        epochs=epochs,
+        batch_size=batch_size,
+        callbacks=[early_stop],
+        verbose=verbose
+    )
+    return model, history
+
+def student_predictor(model, teacher):
+    """Serve a trained student with the teacher's columns, scaler and classes"""
+    layers = fold_keras_model(model)
+    kernel, bias, _ = layers[-1]
+    layers[-1] = (kernel, bias, 'softmax')
+    return ServingPredictor(teacher.feature_columns, teacher.classes_, teacher.scaler_mean,
+                            teacher.scaler_scale, DenseNetwork(layers), None)
+
+def distill(teacher, n_samples=200_000, data_dir=None, hidden=DEFAULT_HIDDEN, epochs=30,
+            batch_size=256, temperature=1.0, seed=42):
+    """
+    Distill a serving teacher into a student ServingPredictor.
+
+    Rows come from data_dir (written by vark_data.py) when given, otherwise
+    n_samples rows are generated. Returns (student, report).
+    """
+    timings = {}
+    start = time.perf_counter()
+    chunks = iter_synthetic_chunks(data_dir) if data_dir else generated_chunks(n_samples, seed)
+    X, targets, _ = teacher_targets(teacher, chunks)
+    timings['teacher'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model, history = fit_student(X, targets, hidden=hidden, epochs=epochs, batch_size=batch_size,
+                                 temperature=temperature, seed=seed)
+    timings['student'] = time.perf_counter() - start
+
+    return student_predictor(model, teacher), {
+        'rows': len(X),
+        'hidden': list(hidden),
+        'temperature': temperature,
+        'epochs_run': len(history.epoch),
+        'val_loss': float(min(history.history['val_loss'])),
+        'timings': timings
+    }
+
+# ============================================
+# 3. EVALUATION AND PUBLISHING
+# ============================================
+
+def evaluate_student(student, teacher, X, y, latency_rows=200, batch_size=64):
+    """Size, latency, throughput and agreement of teacher and student on raw feature rows"""
+    from vark_precision import evaluate_precision
+
+    X = np.asarray(X, dtype=np.float64)
+    teacher_labels, teacher_probs = teacher.predict_with_proba(X)
+    results = {}
+    for name, predictor in (('teacher', teacher), ('student', student)):
+        result = evaluate_precision(predictor, X, teacher_labels, teacher_probs, y,
+                                    latency_rows=latency_rows, batch_size=batch_size)
+        result.pop('precision')
+        results[name] = result
+    results['student']['size_ratio'] = results['student']['model_bytes'] / results['teacher']['model_bytes']
+    return results
+
+def publish_student(student, root=STUDENT_ARTIFACT_DIR, metadata=None):
+    """Save the student as the current version of its own artifact root"""
+    from vark_artifacts import save_artifact
+
+    return save_artifact(student, root, metadata=dict(metadata or {}, kind='student'))
+
+if __name__ == "__main__":
+    from vark_artifacts import load_serving_model
+
+    parser = argparse.ArgumentParser(description='Distill the hybrid VARK model into a small serving MLP')
+    parser.add_argument('--teacher', default='models',
+                        help='Teacher artifact directory, or a vark_model.pkl pickle')
+    parser.add_argument('--samples', type=int, default=200_000, help='Generated training rows')
+    parser.add_argument('--data', default=None, help='Train on a directory written by vark_data.py instead')
+    parser.add_argument('--holdout-samples', type=int, default=20_000)
+    parser.add_argument('--holdout-seed', type=int, default=2024)
+    parser.add_argument('--hidden', type=int, nargs='+', default=list(DEFAULT_HIDDEN))
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--temperature', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default=STUDENT_ARTIFACT_DIR)
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help='Lowest held-out agreement with the teacher that may be published')
+    parser.add_argument('--dry-run', action='store_true', help='Evaluate without publishing')
+    parser.add_argument('--json', default=None, help='Also write the report to this file')
+    args = parser.parse_args()
+
+    total_start = time.perf_counter()
+    teacher = load_serving_model(args.teacher)
+    student, report = distill(teacher, n_samples=args.samples, data_dir=args.data,
+                              hidden=tuple(args.hidden), epochs=args.epochs, batch_size=args.batch_size,
+                              temperature=args.temperature, seed=args.seed)
+    print(f"Trained a {'-'.join(map(str, args.hidden))} student on {report['rows']} rows "
+          f"({report['epochs_run']} epochs, val KL {report['val_loss']:.5f})")
+
+    holdout = next(generated_chunks(args.holdout_samples, args.holdout_seed, chunk_size=args.holdout_samples))
+    features = engineer_feature_matrix(holdout[INPUT_COLUMNS].to_numpy(dtype=np.float64))
+    X_holdout = select_feature_columns(features, teacher.feature_columns)
+    report['evaluation'] = evaluate_student(student, teacher, X_holdout, holdout['label'].to_numpy())
+
+    print(f"\n{'model':<9}{'size KiB':>10}{'p50 us':>9}{'p95 us':>9}{'rows/s':>10}"
+          f"{'agree':>8}{'max dp':>9}{'acc':>8}")
+    for name in ('teacher', 'student'):
+        r = report['evaluation'][name]
+        print(f"{name:<9}{r['model_bytes'] / 1024:>10.1f}{r['latency_p50_us']:>9.1f}{r['latency_p95_us']:>9.1f}"
+              f"{r['throughput_rows_s']:>10.0f}{r['agreement']:>8.4f}{r['max_prob_diff']:>9.2e}"
+              f"{r['accuracy']:>8.4f}")
+
+    agreement = report['evaluation']['student']['agreement']
+    report['accepted'] = agreement >= args.min_agreement
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if not report['accepted']:
+        print(f"\nAgreement {agreement:.4f} is below {args.min_agreement}, not publishing")
+        raise SystemExit(1)
+    if args.dry_run:
+        print("\nDry run, not publishing")
+    else:
+        version = publish_student(student, args.out, metadata={
+            'teacher': teacher.model_version,
+            'distillation': {key: report[key] for key in ('rows', 'hidden', 'temperature', 'epochs_run')},
+            'agreement': agreement
+        })
+        print(f"\nPublished student version {version} to {args.out}")
+    print(f"Total: {time.perf_counter() - total_start:.2f}s")
@@ -0,0 +1,190 @@
+from collections import namedtuple
+
+import numpy as np
+
+# ============================================
+# 1. FEATURE COLUMNS
+# ============================================
+
+# The raw engagement inputs, in model input order, and where they come from:
+# engagement[modality][key] in an /api/predict payload. A default of None
+# marks a required field; 'flag' fields are booleans stored as 0/1 and the
+# rest are non-negative numbers. merge is how streaming session events
+# combine (see sessions.py). The columns below, the request decoder
+# (vark_decoder.py) and the session accumulators are all derived from this.
+EngagementField = namedtuple('EngagementField', 'column modality key default kind merge')
+
+ENGAGEMENT_SCHEMA = [
+    EngagementField('visual_clicks', 'visual', 'clicks', None, 'number', 'add'),
+    EngagementField('visual_time', 'visual', 'timeSpent', None, 'number', 'add'),
+    EngagementField('video_plays', 'visual', 'videoPlays', 0, 'number', 'add'),
+    EngagementField('video_pauses', 'visual', 'videoPauses', 0, 'number', 'add'),
+    EngagementField('video_completion', 'visual', 'videoCompletionPercent', 0, 'number', 'max'),
+    EngagementField('visual_hover', 'visual', 'hoverTime', 0, 'number', 'add'),
+    EngagementField('visual_revisits', 'visual', 'revisits', 0, 'number', 'add'),
+
+    EngagementField('auditory_clicks', 'auditory', 'clicks', None, 'number', 'add'),
+    EngagementField('auditory_time', 'auditory', 'timeSpent', None, 'number', 'add'),
+    EngagementField('audio_plays', 'auditory', 'audioPlays', 0, 'number', 'add'),
+    EngagementField('audio_pauses', 'auditory', 'audioPauses', 0, 'number', 'add'),
+    EngagementField('audio_completion', 'auditory', 'audioCompletionPercent', 0, 'number', 'max'),
+    EngagementField('audio_seeks', 'auditory', 'seekEvents', 0, 'number', 'add'),
+    EngagementField('auditory_hover', 'auditory', 'hoverTime', 0, 'number', 'add'),
+    EngagementField('auditory_revisits', 'auditory', 'revisits', 0, 'number', 'add'),
+
+    EngagementField('reading_clicks', 'reading', 'clicks', None, 'number', 'add'),
+    EngagementField('reading_time', 'reading', 'timeSpent', None, 'number', 'add'),
+    EngagementField('scroll_depth', 'reading', 'scrollDepth', 0, 'number', 'set'),
+    EngagementField('max_scroll', 'reading', 'maxScrollDepth', 0, 'number', 'max'),
+    EngagementField('text_selections', 'reading', 'textSelections', 0, 'number', 'add'),
+    EngagementField('reading_hover', 'reading', 'hoverTime', 0, 'number', 'add'),
+    EngagementField('reading_revisits', 'reading', 'revisits', 0, 'number', 'add'),
+
+    EngagementField('kinesthetic_clicks', 'kinesthetic', 'clicks', None, 'number', 'add'),
+    EngagementField('kinesthetic_time', 'kinesthetic', 'timeSpent', None, 'number', 'add'),
+    EngagementField('drag_attempts', 'kinesthetic', 'dragAttempts', 0, 'number', 'add'),
+    EngagementField('incorrect_drops', 'kinesthetic', 'incorrectDrops', 0, 'number', 'add'),
+    EngagementField('correct_drops', 'kinesthetic', 'correctDrops', 0, 'number', 'add'),
+    EngagementField('completion_time', 'kinesthetic', 'taskCompletionTime', 0, 'number', 'set'),
+    EngagementField('first_success', 'kinesthetic', 'firstAttemptSuccess', False, 'flag', 'set'),
+    EngagementField('reset_clicks', 'kinesthetic', 'resetClicks', 0, 'number', 'add'),
+    EngagementField('kinesthetic_hover', 'kinesthetic', 'hoverTime', 0, 'number', 'add'),
+    EngagementField('kinesthetic_revisits', 'kinesthetic', 'revisits', 0, 'number', 'add')
+]
+
+RAW_ENGAGEMENT_COLUMNS = [field.column for field in ENGAGEMENT_SCHEMA]
+
+# Largest accepted engagement value. Engineered features multiply pairs of
+# inputs and the serving engines run in float32, so inputs stay far below
+# its range
+MAX_ENGAGEMENT_VALUE = 1e9
+
+# The questionnaire is a list of N_QUESTIONS answers, each an option index
+# below N_ANSWERS
+N_QUESTIONS = 10
+N_ANSWERS = 4
+QUESTIONNAIRE_COLUMNS = [f'q{i+1}' for i in range(N_QUESTIONS)]
+
+# Raw model inputs, in the order produced by generate_synthetic_data
+INPUT_COLUMNS = RAW_ENGAGEMENT_COLUMNS + QUESTIONNAIRE_COLUMNS
+
+# Columns added by engineer_features, in the order it adds them
+ENGINEERED_COLUMNS = [
+    'total_clicks', 'total_time', 'total_hover', 'total_revisits',
+    'visual_click_ratio', 'auditory_click_ratio', 'reading_click_ratio', 'kinesthetic_click_ratio',
+    'visual_time_ratio', 'auditory_time_ratio', 'reading_time_ratio', 'kinesthetic_time_ratio',
+    'visual_engagement_score', 'auditory_engagement_score',
+    'reading_engagement_score', 'kinesthetic_engagement_score',
+    'visual_avg_time', 'auditory_avg_time', 'reading_avg_time', 'kinesthetic_avg_time',
+    'answer_0_count', 'answer_1_count', 'answer_2_count', 'answer_3_count',
+    'dominant_answer', 'answer_consistency',
+    'visual_quality', 'auditory_quality', 'reading_quality', 'kinesthetic_quality'
+]
+
+# Model input order used by HybridVARKPredictor.feature_columns
+FEATURE_COLUMNS = INPUT_COLUMNS + ENGINEERED_COLUMNS
+
+INPUT_INDEX = {name: i for i, name in enumerate(INPUT_COLUMNS)}
+
+# ============================================
+# 2. VECTORIZED FEATURE ENGINEERING
+# ============================================
+
+def engineer_feature_matrix(X):
+    """
+    NumPy equivalent of engineer_features.
+
+    Takes a 2-D array whose columns follow INPUT_COLUMNS and returns a float64
+    array whose columns follow FEATURE_COLUMNS. Every feature is computed with
+    the same operations in the same order as the pandas implementation, so the
+    values are bit-for-bit identical.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.shape[1] != len(INPUT_COLUMNS):
+        raise ValueError(f"Expected {len(INPUT_COLUMNS)} input columns, got {X.shape[1]}")
+
+    n_inputs = len(INPUT_COLUMNS)
+    out = np.empty((X.shape[0], len(FEATURE_COLUMNS)), dtype=np.float64)
+    out[:, :n_inputs] = X
+
+    def col(name):
+        return X[:, INPUT_INDEX[name]]
+
+    features = {}
+
+    # Total engagement
+    total_clicks = (col('visual_clicks') + col('auditory_clicks') +
+                    col('reading_clicks') + col('kinesthetic_clicks'))
+    total_time = (col('visual_time') + col('auditory_time') +
+                  col('reading_time') + col('kinesthetic_time'))
+    features['total_clicks'] = total_clicks
+    features['total_time'] = total_time
+    features['total_hover'] = (col('visual_hover') + col('auditory_hover') +
+                               col('reading_hover') + col('kinesthetic_hover'))
+    features['total_revisits'] = (col('visual_revisits') + col('auditory_revisits') +
+                                  col('reading_revisits') + col('kinesthetic_revisits'))
+
+    # Engagement ratios
+    for modality in ('visual', 'auditory', 'reading', 'kinesthetic'):
+        features[f'{modality}_click_ratio'] = col(f'{modality}_clicks') / (total_clicks + 1)
+    for modality in ('visual', 'auditory', 'reading', 'kinesthetic'):
+        features[f'{modality}_time_ratio'] = col(f'{modality}_time') / (total_time + 1)
+
+    # Media completion scores (weighted)
+    features['visual_engagement_score'] = (
+        col('video_plays') * 2 +
+        col('video_completion') / 100 * 5 +
+        col('video_pauses') * 0.5
+    )
+    features['auditory_engagement_score'] = (
+        col('audio_plays') * 2 +
+        col('audio_completion') / 100 * 5 +
+        col('audio_seeks') * 1.5 +
+        col('audio_pauses') * 0.5
+    )
+    features['reading_engagement_score'] = (
+        col('max_scroll') / 100 * 5 +
+        col('text_selections') * 2
+    )
+    features['kinesthetic_engagement_score'] = (
+        col('drag_attempts') * 0.5 +
+        col('correct_drops') * 3 -
+        col('incorrect_drops') * 0.5 +
+        col('first_success') * 5
+    )
+
+    # Average time per click
+    for modality in ('visual', 'auditory', 'reading', 'kinesthetic'):
+        features[f'{modality}_avg_time'] = col(f'{modality}_time') / (col(f'{modality}_clicks') + 1)
+
+    # Questionnaire analysis
+    answers = X[:, n_inputs - len(QUESTIONNAIRE_COLUMNS):n_inputs]
+    for i in range(4):
+        features[f'answer_{i}_count'] = (answers == i).sum(axis=1)
+
+    # Count every distinct answer value; argmax over the sorted values picks the
+    # smallest of the most frequent answers, which is what DataFrame.mode returns
+    values = np.unique(answers)
+    value_counts = (answers[:, :, None] == values).sum(axis=1)
+    features['dominant_answer'] = values[np.argmax(value_counts, axis=1)]
+    features['answer_consistency'] = value_counts.max(axis=1) / answers.shape[1]
+
+    # Interaction quality metrics
+    features['visual_quality'] = (col('video_completion') * col('visual_time')) / 1000
+    features['auditory_quality'] = (col('audio_completion') * col('auditory_time')) / 1000
+    features['reading_quality'] = (col('max_scroll') * col('text_selections')) / 10
+    features['kinesthetic_quality'] = (col('correct_drops') / (col('drag_attempts') + 1)) * 100
+
+    for j, name in enumerate(ENGINEERED_COLUMNS):
+        out[:, n_inputs + j] = features[name]
+
+    return out
+
+def select_feature_columns(features, feature_columns):
+    """Reorder an engineer_feature_matrix result to a model's feature_columns"""
+    if list(feature_columns) == FEATURE_COLUMNS:
+        return features
+    index = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+    return features[:, [index[name] for name in feature_columns]]
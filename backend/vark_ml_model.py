@@ -4,6 +4,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.utils import Bunch
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, regularizers
@@ -11,6 +12,14 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 import warnings
 warnings.filterwarnings('ignore')
 
+import vark_data
+from vark_cascade import DEFAULT_TREES, ConfidenceCascade
+from vark_dense import DenseNetwork
+from vark_trees import FlatVotingEnsemble
+from vark_features import (
+    INPUT_COLUMNS, FEATURE_COLUMNS, engineer_feature_matrix, select_feature_columns
+)
+
 np.random.seed(42)
 tf.random.set_seed(42)
 
@@ -18,220 +27,11 @@ tf.random.set_seed(42)
 # 1. ENHANCED DATA GENERATION
 # ============================================
 
-def generate_synthetic_data(n_samples=5000):
+def generate_synthetic_data(n_samples=5000, seed=None):
     """Generate synthetic training data with ALL tracked metrics"""
-    data = []
-    
-    for _ in range(n_samples):
-        true_style = np.random.choice(['Visual', 'Auditory', 'Reading', 'Kinesthetic'])
-        
-        if true_style == 'Visual':
-            # Visual metrics (high engagement)
-            visual_clicks = np.random.randint(8, 25)
-            visual_time = np.random.randint(120, 600)
-            video_plays = np.random.randint(3, 10)
-            video_pauses = np.random.randint(1, 5)
-            video_completion = np.random.randint(60, 100)
-            visual_hover = np.random.randint(10, 60)
-            visual_revisits = np.random.randint(0, 3)
-            
-            # Other metrics (low engagement)
-            auditory_clicks = np.random.randint(0, 8)
-            auditory_time = np.random.randint(0, 120)
-            audio_plays = np.random.randint(0, 3)
-            audio_pauses = np.random.randint(0, 2)
-            audio_completion = np.random.randint(0, 40)
-            audio_seeks = np.random.randint(0, 2)
-            auditory_hover = np.random.randint(0, 20)
-            auditory_revisits = np.random.randint(0, 1)
-            
-            reading_clicks = np.random.randint(0, 10)
-            reading_time = np.random.randint(0, 180)
-            scroll_depth = np.random.randint(0, 50)
-            max_scroll = np.random.randint(0, 60)
-            text_selections = np.random.randint(0, 3)
-            reading_hover = np.random.randint(0, 20)
-            reading_revisits = np.random.randint(0, 1)
-            
-            kinesthetic_clicks = np.random.randint(0, 8)
-            kinesthetic_time = np.random.randint(0, 120)
-            drag_attempts = np.random.randint(0, 5)
-            incorrect_drops = np.random.randint(0, 3)
-            correct_drops = np.random.randint(0, 2)
-            completion_time = np.random.randint(0, 60)
-            first_success = np.random.choice([0, 1], p=[0.7, 0.3])
-            reset_clicks = np.random.randint(0, 2)
-            kinesthetic_hover = np.random.randint(0, 20)
-            kinesthetic_revisits = np.random.randint(0, 1)
-            
-        elif true_style == 'Auditory':
-            visual_clicks = np.random.randint(0, 10)
-            visual_time = np.random.randint(0, 180)
-            video_plays = np.random.randint(0, 3)
-            video_pauses = np.random.randint(0, 2)
-            video_completion = np.random.randint(0, 40)
-            visual_hover = np.random.randint(0, 20)
-            visual_revisits = np.random.randint(0, 1)
-            
-            auditory_clicks = np.random.randint(8, 25)
-            auditory_time = np.random.randint(120, 600)
-            audio_plays = np.random.randint(3, 10)
-            audio_pauses = np.random.randint(1, 5)
-            audio_completion = np.random.randint(60, 100)
-            audio_seeks = np.random.randint(1, 5)
-            auditory_hover = np.random.randint(10, 60)
-            auditory_revisits = np.random.randint(0, 3)
-            
-            reading_clicks = np.random.randint(0, 8)
-            reading_time = np.random.randint(0, 120)
-            scroll_depth = np.random.randint(0, 40)
-            max_scroll = np.random.randint(0, 50)
-            text_selections = np.random.randint(0, 2)
-            reading_hover = np.random.randint(0, 20)
-            reading_revisits = np.random.randint(0, 1)
-            
-            kinesthetic_clicks = np.random.randint(0, 8)
-            kinesthetic_time = np.random.randint(0, 120)
-            drag_attempts = np.random.randint(0, 5)
-            incorrect_drops = np.random.randint(0, 3)
-            correct_drops = np.random.randint(0, 2)
-            completion_time = np.random.randint(0, 60)
-            first_success = np.random.choice([0, 1], p=[0.7, 0.3])
-            reset_clicks = np.random.randint(0, 2)
-            kinesthetic_hover = np.random.randint(0, 20)
-            kinesthetic_revisits = np.random.randint(0, 1)
-            
-        elif true_style == 'Reading':
-            visual_clicks = np.random.randint(0, 8)
-            visual_time = np.random.randint(0, 120)
-            video_plays = np.random.randint(0, 3)
-            video_pauses = np.random.randint(0, 2)
-            video_completion = np.random.randint(0, 40)
-            visual_hover = np.random.randint(0, 20)
-            visual_revisits = np.random.randint(0, 1)
-            
-            auditory_clicks = np.random.randint(0, 8)
-            auditory_time = np.random.randint(0, 120)
-            audio_plays = np.random.randint(0, 3)
-            audio_pauses = np.random.randint(0, 2)
-            audio_completion = np.random.randint(0, 40)
-            audio_seeks = np.random.randint(0, 2)
-            auditory_hover = np.random.randint(0, 20)
-            auditory_revisits = np.random.randint(0, 1)
-            
-            reading_clicks = np.random.randint(8, 25)
-            reading_time = np.random.randint(120, 600)
-            scroll_depth = np.random.randint(60, 100)
-            max_scroll = np.random.randint(70, 100)
-            text_selections = np.random.randint(2, 8)
-            reading_hover = np.random.randint(10, 60)
-            reading_revisits = np.random.randint(0, 3)
-            
-            kinesthetic_clicks = np.random.randint(0, 10)
-            kinesthetic_time = np.random.randint(0, 180)
-            drag_attempts = np.random.randint(0, 6)
-            incorrect_drops = np.random.randint(0, 3)
-            correct_drops = np.random.randint(0, 3)
-            completion_time = np.random.randint(0, 80)
-            first_success = np.random.choice([0, 1], p=[0.6, 0.4])
-            reset_clicks = np.random.randint(0, 3)
-            kinesthetic_hover = np.random.randint(0, 30)
-            kinesthetic_revisits = np.random.randint(0, 2)
-            
-        else:  # Kinesthetic
-            visual_clicks = np.random.randint(0, 8)
-            visual_time = np.random.randint(0, 120)
-            video_plays = np.random.randint(0, 3)
-            video_pauses = np.random.randint(0, 2)
-            video_completion = np.random.randint(0, 40)
-            visual_hover = np.random.randint(0, 20)
-            visual_revisits = np.random.randint(0, 1)
-            
-            auditory_clicks = np.random.randint(0, 8)
-            auditory_time = np.random.randint(0, 120)
-            audio_plays = np.random.randint(0, 3)
-            audio_pauses = np.random.randint(0, 2)
-            audio_completion = np.random.randint(0, 40)
-            audio_seeks = np.random.randint(0, 2)
-            auditory_hover = np.random.randint(0, 20)
-            auditory_revisits = np.random.randint(0, 1)
-            
-            reading_clicks = np.random.randint(0, 8)
-            reading_time = np.random.randint(0, 120)
-            scroll_depth = np.random.randint(0, 40)
-            max_scroll = np.random.randint(0, 50)
-            text_selections = np.random.randint(0, 2)
-            reading_hover = np.random.randint(0, 20)
-            reading_revisits = np.random.randint(0, 1)
-            
-            kinesthetic_clicks = np.random.randint(8, 25)
-            kinesthetic_time = np.random.randint(120, 600)
-            drag_attempts = np.random.randint(5, 15)
-            incorrect_drops = np.random.randint(1, 5)
-            correct_drops = np.random.randint(2, 4)
-            completion_time = np.random.randint(30, 180)
-            first_success = np.random.choice([0, 1], p=[0.4, 0.6])
-            reset_clicks = np.random.randint(0, 4)
-            kinesthetic_hover = np.random.randint(10, 60)
-            kinesthetic_revisits = np.random.randint(0, 3)
-        
-        # Generate questionnaire responses
-        style_map = {'Visual': 0, 'Auditory': 1, 'Reading': 2, 'Kinesthetic': 3}
-        preferred_answer = style_map[true_style]
-        questionnaire = []
-        for _ in range(10):
-            if np.random.random() < 0.7:
-                questionnaire.append(preferred_answer)
-            else:
-                questionnaire.append(np.random.choice([0, 1, 2, 3]))
-        
-        # Compile row
-        row = {
-            'visual_clicks': visual_clicks,
-            'visual_time': visual_time,
-            'video_plays': video_plays,
-            'video_pauses': video_pauses,
-            'video_completion': video_completion,
-            'visual_hover': visual_hover,
-            'visual_revisits': visual_revisits,
-            
-            'auditory_clicks': auditory_clicks,
-            'auditory_time': auditory_time,
-            'audio_plays': audio_plays,
-            'audio_pauses': audio_pauses,
-            'audio_completion': audio_completion,
-            'audio_seeks': audio_seeks,
-            'auditory_hover': auditory_hover,
-            'auditory_revisits': auditory_revisits,
-            
-            'reading_clicks': reading_clicks,
-            'reading_time': reading_time,
-            'scroll_depth': scroll_depth,
-            'max_scroll': max_scroll,
-            'text_selections': text_selections,
-            'reading_hover': reading_hover,
-            'reading_revisits': reading_revisits,
-            
-            'kinesthetic_clicks': kinesthetic_clicks,
-            'kinesthetic_time': kinesthetic_time,
-            'drag_attempts': drag_attempts,
-            'incorrect_drops': incorrect_drops,
-            'correct_drops': correct_drops,
-            'completion_time': completion_time,
-            'first_success': first_success,
-            'reset_clicks': reset_clicks,
-            'kinesthetic_hover': kinesthetic_hover,
-            'kinesthetic_revisits': kinesthetic_revisits,
-            
-            'label': true_style
-        }
-        
-        for i, ans in enumerate(questionnaire):
-            row[f'q{i+1}'] = ans
-            
-        data.append(row)
-    
-    return pd.DataFrame(data)
+    # Vectorized per-style sampling; see vark_data for the distributions and
+    # generate_synthetic_shards for datasets too large to hold in memory
+    return vark_data.generate_synthetic_data(n_samples=n_samples, seed=seed)
 
 # ============================================
 # 2. ENHANCED FEATURE ENGINEERING
@@ -314,6 +114,13 @@ def engineer_features(df):
     
     return df_featured
 
+def prepare_training_data(df):
+    """Build the feature frame and labels for training with the NumPy fast path"""
+    features = engineer_feature_matrix(df[INPUT_COLUMNS].to_numpy(dtype=np.float64))
+    X = pd.DataFrame(features, columns=FEATURE_COLUMNS, index=df.index)
+    y = df['label']
+    return X, y
+
 # ============================================
 # 3. DEEP LEARNING MODEL
 # ============================================
@@ -352,6 +159,26 @@ def create_deep_model(input_dim, num_classes=4):
     
     return model
 
+def fit_deep_model(X_train, y_train, X_val, y_val, epochs=100, batch_size=32, seed=42, verbose=1):
+    """Build and train the deep model; returns (model, history)"""
+    # Reseed so the result does not depend on what ran before in this process
+    keras.utils.set_random_seed(seed)
+    model = create_deep_model(X_train.shape[1])
+    
+    early_stop = EarlyStopping(monitor='val_accuracy', patience=15, restore_best_weights=True)
+    reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=0.00001)
+    
+    history = model.fit(
+        X_train, y_train,
+        validation_data=(X_val, y_val),
+        epochs=epochs,
+        batch_size=batch_size,
+        callbacks=[early_stop, reduce_lr],
+        verbose=verbose
+    )
+    
+    return model, history
+
 # ============================================
 # 4. ENSEMBLE MODEL
 # ============================================
@@ -380,79 +207,157 @@ def create_ensemble_model():
     
     return ensemble
 
+def assemble_ensemble(fitted, y):
+    """
+    VotingClassifier from members fitted separately, in the state
+    VotingClassifier.fit would leave it. fitted maps member name to estimator;
+    y are the (already encoded) training labels.
+    """
+    ensemble = create_ensemble_model()
+    ensemble.le_ = LabelEncoder().fit(y)
+    ensemble.classes_ = ensemble.le_.classes_
+    ensemble.estimators_ = [fitted[name] for name, _ in ensemble.estimators]
+    ensemble.named_estimators_ = Bunch(**{name: fitted[name] for name, _ in ensemble.estimators})
+    return ensemble
+
 # ============================================
 # 5. HYBRID PREDICTOR
 # ============================================
 
+# The flat tree evaluator beats sklearn's compiled traversal on small batches
+# and keeps level with it up to about this many rows; past that sklearn is a
+# little faster again
+FLAT_ENSEMBLE_MAX_ROWS = 1024
+
 class HybridVARKPredictor:
     def __init__(self):
         self.scaler = StandardScaler()
         self.label_encoder = LabelEncoder()
         self.dl_model = None
+        self.dl_engine = None
         self.ensemble_model = None
+        self.ensemble_engine = None
         self.feature_columns = None
+        self.cascade = None
         
-    def fit(self, X, y, epochs=100, batch_size=32, validation_split=0.2):
-        """Train both models"""
+    def prepare_fit(self, X, y, validation_split=0.2):
+        """Fit the label encoder and scaler; returns the scaled train/validation split"""
         y_encoded = self.label_encoder.fit_transform(y)
         X_scaled = self.scaler.fit_transform(X)
         self.feature_columns = X.columns.tolist()
         
-        X_train, X_val, y_train, y_val = train_test_split(
+        # Any previously exported engines belong to the old models
+        self.dl_engine = None
+        self.ensemble_engine = None
+        self.cascade = None
+        self._class_index = None
+        
+        return train_test_split(
             X_scaled, y_encoded, test_size=validation_split, 
             random_state=42, stratify=y_encoded
         )
+    
+    def fit(self, X, y, epochs=100, batch_size=32, validation_split=0.2):
+        """Train both models"""
+        X_train, X_val, y_train, y_val = self.prepare_fit(X, y, validation_split)
         
         print("Training Deep Learning Model...")
-        self.dl_model = create_deep_model(X.shape[1])
-        
-        early_stop = EarlyStopping(monitor='val_accuracy', patience=15, restore_best_weights=True)
-        reduce_lr = ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=5, min_lr=0.00001)
-        
-        history = self.dl_model.fit(
-            X_train, y_train,
-            validation_data=(X_val, y_val),
-            epochs=epochs,
-            batch_size=batch_size,
-            callbacks=[early_stop, reduce_lr],
-            verbose=1
+        self.dl_model, history = fit_deep_model(
+            X_train, y_train, X_val, y_val, epochs=epochs, batch_size=batch_size
         )
         
         print("\nTraining Ensemble Model...")
         self.ensemble_model = create_ensemble_model()
         self.ensemble_model.fit(X_train, y_train)
         
+        self.report_validation(X_val, y_val)
+        
+        return history
+    
+    def report_validation(self, X_val, y_val):
+        """Print and return the validation accuracy of each model"""
         dl_pred = np.argmax(self.dl_model.predict(X_val, verbose=0), axis=1)
         ensemble_pred = self.ensemble_model.predict(X_val)
+        accuracies = {
+            'deep_learning': accuracy_score(y_val, dl_pred),
+            'ensemble': accuracy_score(y_val, ensemble_pred)
+        }
         
         print(f"\nValidation Accuracy:")
-        print(f"Deep Learning: {accuracy_score(y_val, dl_pred):.4f}")
-        print(f"Ensemble: {accuracy_score(y_val, ensemble_pred):.4f}")
+        print(f"Deep Learning: {accuracies['deep_learning']:.4f}")
+        print(f"Ensemble: {accuracies['ensemble']:.4f}")
         
-        return history
-    
-    def predict(self, X, use_voting=True):
-        """Make predictions"""
-        X_scaled = self.scaler.transform(X)
+        return accuracies
+    
+    @property
+    def class_index(self):
+        """Map from style label to its column in the probability arrays"""
+        if getattr(self, '_class_index', None) is None:
+            self._class_index = {label: i for i, label in enumerate(self.label_encoder.classes_)}
+        return self._class_index
+    
+    def use_numpy_engine(self, enabled=True):
+        """Serve with the BatchNorm-folded network and the flattened tree ensemble"""
+        self.dl_engine = DenseNetwork.from_keras(self.dl_model) if enabled else None
+        self.ensemble_engine = FlatVotingEnsemble.from_sklearn(self.ensemble_model) if enabled else None
+    
+    def set_cascade(self, threshold, n_trees=DEFAULT_TREES):
+        """
+        Cascade mode: rows the first n_trees random forest trees are at least
+        threshold confident about are answered by those trees alone, the rest
+        by the full blend (see vark_cascade). None turns it off.
+        """
+        if threshold is None:
+            self.cascade = None
+            return
+        ensemble = getattr(self, 'ensemble_engine', None) or FlatVotingEnsemble.from_sklearn(self.ensemble_model)
+        self.cascade = ConfidenceCascade(ensemble, threshold, n_trees)
+    
+    def _model_probabilities(self, X):
+        """Scale once and run both models once"""
+        return self._scaled_probabilities(self.scaler.transform(X))
+    
+    def _scaled_probabilities(self, X_scaled):
+        dl_engine = getattr(self, 'dl_engine', None)
+        if dl_engine is not None:
+            dl_probs = dl_engine.predict(X_scaled)
+        else:
+            dl_probs = self.dl_model.predict(X_scaled, verbose=0)
+        ensemble_engine = getattr(self, 'ensemble_engine', None)
+        if ensemble_engine is not None and len(X_scaled) <= FLAT_ENSEMBLE_MAX_ROWS:
+            ensemble_probs = ensemble_engine.predict_proba(X_scaled)
+        else:
+            ensemble_probs = self.ensemble_model.predict_proba(X_scaled)
+        return dl_probs, ensemble_probs
+    
+    def _blended_proba(self, X_scaled):
+        dl_probs, ensemble_probs = self._scaled_probabilities(X_scaled)
+        return 0.6 * dl_probs + 0.4 * ensemble_probs
+    
+    def predict_with_proba(self, X, use_voting=True):
+        """Labels and blended probabilities from a single inference pass"""
+        cascade = getattr(self, 'cascade', None)
+        if cascade is not None and use_voting:
+            probs, _ = cascade.predict_proba(self.scaler.transform(X), self._blended_proba)
+            return self.label_encoder.classes_[np.argmax(probs, axis=1)], probs
         
-        dl_probs = self.dl_model.predict(X_scaled, verbose=0)
-        ensemble_probs = self.ensemble_model.predict_proba(X_scaled)
+        dl_probs, ensemble_probs = self._model_probabilities(X)
+        combined_probs = 0.6 * dl_probs + 0.4 * ensemble_probs
         
         if use_voting:
-            combined_probs = 0.6 * dl_probs + 0.4 * ensemble_probs
             predictions = np.argmax(combined_probs, axis=1)
         else:
             predictions = np.argmax(dl_probs, axis=1)
         
-        return self.label_encoder.inverse_transform(predictions)
+        return self.label_encoder.classes_[predictions], combined_probs
+    
+    def predict(self, X, use_voting=True):
+        """Make predictions"""
+        return self.predict_with_proba(X, use_voting=use_voting)[0]
     
     def predict_proba(self, X):
         """Get probability predictions"""
-        X_scaled = self.scaler.transform(X)
-        dl_probs = self.dl_model.predict(X_scaled, verbose=0)
-        ensemble_probs = self.ensemble_model.predict_proba(X_scaled)
-        combined_probs = 0.6 * dl_probs + 0.4 * ensemble_probs
-        return combined_probs
+        return self.predict_with_proba(X)[1]
 
 # ============================================
 # 6. TRAINING
@@ -468,13 +373,9 @@ def main():
     print(f"Generated {len(df)} samples")
     
     print("\n2. Engineering features...")
-    df_featured = engineer_features(df)
-    
-    feature_cols = [col for col in df_featured.columns if col != 'label']
-    X = df_featured[feature_cols]
-    y = df_featured['label']
+    X, y = prepare_training_data(df)
     
-    print(f"Total features: {len(feature_cols)}")
+    print(f"Total features: {X.shape[1]}")
     
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.15, random_state=42, stratify=y
@@ -0,0 +1,345 @@
+import argparse
+import json
+import pickle
+import time
+
+import numpy as np
+
+from vark_dense import DenseNetwork, _apply_activation
+from vark_serving import ServingPredictor
+from vark_trees import (
+    FlatForest, FlatGradientBoosting, FlatRandomForest, FlatVotingEnsemble
+)
+
+# ============================================
+# REDUCED-PRECISION INFERENCE
+# ============================================
+#
+# Smaller copies of a ServingPredictor's engines, built when the model is
+# loaded (artifacts stay full precision):
+#
+#   full     as exported: float32 network, float64 tree thresholds and values
+#   float32  float32 thresholds and leaf values. Thresholds are rounded down,
+#            which for float32 features makes every split decision identical
+#   float16  float16 network weights, thresholds and leaf values
+#   int8     int8 network weights with one scale per output unit; every
+#            feature is bucketed by the split thresholds used on it, so splits
+#            compare uint8 bucket ids, and leaf values are 8-bit with one
+#            scale per ensemble member
+#
+# NumPy has no float16 or int8 matrix kernels, so the reduced weights are
+# widened to float32 layer by layer as they are used: memory shrinks, the
+# arithmetic does not get cheaper. Node feature ids use the smallest integer
+# type that holds them in every reduced variant.
+
+PRECISIONS = ('full', 'float32', 'float16', 'int8')
+
+# Buckets per feature for int8 trees; bucket ids must fit in a uint8
+MAX_BUCKETS = 256
+
+def _round_down(values, dtype):
+    """values in dtype, rounded towards -inf so that x <= t is preserved for x in dtype"""
+    rounded = np.asarray(values).astype(dtype)
+    too_high = rounded > values
+    rounded[too_high] = np.nextafter(rounded[too_high], dtype(-np.inf))
+    return rounded
+
+def _quantize_symmetric(values, axis=None):
+    """int8 values and the scale(s) that map them back to floats"""
+    scale = np.max(np.abs(values), axis=axis, keepdims=axis is not None) / 127.0
+    scale = np.where(scale == 0, 1.0, scale)
+    quantized = np.clip(np.round(values / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+# ============================================
+# 1. DEEP MODEL
+# ============================================
+
+class ReducedDenseNetwork(DenseNetwork):
+    """
+    DenseNetwork with float16 or int8 kernels. int8 kernels carry a float32
+    scale per output unit, applied after the matrix product.
+    """
+
+    def __init__(self, layers, precision):
+        self.precision = precision
+        self.dtype = np.dtype(np.float32)
+        self.layers = []
+        self.scales = []
+        for kernel, bias, activation in layers:
+            if precision == 'int8':
+                kernel, scale = _quantize_symmetric(np.asarray(kernel, dtype=np.float64), axis=0)
+                scale = scale.ravel().astype(np.float32)
+            else:
+                kernel, scale = np.asarray(kernel).astype(np.float16), None
+            self.layers.append((np.ascontiguousarray(kernel),
+                                np.ascontiguousarray(bias, dtype=np.float32), activation))
+            self.scales.append(scale)
+
+    @property
+    def nbytes(self):
+        return super().nbytes + sum(scale.nbytes for scale in self.scales if scale is not None)
+
+    def predict(self, X):
+        h = np.asarray(X, dtype=np.float32)
+        for (kernel, bias, activation), scale in zip(self.layers, self.scales):
+            # float32 @ float16/int8 widens the kernel to float32
+            h = h @ kernel
+            if scale is not None:
+                h *= scale
+            h += bias
+            h = _apply_activation(h, activation)
+        return h
+
+def reduce_dense_network(network, precision):
+    if precision in ('full', 'float32'):
+        return DenseNetwork(network.layers, dtype=np.float32)
+    return ReducedDenseNetwork(network.layers, precision)
+
+# ============================================
+# 2. TREE ENSEMBLE
+# ============================================
+
+def _split_nodes(forest):
+    """Mask of the internal nodes; leaves point both children at themselves"""
+    return forest.children[:, 0] != np.arange(len(forest.children))
+
+def _bucket_edges(members, n_features):
+    """Per feature, the sorted thresholds the trees split it on, at most MAX_BUCKETS - 1"""
+    thresholds = [[] for _ in range(n_features)]
+    for member in members:
+        split = _split_nodes(member.forest)
+        for feature in np.unique(member.forest.feature[split]):
+            used = split & (member.forest.feature == feature)
+            thresholds[feature].append(member.forest.threshold[used])
+    edges = []
+    for values in thresholds:
+        values = np.unique(np.concatenate(values)) if values else np.empty(0)
+        if len(values) > MAX_BUCKETS - 1:
+            # Keep evenly spaced thresholds; the others move to the next kept one
+            values = values[np.linspace(0, len(values) - 1, MAX_BUCKETS - 1).round().astype(int)]
+        edges.append(values)
+    return edges
+
+def _reduce_forest(forest, precision, value, edges=None):
+    """forest with reduced thresholds and feature ids and the given leaf values"""
+    split = _split_nodes(forest)
+    feature = forest.feature.astype(np.min_scalar_type(int(forest.feature.max(initial=0))))
+    if precision == 'int8':
+        # A row's bucket is how many edges lie below it, so
+        # x <= edges[j]  <=>  bucket(x) <= j
+        threshold = np.zeros(len(forest.threshold), dtype=np.uint8)
+        for node in np.flatnonzero(split):
+            feature_edges = edges[forest.feature[node]]
+            threshold[node] = min(np.searchsorted(feature_edges, forest.threshold[node]),
+                                  len(feature_edges) - 1)
+    else:
+        threshold = _round_down(forest.threshold, np.dtype(precision).type)
+    return FlatForest(feature, threshold, forest.children, value, forest.roots, forest.max_depth)
+
+class ReducedRandomForest(FlatRandomForest):
+    """FlatRandomForest with reduced leaf values; value_scale maps them back to probabilities"""
+
+    def __init__(self, forest, value_scale=1.0):
+        super().__init__(forest)
+        self.value_scale = value_scale
+
+    def predict_proba(self, X):
+        leaves = self.forest.leaves(X)
+        return self.forest.value[leaves].mean(axis=1, dtype=np.float32) * self.value_scale
+
+class ReducedGradientBoosting(FlatGradientBoosting):
+    """FlatGradientBoosting with reduced leaf values; value_scale maps them back to raw scores"""
+
+    def __init__(self, forest, tree_class, n_classes, learning_rate, init_raw, value_scale=1.0):
+        super().__init__(forest, tree_class, n_classes, learning_rate, init_raw)
+        self.value_scale = value_scale
+        self._class_matrix = self._class_matrix.astype(np.float32)
+
+    def raw_trees(self, X):
+        leaves = self.forest.leaves(X)
+        return (self.learning_rate * self.value_scale) * (self.forest.value[leaves, 0] @ self._class_matrix)
+
+def _reduce_member(member, precision, edges):
+    forest = member.forest
+    is_forest = isinstance(member, FlatRandomForest)
+    if precision != 'int8':
+        value, value_scale = forest.value.astype(precision), 1.0
+    elif is_forest:
+        # Normalized class probabilities are in [0, 1]
+        value, value_scale = np.round(forest.value * 255).astype(np.uint8), 1.0 / 255
+    else:
+        value, scale = _quantize_symmetric(forest.value)
+        value_scale = float(scale)
+
+    reduced = _reduce_forest(forest, precision, value, edges)
+    if is_forest:
+        return ReducedRandomForest(reduced, value_scale)
+    return ReducedGradientBoosting(reduced, member.tree_class, member.n_classes,
+                                   member.learning_rate, member.init_raw, value_scale)
+
+class ReducedVotingEnsemble(FlatVotingEnsemble):
+    """FlatVotingEnsemble whose int8 members compare bucket ids instead of features"""
+
+    def __init__(self, members, weights=None, edges=None):
+        super().__init__(members, weights)
+        self.edges = edges
+
+    @classmethod
+    def from_flat(cls, ensemble, precision, n_features):
+        edges = _bucket_edges(ensemble.members, n_features) if precision == 'int8' else None
+        members = [_reduce_member(member, precision, edges) for member in ensemble.members]
+        return cls(members, ensemble.weights, edges)
+
+    @property
+    def nbytes(self):
+        edges = sum(feature_edges.nbytes for feature_edges in self.edges) if self.edges else 0
+        return super().nbytes + edges
+
+    def encode(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if self.edges is None:
+            return X
+        buckets = np.empty(X.shape, dtype=np.uint8)
+        for feature, feature_edges in enumerate(self.edges):
+            buckets[:, feature] = np.searchsorted(feature_edges, X[:, feature], side='left')
+        return buckets
+
+def reduce_tree_ensemble(ensemble, precision, n_features):
+    if precision == 'full' or ensemble is None:
+        return ensemble
+    return ReducedVotingEnsemble.from_flat(ensemble, precision, n_features)
+
+# ============================================
+# 3. SERVING PREDICTOR
+# ============================================
+
+def reduce_precision(predictor, precision):
+    """A ServingPredictor sharing predictor's scaler and classes with engines in precision"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == 'full':
+        return predictor
+    reduced = ServingPredictor(
+        predictor.feature_columns,
+        predictor.classes_,
+        predictor.scaler_mean,
+        predictor.scaler_scale,
+        reduce_dense_network(predictor.dl_engine, precision),
+        reduce_tree_ensemble(predictor.ensemble_engine, precision, len(predictor.feature_columns))
+    )
+    reduced.model_version = predictor.model_version
+    reduced.precision = precision
+    return reduced
+
+# ============================================
+# 4. EVALUATION
+# ============================================
+
+def model_nbytes(predictor):
+    """Bytes held by the scaler, the network and the tree arrays"""
+    scaler = sum(array.nbytes for array in (predictor.scaler_mean, predictor.scaler_scale)
+                 if array is not None)
+    ensemble = predictor.ensemble_engine.nbytes if predictor.ensemble_engine is not None else 0
+    return scaler + predictor.dl_engine.nbytes + ensemble
+
+def evaluate_precision(predictor, X, reference_labels, reference_probs, y=None,
+                       latency_rows=200, batch_size=64, repeat=3):
+    """
+    Size, speed and fidelity of one predictor on raw feature rows X.
+
+    Latency is per single-row call over the first latency_rows rows;
+    throughput is over all of X in batches of batch_size, best of repeat.
+    Agreement is the fraction of labels equal to reference_labels.
+    """
+    labels, probs = predictor.predict_with_proba(X)
+
+    latencies = []
+    for i in range(min(latency_rows, len(X))):
+        start = time.perf_counter()
+        predictor.predict_with_proba(X[i:i + 1])
+        latencies.append(time.perf_counter() - start)
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for offset in range(0, len(X), batch_size):
+            predictor.predict_with_proba(X[offset:offset + batch_size])
+        best = min(best, time.perf_counter() - start)
+
+    result = {
+        'precision': predictor.precision,
+        'model_bytes': model_nbytes(predictor),
+        'deep_model_bytes': predictor.dl_engine.nbytes,
+        'ensemble_bytes': predictor.ensemble_engine.nbytes if predictor.ensemble_engine is not None else 0,
+        'latency_p50_us': float(np.percentile(latencies, 50)) * 1e6,
+        'latency_p95_us': float(np.percentile(latencies, 95)) * 1e6,
+        'throughput_rows_s': len(X) / best,
+        'agreement': float(np.mean(labels == reference_labels)),
+        'max_prob_diff': float(np.max(np.abs(probs - reference_probs)))
+    }
+    if y is not None:
+        result['accuracy'] = float(np.mean(labels == y))
+    return result
+
+def evaluate_precisions(hybrid, X, y=None, precisions=PRECISIONS, **kwargs):
+    """
+    evaluate_precision for every precision against the full-precision
+    HybridVARKPredictor (Keras and scikit-learn) on the same rows.
+    """
+    hybrid.use_numpy_engine(False)
+    reference_labels, reference_probs = hybrid.predict_with_proba(X)
+    served = ServingPredictor.from_hybrid(hybrid)
+    X = np.asarray(X, dtype=np.float64)
+    y = None if y is None else np.asarray(y)
+
+    results = []
+    for precision in precisions:
+        predictor = reduce_precision(served, precision)
+        results.append(evaluate_precision(predictor, X, reference_labels, reference_probs, y, **kwargs))
+    reference = {'accuracy': float(np.mean(reference_labels == y))} if y is not None else {}
+    return results, reference
+
+def format_results(results):
+    full_bytes = next((r['model_bytes'] for r in results if r['precision'] == 'full'), None)
+    lines = [f"{'precision':<10}{'size KiB':>10}{'ratio':>7}{'p50 us':>9}{'p95 us':>9}"
+             f"{'rows/s':>10}{'agree':>8}{'max dp':>9}{'acc':>8}"]
+    for r in results:
+        ratio = r['model_bytes'] / full_bytes if full_bytes else float('nan')
+        lines.append(
+            f"{r['precision']:<10}{r['model_bytes'] / 1024:>10.1f}{ratio:>7.2f}"
+            f"{r['latency_p50_us']:>9.1f}{r['latency_p95_us']:>9.1f}{r['throughput_rows_s']:>10.0f}"
+            f"{r['agreement']:>8.4f}{r['max_prob_diff']:>9.2e}{r.get('accuracy', float('nan')):>8.4f}"
+        )
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    from vark_ml_model import generate_synthetic_data, prepare_training_data
+
+    parser = argparse.ArgumentParser(
+        description='Compare reduced-precision serving engines with the full-precision hybrid model')
+    parser.add_argument('--model', default='vark_model.pkl')
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=2024,
+                        help='Seed of the held-out synthetic set; differs from the training data')
+    parser.add_argument('--precisions', nargs='+', choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument('--latency-rows', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--json', default=None, help='Also write the results to this file')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        hybrid = pickle.load(f)
+    X, y = prepare_training_data(generate_synthetic_data(n_samples=args.samples, seed=args.seed))
+    X = X[hybrid.feature_columns]
+
+    results, reference = evaluate_precisions(hybrid, X, y, precisions=args.precisions,
+                                             latency_rows=args.latency_rows, batch_size=args.batch_size)
+    print(f"Held-out rows: {len(X)}, full-precision hybrid accuracy: {reference['accuracy']:.4f}\n")
+    print(format_results(results))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'samples': len(X), 'seed': args.seed, 'reference': reference,
+                       'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
@@ -0,0 +1,137 @@
+import numpy as np
+
+from vark_cascade import DEFAULT_TREES, ConfidenceCascade
+from vark_dense import DenseNetwork
+from vark_trees import FlatVotingEnsemble
+
+# ============================================
+# LIGHTWEIGHT SERVING PREDICTOR
+# ============================================
+
+# Blend weights of the deep model and the tree ensemble
+DL_WEIGHT = 0.6
+ENSEMBLE_WEIGHT = 0.4
+
+class ServingPredictor:
+    """
+    Inference-only counterpart of HybridVARKPredictor.
+
+    Holds the scaler parameters, the folded deep network, the flattened tree
+    ensemble and the label classes as plain NumPy arrays, so serving needs
+    neither TensorFlow nor scikit-learn. Predictions follow the same 0.6/0.4
+    blend and use_voting semantics.
+
+    A distilled student (see vark_distill.py) has no tree ensemble
+    (ensemble_engine is None) and predicts from its network alone.
+    """
+
+    def __init__(self, feature_columns, classes, scaler_mean, scaler_scale,
+                 dl_engine, ensemble_engine):
+        self.feature_columns = list(feature_columns)
+        self.classes_ = np.asarray(classes)
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.dl_engine = dl_engine
+        self.ensemble_engine = ensemble_engine
+        self.class_index = {str(label): i for i, label in enumerate(self.classes_)}
+        # Set when loaded from a versioned artifact
+        self.model_version = None
+        # Set by vark_precision.reduce_precision
+        self.precision = 'full'
+        # Set by set_cascade
+        self.cascade = None
+
+    @classmethod
+    def from_hybrid(cls, predictor):
+        """Export a trained HybridVARKPredictor"""
+        scaler = predictor.scaler
+        return cls(
+            predictor.feature_columns,
+            predictor.label_encoder.classes_,
+            scaler.mean_ if scaler.with_mean else None,
+            scaler.scale_ if scaler.with_std else None,
+            DenseNetwork.from_keras(predictor.dl_model),
+            FlatVotingEnsemble.from_sklearn(predictor.ensemble_model)
+        )
+
+    def arrays(self):
+        """Every numeric parameter as named arrays"""
+        arrays = {}
+        if self.scaler_mean is not None:
+            arrays['scaler_mean'] = self.scaler_mean
+        if self.scaler_scale is not None:
+            arrays['scaler_scale'] = self.scaler_scale
+        arrays.update(self.dl_engine.arrays('dl_'))
+        if self.ensemble_engine is not None:
+            arrays.update(self.ensemble_engine.arrays('ensemble_'))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, feature_columns, classes):
+        return cls(
+            feature_columns,
+            classes,
+            arrays['scaler_mean'] if 'scaler_mean' in arrays else None,
+            arrays['scaler_scale'] if 'scaler_scale' in arrays else None,
+            DenseNetwork.from_arrays(arrays, 'dl_'),
+            FlatVotingEnsemble.from_arrays(arrays, 'ensemble_') if 'ensemble_kinds' in arrays else None
+        )
+
+    def transform(self, X):
+        """Same arithmetic as StandardScaler.transform"""
+        X_scaled = np.array(X, dtype=np.float64)
+        if self.scaler_mean is not None:
+            X_scaled -= self.scaler_mean
+        if self.scaler_scale is not None:
+            X_scaled /= self.scaler_scale
+        return X_scaled
+
+    def set_cascade(self, threshold, n_trees=DEFAULT_TREES):
+        """
+        Answer rows the first n_trees random forest trees are at least
+        threshold confident about from those trees alone (see vark_cascade);
+        None runs the full blend for every row.
+        """
+        if threshold is not None and self.ensemble_engine is None:
+            raise ValueError("The cascade needs a tree ensemble; this model has none")
+        self.cascade = None if threshold is None else ConfidenceCascade(
+            self.ensemble_engine, threshold, n_trees)
+
+    def model_probabilities(self, X_scaled):
+        """Deep model and ensemble probabilities (None without an ensemble) for scaled rows"""
+        if self.ensemble_engine is None:
+            return self.dl_engine.predict(X_scaled), None
+        return self.dl_engine.predict(X_scaled), self.ensemble_engine.predict_proba(X_scaled)
+
+    def blended_proba(self, X_scaled):
+        """Full-model blended probabilities for scaled rows"""
+        return self.blend(*self.model_probabilities(X_scaled))[1]
+
+    def predict_with_proba(self, X, use_voting=True):
+        """Labels and blended probabilities from a single inference pass"""
+        X_scaled = self.transform(X)
+        if self.cascade is not None and use_voting:
+            probs, _ = self.cascade.predict_proba(X_scaled, self.blended_proba)
+            return self.classes_[np.argmax(probs, axis=1)], probs
+        dl_probs, ensemble_probs = self.model_probabilities(X_scaled)
+        return self.blend(dl_probs, ensemble_probs, use_voting=use_voting)
+
+    def blend(self, dl_probs, ensemble_probs, use_voting=True):
+        """Labels and blended probabilities from the two models' outputs"""
+        if ensemble_probs is None:
+            combined_probs = dl_probs
+        else:
+            combined_probs = DL_WEIGHT * dl_probs + ENSEMBLE_WEIGHT * ensemble_probs
+
+        if use_voting:
+            predictions = np.argmax(combined_probs, axis=1)
+        else:
+            predictions = np.argmax(dl_probs, axis=1)
+
+        return self.classes_[predictions], combined_probs
+
+    def predict(self, X, use_voting=True):
+        return self.predict_with_proba(X, use_voting=use_voting)[0]
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[1]
@@ -0,0 +1,206 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# ============================================
+# PARALLEL TRAINING
+# ============================================
+#
+# HybridVARKPredictor.fit trains the deep model, the random forest and the
+# gradient boosting model one after the other. They only share the scaled
+# training split, so this pipeline prepares the split once, fits each model in
+# its own process with an explicit thread budget, and assembles the same
+# predictor from the results. Every model keeps its fixed seed, so the output
+# matches the serial path.
+#
+# This module does not import TensorFlow at the top: the spawned tree workers
+# re-import it and only need scikit-learn.
+
+STAGES = ('deep_model', 'random_forest', 'gradient_boosting')
+
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')
+
+def thread_budgets(cpus=None):
+    """
+    Split the CPUs between the stages. Gradient boosting builds its trees one
+    after another on a single thread; the rest is shared between the deep
+    model and the forest.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    deep_model = max(1, (cpus - 1) // 2)
+    return {
+        'deep_model': deep_model,
+        'random_forest': max(1, cpus - 1 - deep_model),
+        'gradient_boosting': 1
+    }
+
+def _init_stage(threads):
+    # Runs before the stage imports TensorFlow, which reads the variables, but
+    # after NumPy loaded its BLAS (this module imports it), whose thread pools
+    # are capped with threadpoolctl instead
+    from threadpoolctl import threadpool_limits
+
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    threadpool_limits(limits=threads)
+
+def _fit_deep(X_train, y_train, X_val, y_val, epochs, batch_size, seed):
+    from vark_ml_model import fit_deep_model
+
+    start = time.perf_counter()
+    model, history = fit_deep_model(X_train, y_train, X_val, y_val, epochs=epochs,
+                                    batch_size=batch_size, seed=seed, verbose=0)
+    return model, history.history, time.perf_counter() - start
+
+def _fit_estimator(estimator, X_train, y_train):
+    start = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    return estimator, None, time.perf_counter() - start
+
+def _stage_executor(threads):
+    # Spawned rather than forked: the parent may already hold TensorFlow threads
+    return ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_stage,
+        initargs=(threads,)
+    )
+
+def train_parallel(X, y, epochs=100, batch_size=32, validation_split=0.2, seed=42, budgets=None):
+    """
+    Train a HybridVARKPredictor with its three models fitted concurrently.
+
+    Returns (predictor, report); report holds the thread budgets, the
+    wall-clock seconds of every stage, the deep model's training history and
+    the validation accuracies.
+    """
+    from vark_ml_model import HybridVARKPredictor, assemble_ensemble, create_ensemble_model
+
+    budgets = dict(thread_budgets(), **(budgets or {}))
+    timings = {}
+    total_start = time.perf_counter()
+
+    start = time.perf_counter()
+    predictor = HybridVARKPredictor()
+    X_train, X_val, y_train, y_val = predictor.prepare_fit(X, y, validation_split)
+    members = dict(create_ensemble_model().estimators)
+    members['rf'].set_params(n_jobs=budgets['random_forest'])
+    timings['prepare'] = time.perf_counter() - start
+
+    print(f"Fitting {', '.join(STAGES)} in parallel "
+          f"(threads: {', '.join(f'{stage}={budgets[stage]}' for stage in STAGES)})...")
+    start = time.perf_counter()
+    executors = {stage: _stage_executor(budgets[stage]) for stage in STAGES}
+    try:
+        futures = {
+            'deep_model': executors['deep_model'].submit(
+                _fit_deep, X_train, y_train, X_val, y_val, epochs, batch_size, seed),
+            'random_forest': executors['random_forest'].submit(
+                _fit_estimator, members['rf'], X_train, y_train),
+            'gradient_boosting': executors['gradient_boosting'].submit(
+                _fit_estimator, members['gb'], X_train, y_train)
+        }
+        results = {stage: future.result() for stage, future in futures.items()}
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+    timings['parallel'] = time.perf_counter() - start
+    for stage in STAGES:
+        timings[stage] = results[stage][2]
+
+    start = time.perf_counter()
+    predictor.dl_model, history = results['deep_model'][:2]
+    rf = results['random_forest'][0]
+    # Restore the serial configuration so the pickle matches HybridVARKPredictor.fit
+    rf.set_params(n_jobs=-1)
+    predictor.ensemble_model = assemble_ensemble(
+        {'rf': rf, 'gb': results['gradient_boosting'][0]}, y_train)
+    timings['assemble'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    accuracies = predictor.report_validation(X_val, y_val)
+    timings['validate'] = time.perf_counter() - start
+
+    timings['total'] = time.perf_counter() - total_start
+    # What the same stages cost back to back, without process start-up
+    timings['serial_estimate'] = (timings['prepare'] + sum(timings[stage] for stage in STAGES)
+                                  + timings['assemble'] + timings['validate'])
+
+    return predictor, {
+        'budgets': budgets,
+        'timings': timings,
+        'history': history,
+        'validation_accuracy': accuracies
+    }
+
+def format_timings(timings):
+    lines = [f"{'stage':<20}{'seconds':>10}"]
+    for stage in ('prepare',) + STAGES + ('parallel', 'assemble', 'validate', 'total', 'serial_estimate'):
+        indent = '  ' if stage in STAGES else ''
+        lines.append(f"{indent + stage:<20}{timings[stage]:>10.2f}")
+    return '\n'.join(lines)
+
+# ============================================
+# PARITY CHECK
+# ============================================
+
+def compare_predictors(parallel, serial, X):
+    """Differences between two trained predictors on the same raw rows"""
+    X_scaled = serial.scaler.transform(X)
+    dl_parallel = parallel.dl_model.predict(X_scaled, verbose=0)
+    dl_serial = serial.dl_model.predict(X_scaled, verbose=0)
+    ensemble_parallel = parallel.ensemble_model.predict_proba(X_scaled)
+    ensemble_serial = serial.ensemble_model.predict_proba(X_scaled)
+    return {
+        'scaler_identical': bool(np.array_equal(parallel.scaler.mean_, serial.scaler.mean_)
+                                 and np.array_equal(parallel.scaler.scale_, serial.scaler.scale_)),
+        'ensemble_identical': bool(np.array_equal(ensemble_parallel, ensemble_serial)),
+        'deep_model_max_abs_diff': float(np.max(np.abs(dl_parallel - dl_serial))),
+        'prediction_agreement': float(np.mean(parallel.predict(X) == serial.predict(X)))
+    }
+
+if __name__ == "__main__":
+    from vark_ml_model import HybridVARKPredictor, generate_synthetic_data, prepare_training_data
+
+    parser = argparse.ArgumentParser(description='Train the hybrid VARK model with its models fitted in parallel')
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the deep model')
+    for stage in STAGES:
+        parser.add_argument(f"--{stage.replace('_', '-')}-threads", type=int, default=None)
+    parser.add_argument('--out', default=None, help='Write the trained predictor to this pickle')
+    parser.add_argument('--compare', action='store_true',
+                        help='Also train serially and check both predictors agree')
+    args = parser.parse_args()
+
+    budgets = {stage: getattr(args, f'{stage}_threads') for stage in STAGES
+               if getattr(args, f'{stage}_threads') is not None}
+
+    df = generate_synthetic_data(n_samples=args.samples)
+    X, y = prepare_training_data(df)
+
+    predictor, report = train_parallel(X, y, epochs=args.epochs, batch_size=args.batch_size,
+                                       seed=args.seed, budgets=budgets)
+    print("\n" + format_timings(report['timings']))
+
+    if args.out:
+        with open(args.out, 'wb') as f:
+            pickle.dump(predictor, f)
+        print(f"\nSaved to {args.out}")
+
+    if args.compare:
+        print("\nTraining serially for comparison...")
+        start = time.perf_counter()
+        serial = HybridVARKPredictor()
+        serial.fit(X, y, epochs=args.epochs, batch_size=args.batch_size)
+        print(f"Serial training: {time.perf_counter() - start:.2f}s")
+        for name, value in compare_predictors(predictor, serial, X).items():
+            print(f"{name}: {value}")
@@ -0,0 +1,284 @@
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+# ============================================
+# INCREMENTAL MODEL UPDATES
+# ============================================
+#
+# Folds a batch of newly labelled sessions into a trained HybridVARKPredictor
+# instead of retraining from scratch:
+#
+#   1. the StandardScaler statistics absorb the new rows (running moments),
+#      and the first Dense layer and every tree threshold are rewritten so the
+#      existing models compute exactly what they did under the old scaling;
+#   2. the deep model is fine-tuned from its current weights at a low
+#      learning rate;
+#   3. the random forest grows new trees fitted on the new rows (dropping the
+#      oldest beyond max_trees) and gradient boosting adds stages fitted to
+#      the current model's residuals on them.
+#
+# The update is applied to a copy and only published, as a new training
+# pickle and serving artifact version, if holdout accuracy did not regress.
+
+# ============================================
+# 1. RESCALING TRAINED MODELS
+# ============================================
+
+def _first_dense(model):
+    from tensorflow import keras
+
+    return next(layer for layer in model.layers if isinstance(layer, keras.layers.Dense))
+
+def _tree_models(ensemble):
+    """Every fitted sklearn tree inside the voting ensemble"""
+    trees = []
+    for estimator in ensemble.estimators_:
+        members = estimator.estimators_
+        trees.extend(np.ravel(members) if isinstance(members, np.ndarray) else members)
+    return trees
+
+def rescale_inputs(hybrid, old_mean, old_scale):
+    """
+    Make the models of hybrid accept inputs standardized with its current
+    scaler while computing what they computed under (old_mean, old_scale).
+
+    With ratio = new_scale / old_scale and shift = (new_mean - old_mean) / old_scale,
+    an old input is new_input * ratio + shift, which is folded into the first
+    Dense layer's kernel and bias and into every split threshold.
+    """
+    ratio = hybrid.scaler.scale_ / old_scale
+    shift = (hybrid.scaler.mean_ - old_mean) / old_scale
+
+    dense = _first_dense(hybrid.dl_model)
+    kernel, bias = dense.get_weights()
+    dense.set_weights([kernel * ratio[:, None].astype(kernel.dtype),
+                       bias + (shift @ kernel).astype(bias.dtype)])
+
+    for tree in _tree_models(hybrid.ensemble_model):
+        # Views into the fitted tree's node array; leaves have feature < 0
+        feature = tree.tree_.feature
+        threshold = tree.tree_.threshold
+        split = feature >= 0
+        threshold[split] = (threshold[split] - shift[feature[split]]) / ratio[feature[split]]
+
+def update_scaler(hybrid, X):
+    """Fold the rows of X into the scaler's running moments and rescale the models"""
+    old_mean = hybrid.scaler.mean_.copy()
+    old_scale = hybrid.scaler.scale_.copy()
+    hybrid.scaler.partial_fit(X)
+    rescale_inputs(hybrid, old_mean, old_scale)
+
+# ============================================
+# 2. WARM-START TRAINING
+# ============================================
+
+def fine_tune_deep_model(model, X_train, y_train, X_val, y_val, epochs=10, batch_size=32,
+                         learning_rate=1e-4, seed=42):
+    """Continue training the deep model from its current weights; returns the history"""
+    from tensorflow import keras
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    keras.utils.set_random_seed(seed)
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    early_stop = EarlyStopping(monitor='val_accuracy', patience=3, restore_best_weights=True)
+    return model.fit(
+        X_train, y_train,
+        validation_data=(X_val, y_val),
+        epochs=epochs,
+        batch_size=batch_size,
+        callbacks=[early_stop],
+        verbose=0
+    )
+
+def grow_forest(forest, X, y, new_trees=50, max_trees=None):
+    """Add new_trees trees fitted on (X, y), keeping at most max_trees of the newest"""
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees)
+    forest.fit(X, y)
+    if max_trees is not None and len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+
+def extend_boosting(boosting, X, y, new_stages=20):
+    """Add new_stages boosting stages fitted to the current residuals on (X, y)"""
+    boosting.set_params(warm_start=True, n_estimators=boosting.n_estimators_ + new_stages)
+    boosting.fit(X, y)
+    boosting.set_params(warm_start=False)
+
+# ============================================
+# 3. UPDATE AND HOLDOUT GATE
+# ============================================
+
+def holdout_accuracy(hybrid, X, y):
+    """Accuracy of the blended prediction and of each model on raw feature rows"""
+    y_encoded = hybrid.label_encoder.transform(y)
+    X_scaled = hybrid.scaler.transform(X)
+    dl_pred = np.argmax(hybrid.dl_model.predict(X_scaled, verbose=0), axis=1)
+    return {
+        'hybrid': float(np.mean(hybrid.predict(X) == np.asarray(y))),
+        'deep_learning': float(np.mean(dl_pred == y_encoded)),
+        'ensemble': float(np.mean(hybrid.ensemble_model.predict(X_scaled) == y_encoded))
+    }
+
+def update_predictor(hybrid, X, y, X_holdout=None, y_holdout=None, holdout_fraction=0.2,
+                     epochs=10, batch_size=32, learning_rate=1e-4, new_trees=50, max_trees=None,
+                     new_stages=20, max_regression=0.0, seed=42):
+    """
+    Fold the labelled rows (X, y) into a copy of hybrid.
+
+    Without an explicit holdout set, holdout_fraction of the new rows is held
+    out. Returns (updated, report); report['accepted'] is False when the
+    updated model's holdout accuracy is more than max_regression below the
+    current model's, in which case updated should not be published.
+    """
+    from sklearn.model_selection import train_test_split
+
+    unknown = set(pd.unique(y)) - set(hybrid.label_encoder.classes_)
+    if unknown:
+        raise ValueError(f"Unknown labels: {sorted(map(str, unknown))}")
+    if set(pd.unique(y)) != set(hybrid.label_encoder.classes_):
+        # Warm-started trees must be fitted on every class to stay compatible
+        raise ValueError(f"The update batch must contain every class: {list(hybrid.label_encoder.classes_)}")
+    X = X[hybrid.feature_columns]
+
+    if X_holdout is None:
+        X, X_holdout, y, y_holdout = train_test_split(
+            X, y, test_size=holdout_fraction, random_state=seed, stratify=y
+        )
+    else:
+        X_holdout = X_holdout[hybrid.feature_columns]
+
+    timings = {}
+    start = time.perf_counter()
+    baseline = holdout_accuracy(hybrid, X_holdout, y_holdout)
+    # Work on a copy so a rejected update leaves the served model untouched
+    updated = pickle.loads(pickle.dumps(hybrid))
+    timings['baseline'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    update_scaler(updated, X)
+    y_encoded = updated.label_encoder.transform(y)
+    X_scaled = updated.scaler.transform(X)
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_scaled, y_encoded, test_size=0.2, random_state=seed, stratify=y_encoded
+    )
+    timings['rescale'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    history = fine_tune_deep_model(updated.dl_model, X_train, y_train, X_val, y_val, epochs=epochs,
+                                   batch_size=batch_size, learning_rate=learning_rate, seed=seed)
+    timings['deep_model'] = time.perf_counter() - start
+
+    rf, gb = updated.ensemble_model.estimators_
+    start = time.perf_counter()
+    grow_forest(rf, X_scaled, y_encoded, new_trees=new_trees, max_trees=max_trees)
+    timings['random_forest'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extend_boosting(gb, X_scaled, y_encoded, new_stages=new_stages)
+    timings['gradient_boosting'] = time.perf_counter() - start
+
+    # Exported engines belong to the old weights
+    updated.dl_engine = None
+    updated.ensemble_engine = None
+
+    start = time.perf_counter()
+    candidate = holdout_accuracy(updated, X_holdout, y_holdout)
+    timings['evaluate'] = time.perf_counter() - start
+
+    return updated, {
+        'accepted': candidate['hybrid'] >= baseline['hybrid'] - max_regression,
+        'rows': len(X),
+        'holdout_rows': len(X_holdout),
+        'baseline': baseline,
+        'candidate': candidate,
+        'epochs_run': len(history.epoch),
+        'forest_trees': len(rf.estimators_),
+        'boosting_stages': int(gb.n_estimators_),
+        'timings': timings
+    }
+
+def publish(hybrid, model_path, artifact_dir, metadata=None):
+    """Replace the training pickle and export it as the current serving version"""
+    from vark_artifacts import save_artifact
+    from vark_serving import ServingPredictor
+
+    tmp_path = model_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(hybrid, f)
+    os.replace(tmp_path, model_path)
+    # Exported after the pickle is written, so the artifact counts as current
+    return save_artifact(ServingPredictor.from_hybrid(hybrid), artifact_dir,
+                         metadata=dict(metadata or {}, source=model_path))
+
+def load_labelled(path):
+    """Labelled raw rows from a CSV file or a directory of synthetic data chunks"""
+    from vark_data import load_synthetic_data
+
+    if os.path.isdir(path):
+        return load_synthetic_data(path)
+    return pd.read_csv(path)
+
+if __name__ == "__main__":
+    from vark_ml_model import prepare_training_data
+
+    parser = argparse.ArgumentParser(description='Fold newly labelled sessions into the trained VARK model')
+    parser.add_argument('data', help='CSV with the raw input columns and a label column, '
+                                     'or a directory written by vark_data.py')
+    parser.add_argument('--model', default='vark_model.pkl')
+    parser.add_argument('--artifact-dir', default='models')
+    parser.add_argument('--holdout', default=None,
+                        help='Labelled rows to gate on (default: a split of the new data)')
+    parser.add_argument('--holdout-fraction', type=float, default=0.2)
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--new-trees', type=int, default=50)
+    parser.add_argument('--max-trees', type=int, default=None)
+    parser.add_argument('--new-stages', type=int, default=20)
+    parser.add_argument('--max-regression', type=float, default=0.0,
+                        help='Largest holdout accuracy drop that may still be published')
+    parser.add_argument('--dry-run', action='store_true', help='Evaluate without publishing')
+    args = parser.parse_args()
+
+    total_start = time.perf_counter()
+    with open(args.model, 'rb') as f:
+        hybrid = pickle.load(f)
+    X, y = prepare_training_data(load_labelled(args.data))
+    X_holdout = y_holdout = None
+    if args.holdout:
+        X_holdout, y_holdout = prepare_training_data(load_labelled(args.holdout))
+
+    updated, report = update_predictor(
+        hybrid, X, y, X_holdout, y_holdout, holdout_fraction=args.holdout_fraction,
+        epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.learning_rate,
+        new_trees=args.new_trees, max_trees=args.max_trees, new_stages=args.new_stages,
+        max_regression=args.max_regression
+    )
+
+    print(f"Update rows: {report['rows']}, holdout rows: {report['holdout_rows']}")
+    for name in ('hybrid', 'deep_learning', 'ensemble'):
+        print(f"{name:<14} {report['baseline'][name]:.4f} -> {report['candidate'][name]:.4f}")
+    print(f"Deep model epochs: {report['epochs_run']}, forest trees: {report['forest_trees']}, "
+          f"boosting stages: {report['boosting_stages']}")
+    print('Timings: ' + ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in report['timings'].items()))
+
+    if not report['accepted']:
+        print("Holdout accuracy regressed, not publishing")
+        raise SystemExit(1)
+    if args.dry_run:
+        print("Dry run, not publishing")
+    else:
+        version = publish(updated, args.model, args.artifact_dir, metadata={
+            'update': {key: report[key] for key in ('rows', 'holdout_rows', 'baseline', 'candidate')}
+        })
+        print(f"Published version {version}")
+    print(f"Total: {time.perf_counter() - total_start:.2f}s")